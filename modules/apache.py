@@ -12,12 +12,20 @@ Description:            This class will handle all things associated with
 # *******************************************************************
 # Import required modules
 import os  # Used for various os level calls
+import json  # Used to write the readiness marker
+import time  # Used to time and back off the readiness probe
+import socket  # Used to probe the listening ports
 from shutil import copyfile, move
 from socket import gethostname  # Library used to gather the nodes hostname for the certificate
 
 # Import custom modules
 from modules.globals import Globals
 from modules.log import Log
+from modules.command import Command
+from modules.confedit import ConfigEditor
+from modules.template import TemplateEngine
+from modules.cgroup import Cgroup
+from modules.precompress import Precompress
 
 # Instantiate the global variables.
 GLOBALS = Globals()
@@ -25,6 +33,12 @@ GLOBALS = Globals()
 # Instantiate the custom console logger.
 INSTALL_LOG = Log()
 
+# Instantiate the command runner.
+COMMANDS = Command()
+
+# Instantiate the template engine.
+TEMPLATES = TemplateEngine()
+
 # *******************************************************************
 # Class Definitions:
 # *******************************************************************
@@ -37,43 +51,95 @@ class Apache():
         """Set instantiation variables"""
         self.app_name = os.environ['APP_NAME']
 
-        # Create a list of packages that get installed
+        # Read the distro specific paths from the platform profile, files are read and written under $RUNCONFIG_ROOT.
+        platform = GLOBALS.platform()
+        self.package_mgr = platform["package_mgr"]
+        self.apache_user = platform["apache_user"]
+        self.apache_group = platform["apache_group"]
+        self.apache_dir = GLOBALS.path(platform["apache_dir"])
+        self.apache_app_dir = GLOBALS.path(platform["apache_app_dir"])
+        self.apache_conf = platform["apache_conf"]
+        self.apache_app_conf = platform["apache_app_conf"]
+        self.apache_binary = platform["apache_binary"]
+        self.apache_ctl = platform["apache_ctl"]
+        self.cert_path = GLOBALS.path(platform["cert_path"])
+        self.key_path = GLOBALS.path(platform["key_path"])
+        self.env_var_path = GLOBALS.path(platform["env_var_path"])
+        self.log_dir = platform["apache_log_dir"]
+        self.run_dir = platform["apache_run_dir"]
+        self.www_root = GLOBALS.path(platform["www_root"])
+        self.service_mgr = platform["service_mgr"]
+
+    def template_vars(self, app_name=None, server_alias=None):
+        """Return the variables the vhost, ssl and envvars templates are rendered with, for the container app or the passed site"""
+        if app_name is None:
+            app_name = self.app_name
+            server_alias = os.environ.get('APACHE_SVRALIAS')
+        return {
+            "APP_NAME": app_name,
+            "SERVER_ALIAS": server_alias or "www." + app_name,
+            "HOSTNAME": os.environ.get('HOSTNAME') or gethostname(),
+            "DOCUMENT_ROOT": GLOBALS.target(self.www_root + app_name),
+            "CERT_FILE": GLOBALS.target(self.cert_path + app_name + ".crt"),
+            "KEY_FILE": GLOBALS.target(self.key_path + app_name + ".key"),
+            "LOG_DIR": self.log_dir,
+            "RUN_DIR": self.run_dir,
+        }
+
+    def site_conf(self, app_name):
+        """Return the path the vhost of a site is written to, debian enables it with a symlink in sites-enabled"""
+        if GLOBALS.is_rhel():
+            return self.apache_app_dir + app_name + ".conf"
+        return self.apache_dir + "sites-available/" + app_name + ".conf"
+
+    def server_conf(self, name):
+        """Return the path a server wide config file is written to, RHEL reads conf.d, debian reads conf-available files
+        that are enabled with a symlink in conf-enabled, as sites-enabled only holds vhosts"""
         if GLOBALS.is_rhel():
-            self.package_mgr = "yum -y erase"
-            self.apache_user = "apache"
-            self.apache_group = "apache"
-            self.apache_dir = "/etc/httpd/conf/"
-            self.apache_app_dir = "/etc/httpd/conf.d/"
-            self.apache_conf = "httpd.conf"
-            self.apache_app_conf = "apache_cent.conf"
-            self.apache_binary = "httpd"
-            self.cert_path = "/etc/pki/tls/certs/"
-            self.key_path = "/etc/pki/tls/private/"
-            self.env_var_path = "/etc/sysconfig/httpd"
-        else:
-            self.package_mgr = "apt-get -y remove --purge"
-            self.apache_user = "www-data"
-            self.apache_group = "www-data"
-            self.apache_dir = "/etc/apache2/"
-            self.apache_app_dir = "/etc/apache2/sites-enabled/"
-            self.apache_conf = "apache2.conf"
-            self.apache_app_conf = "apache_deb.conf"
-            self.apache_binary = "apache2"
-            self.cert_path = "/etc/ssl/certs/"
-            self.key_path = "/etc/ssl/private/"
-            self.env_var_path = "/etc/apache2/envvars"
+            return self.apache_app_dir + name
+        return self.apache_dir + "conf-available/" + name
+
+    def write_server_conf(self, name, template, template_vars):
+        """Render a server wide config file, and enable it on debian with a relative symlink in conf-enabled. A copy left
+        in sites-enabled by an earlier version is removed, so the config is only read once"""
+        conf_file = self.server_conf(name)
+        TEMPLATES.write_all([(conf_file, template, template_vars)])
+        if not GLOBALS.is_rhel():
+            if os.path.lexists(self.apache_app_dir + name):
+                os.unlink(self.apache_app_dir + name)
+            enabled_dir = self.apache_dir + "conf-enabled/"
+            if not os.path.isdir(enabled_dir):
+                os.makedirs(enabled_dir)
+            if not os.path.lexists(enabled_dir + name):
+                os.symlink(os.path.relpath(conf_file, enabled_dir), enabled_dir + name)
+        return conf_file
+
+    def enable_site(self, app_name):
+        """Enable the vhost of a site on debian with a relative symlink in sites-enabled, so the link also resolves in a staged root"""
+        if not os.path.lexists(self.apache_app_dir + app_name + ".conf"):
+            os.symlink(os.path.relpath(self.site_conf(app_name), self.apache_app_dir), self.apache_app_dir + app_name + ".conf")
+
+    @staticmethod
+    def parse_sites(sites):
+        """Parse a site list such as $APP_SITES, 'example.com example.org=www.example.org,cdn.example.org', into a list of
+        (site, server alias) tuples. Server aliases are optional and are separated with commas"""
+        parsed = []
+        for site in sites.split():
+            app_name, _, aliases = site.partition("=")
+            parsed.append((app_name, aliases.replace(",", " ") or None))
+        return parsed
 
     def apache_init(self):
         """Method to configure the application if it has not been configured before"""
         INSTALL_LOG.write_log_console("Configuring Apache for the first time...", "")
-        if not os.path.isdir("/var/www/html/" + self.app_name):
-            os.makedirs("/var/www/html/" + self.app_name)
+        if not os.path.isdir(self.www_root + self.app_name):
+            os.makedirs(self.www_root + self.app_name)
         try:
-            with open("/var/www/html/" + self.app_name + "/index.php", "w+") as index:
+            with open(self.www_root + self.app_name + "/index.php", "w+") as index:
                 index.write("<?php phpinfo() ?>")
                 index.close()
         except Exception as e:
-            print("Could not create /var/www/html/" + self.app_name + "/index.php")
+            print("Could not create " + self.www_root + self.app_name + "/index.php")
             print(e)
 
         # Mark step complete
@@ -91,19 +157,9 @@ class Apache():
         INSTALL_LOG.write_log("Backing up the Apache server config file")
         copyfile(self.apache_dir + self.apache_conf, self.apache_dir + self.apache_conf + ".orig")
 
-        # Set the servername
+        # Set the servername, RHEL ships it commented out, and debian does not ship it at all.
         INSTALL_LOG.write_log("Setting server hostname in the Apache server config")
-        # os.popen("sed -i 's/#ServerName\ www\.example\.com\:80/ServerName\ www\.'$APP_NAME'\:80/g")
-        if GLOBALS.is_rhel():
-            os.popen("sed -i 's/#ServerName\ www.example.com:80/ServerName\ www.$APP_NAME:80/g' /etc/httpd/conf/httpd.conf")
-        else:
-            try:
-                with open(self.apache_dir + self.apache_conf, "a") as apache_conf:
-                    apache_conf.write('ServerName www.' + self.app_name + ':80')
-                    apache_conf.close()
-            except Exception as e:
-                print("Could not write to " + self.apache_dir + self.apache_conf)
-                print(e)
+        ConfigEditor(self.apache_dir + self.apache_conf).set_directive("ServerName", "www." + self.app_name + ":80").commit()
 
         # Mark step complete
         INSTALL_LOG.step_complete()
@@ -117,10 +173,18 @@ class Apache():
             INSTALL_LOG.write_log("Disabling the default Apache ssl.conf file")
             move(self.apache_app_dir + "ssl.conf", self.apache_app_dir + "ssl.conf.disabled")
 
-        # Rename the application apache config file
-        INSTALL_LOG.write_log("Renaming the Apache application config file")
+        # Rename the application apache config file, or render it from the vhost template if the image does not ship one.
         if os.path.isfile(self.apache_dir + "sites-available/" + self.apache_app_conf):
+            INSTALL_LOG.write_log("Renaming the Apache application config file")
             move(self.apache_dir + "sites-available/" + self.apache_app_conf, self.apache_dir + "sites-available/" + self.app_name + ".conf")
+        elif not os.path.exists(self.apache_app_dir + self.app_name + ".conf"):
+            INSTALL_LOG.write_log("Rendering the Apache application config file")
+            template_vars = self.template_vars()
+            outputs = [(self.site_conf(self.app_name), "vhost.conf", template_vars)]
+            if GLOBALS.is_rhel():
+                # RHEL reads the vhost straight from conf.d, and the rendered ssl config replaces the disabled ssl.conf.
+                outputs.append((self.apache_app_dir + "runconfig-ssl.conf", "ssl.conf", template_vars))
+            TEMPLATES.write_all(outputs)
 
         # Remove default configs if debian based distro
         if not GLOBALS.is_rhel():
@@ -129,78 +193,275 @@ class Apache():
                 os.unlink(self.apache_app_dir + "000-default.conf")
 
             INSTALL_LOG.write_log("Enabling the Apache application config")
-            if not os.path.exists(self.apache_app_dir + self.app_name + ".conf"):
-                os.symlink(self.apache_dir + "sites-available/" + self.app_name + ".conf", self.apache_app_dir + self.app_name + ".conf")
+            self.enable_site(self.app_name)
+
+        # Point the application config at the container certificate, mod_ssl loads RSA and EC keys through the same directives.
+        if os.path.isfile(self.apache_app_dir + self.app_name + ".conf"):
+            INSTALL_LOG.write_log("Set certificate value in apache config file")
+            app_conf = ConfigEditor(self.apache_app_dir + self.app_name + ".conf")
+            app_conf.substitute(r'^(\s*SSLCertificateFile\s+)\S+', r'\g<1>' + GLOBALS.target(self.cert_path + self.app_name + ".crt"))
+            app_conf.substitute(r'^(\s*SSLCertificateKeyFile\s+)\S+', r'\g<1>' + GLOBALS.target(self.key_path + self.app_name + ".key"))
+            app_conf.commit()
+
+        # Serve the static assets the precompress step compresses
+        if Precompress.enabled():
+            INSTALL_LOG.write_log("Rendering the precompressed asset config")
+            self.write_server_conf("runconfig-precompress.conf", "precompress.conf",
+                                   dict(self.template_vars(), EXTENSIONS="|".join(Precompress.EXTENSIONS)))
+
+        # Mark step complete
+        INSTALL_LOG.step_complete()
+
+    @staticmethod
+    def mpm_settings(cpus, memory):
+        """Size the MPM limits to the cores and memory in bytes the container was given, returns the mpm.conf template
+        variables. Each worker is estimated to cost $APACHE_PROCESS_MB (48) for a prefork process, or $APACHE_THREAD_MB (4)
+        per thread plus $APACHE_PROCESS_MB per process for worker and event, out of the memory left after $APACHE_RESERVED_MB
+        (10%, at least 64) is set aside. Workers are also capped at $APACHE_WORKERS_PER_CPU (64) per core. The limits can be
+        set outright with $APACHE_START_SERVERS, $APACHE_MAX_REQUEST_WORKERS, $APACHE_THREADS_PER_CHILD, and $APACHE_SERVER_LIMIT"""
+        def setting(name, default):
+            """Return the integer environment override, or the default"""
+            return int(os.environ.get(name) or default)
+
+        memory_mb = memory // 1048576 if memory else 1024
+        budget = max(0, memory_mb - setting('APACHE_RESERVED_MB', max(64, memory_mb // 10)))
+        process_mb = max(1, setting('APACHE_PROCESS_MB', 48))
+        cap = cpus * setting('APACHE_WORKERS_PER_CPU', 64)
+
+        # Prefork serves one request per process.
+        prefork_workers = setting('APACHE_MAX_REQUEST_WORKERS', max(2, min(budget // process_mb, cap)))
+        prefork_start = setting('APACHE_START_SERVERS', min(prefork_workers, max(2, cpus)))
+
+        # Worker and event serve ThreadsPerChild requests per process, MaxRequestWorkers must be a multiple of it.
+        threads = max(1, setting('APACHE_THREADS_PER_CHILD', 25))
+        processes = max(1, budget // (process_mb + threads * max(1, setting('APACHE_THREAD_MB', 4))))
+        workers = setting('APACHE_MAX_REQUEST_WORKERS', min(processes * threads, max(threads, cap)))
+        workers = max(threads, workers - workers % threads)
+        server_limit = setting('APACHE_SERVER_LIMIT', workers // threads)
+        start_servers = setting('APACHE_START_SERVERS', min(server_limit, max(2, cpus)))
+
+        return {
+            "CPUS": cpus,
+            "MEMORY_MB": memory_mb,
+            "PREFORK_START_SERVERS": prefork_start,
+            "PREFORK_MIN_SPARE": max(1, prefork_start // 2),
+            "PREFORK_MAX_SPARE": max(prefork_start // 2 + 1, min(prefork_workers, prefork_start * 2)),
+            "PREFORK_MAX_REQUEST_WORKERS": prefork_workers,
+            "START_SERVERS": start_servers,
+            "SERVER_LIMIT": server_limit,
+            "THREADS_PER_CHILD": threads,
+            "MIN_SPARE_THREADS": threads,
+            "MAX_SPARE_THREADS": threads * max(2, min(server_limit, cpus)),
+            "MAX_REQUEST_WORKERS": workers,
+            "MAX_CONNECTIONS_PER_CHILD": setting('APACHE_MAX_CONNECTIONS_PER_CHILD', 0),
+        }
+
+    def apache_mpm(self):
+        """Size the Apache MPM limits to the container's cgroup CPU quota and memory limit"""
+        INSTALL_LOG.write_log_console("Tuning the Apache MPM limits...", "")
+
+        # Read the limits the container was started with
+        cgroup = Cgroup()
+        settings = self.mpm_settings(cgroup.cpus(), cgroup.memory())
+        INSTALL_LOG.write_log("Sizing for %s cores and %sMB of memory (cgroup v%s)" % (settings["CPUS"], settings["MEMORY_MB"], cgroup.version()))
+
+        # One record for each MPM, the structured format keeps them on the JSON stdout stream.
+        INSTALL_LOG.write_console("MPM prefork: StartServers %(PREFORK_START_SERVERS)s, MaxRequestWorkers %(PREFORK_MAX_REQUEST_WORKERS)s" % settings)
+        INSTALL_LOG.write_console("MPM worker/event: StartServers %(START_SERVERS)s, ServerLimit %(SERVER_LIMIT)s, ThreadsPerChild %(THREADS_PER_CHILD)s, "
+                                  "MaxRequestWorkers %(MAX_REQUEST_WORKERS)s" % settings)
+
+        # The MPM config is read after the distro mpm config, so its limits win.
+        self.write_server_conf("runconfig-mpm.conf", "mpm.conf", settings)
+
+        # Mark step complete
+        INSTALL_LOG.step_complete()
+
+    def apache_certs(self):
+        """Generate the container certificate, apache_app_config points the application config at it"""
+        INSTALL_LOG.write_log_console("Configuring Apache certificates...", "")
+
+        # Generate the certificate, the key algorithm is taken from $CERT_KEY_TYPE (rsa, ec-p256, ec-p384, ed25519).
+        # The certs module is imported here, so restarts that do not generate certificates never load OpenSSL.
+        # A cert that the cache index shows is still valid for this host is reused, otherwise it is regenerated.
+        from modules.certs import CertGen
+        cert_gen = CertGen()
+        cert_gen.ensure_cert()
+
+        # Mark step complete
+        INSTALL_LOG.step_complete()
+
+    def apache_envvars(self):
+        """Configure Apache Environment Varaiables"""
+        INSTALL_LOG.write_log_console("Setting Apache variables to allow", "variable substitution in the apache config")
+
+        # The variables are kept in a marked block, so that a restart replaces them instead of appending them again.
+        INSTALL_LOG.write_log("Writing apache variables to " + self.env_var_path)
+        try:
+            ConfigEditor(self.env_var_path).replace_block("runconfig", TEMPLATES.render("envvars", self.template_vars())).commit()
+        except Exception as e:
+            print("Could not write to " + self.env_var_path)
+            print(e)
 
         # Mark step complete
         INSTALL_LOG.step_complete()
 
-    # def apache_certs():
-    #     # Modify the configs to use the certificate.
-    #     INSTALL_LOG.write_log("Set certificate value in apache config file")
-
-    #     # Change the apache config to use the the existing certificate.
-    #     try:
-    #         with open(self.apache_app_dir + self.app_name + ".conf", "r") as app_conf:
-    #             lines = app_conf.readlines()
-    #         with open(self.apache_app_dir + self.app_name + ".conf", "w") as app_conf:
-    #             for line in lines:
-    #                 app_conf.write(line.replace('localhost.crt', self.app_name + ".crt"))
-    #                 app_conf.write(line.replace('localhost.key', self.app_name + "."))
-    #                 app_conf.write(re.sub(r'^localhost.crt', self.app_name + ".crt", line))
-    #                 app_conf.write(re.sub(r'^localhost.key', self.app_name + ".key", line))
-    #             app_conf.close()
-    #             del lines
-    #     except Exception as e:
-    #         print("Could not read or write to " + self.apache_app_dir + self.app_name)
-    #         print(e)
-
-    #     # Mark step complete
-    #     INSTALL_LOG.step_complete()
-
-    # def apache_envvars(self):
-    #     """Configure Apache Environment Varaiables"""
-    #     INSTALL_LOG.write_log_console("Setting Apache variables to allow", "variable substitution in the apache config")
-
-    #     INSTALL_LOG.write_log("Writing apache variables to " + self.env_var_path)
-    #     try:
-    #         with open(self.env_var_path, "a") as envars:
-    #             envars.write("\n\n")
-    #             envars.write("# Set Apache Environment Variables that will be passed to Apache via /etc/sysconfig/httpd/PassEnv\n")
-    #             envars.write("# Must have a2enmod env enabled\n\n")
-    #             envars.write("APP=\"" + self.app_name + "\"\n")
-    #             envars.write("SVRALIAS=\"" + os.environ['APACHE_SVRALIAS'] + "\"\n")
-    #             envars.write("HOSTNAME=" + gethostname() + "\n\n")
-
-    #             INSTALL_LOG.write_log("Exporting Apache Variables to " + self.env_var_path)
-    #             envars.write("# Export the variables to sysconfig/PassEnv\n")
-    #             envars.write("export APP SVRALIAS HOSTNAME\n")
-    #             envars.close()
-    #     except Exception as e:
-    #         print("Could not write to " + self.env_var_path)
-    #         print(e)
-
-    #     # Mark step complete
-    #     INSTALL_LOG.step_complete()
-
-    # def apache_start(self):
-    #     """Start Apache Web Services"""
-    #     INSTALL_LOG.write_log_console("Staring Apache Web Services...", "")
-
-    #     # Add the service start to the bashrc file.
-    #     try:
-    #         with open("/root/.bashrc", "a") as bashrc:
-    #             bashrc.write("service " + self.apache_binary + " start")
-    #             bashrc.close()
-    #     except Exception as e:
-    #         print("Could not modify the root bashrc file")
-    #         print(e)
-
-    #     # Start Apache.
-    #     start_process = os.popen("service " + self.apache_binary + " start")
-    #     output = start_process.readline()
-    #     print(output)
-    #     start_process.close()
-
-    #     # Mark step complete
-    #     INSTALL_LOG.step_complete()
+    def provision_sites(self, sites):
+        """Provision a list of (site, server alias) tuples in one run, see parse_sites. Each site gets a document root and
+        index.php, a vhost, and a certificate. Sites that are already provisioned are left alone, all vhosts are rendered
+        in one pass, and all missing certificates are generated in one parallel batch. Returns the vhost file of each site"""
+        INSTALL_LOG.write_log_console("Provisioning " + str(len(sites)) + " Apache sites...", "")
+
+        # Create the document roots and php info pages
+        INSTALL_LOG.write_log("Creating the site document roots")
+        for app_name, _ in sites:
+            index_file = self.www_root + app_name + "/index.php"
+            if os.path.isfile(index_file):
+                continue
+            try:
+                if not os.path.isdir(os.path.dirname(index_file)):
+                    os.makedirs(os.path.dirname(index_file))
+                with open(index_file, "w+") as index:
+                    index.write("<?php phpinfo() ?>")
+            except Exception as e:
+                print("Could not create " + index_file)
+                print(e)
+
+        # Render every missing vhost in one pass
+        site_confs = dict([(app_name, self.site_conf(app_name)) for app_name, _ in sites])
+        outputs = [(site_confs[app_name], "vhost.conf", self.template_vars(app_name, server_alias))
+                   for app_name, server_alias in sites if not os.path.exists(site_confs[app_name])]
+        if outputs:
+            INSTALL_LOG.write_log("Rendering " + str(len(outputs)) + " site vhosts")
+            TEMPLATES.write_all(outputs)
+
+        # Enable the vhosts if debian based distro
+        if not GLOBALS.is_rhel():
+            INSTALL_LOG.write_log("Enabling the site vhosts")
+            if not os.path.isdir(self.apache_app_dir):
+                os.makedirs(self.apache_app_dir)
+            for app_name, _ in sites:
+                self.enable_site(app_name)
+
+        # Generate the missing certificates in a single batch, sharing the key pool and the process pool
+        from modules.certs import CertGen
+        cert_gen = CertGen()
+        key_type = cert_gen.default_key_type()
+        specs = []
+        for app_name, server_alias in sites:
+            # Every server alias is a subject alternative name of its own.
+            sans = server_alias.split() if server_alias else ["www." + app_name]
+            reason = cert_gen.regenerate_reason(app_name + ".crt", app_name, key_type, sans)
+            if reason is not None:
+                cert_gen.reasons[app_name + ".crt"] = reason
+                specs.append({"keysize": 4096, "country": "US", "state": "US", "loc": "Some City", "org": app_name, "orgunit": app_name,
+                              "common_name": app_name, "encryption": "sha512", "cert_name": app_name + ".crt", "key_type": key_type,
+                              "sans": sans})
+        if specs:
+            cert_gen.generate_batch(specs)
+
+        # Mark step complete
+        INSTALL_LOG.step_complete()
+
+        return site_confs
+
+    def start_command(self):
+        """Return the command that starts Apache, systemd hosts start the unit so it stays supervised, otherwise the
+        server is launched directly through its control script, without the service wrapper"""
+        if self.service_mgr == "systemd":
+            return ["systemctl", "start", self.apache_binary]
+        return [self.apache_ctl, "-k", "start"]
+
+    @staticmethod
+    def port_open(port, host="127.0.0.1", timeout=0.5):
+        """Return True if the port accepts a TCP connection"""
+        try:
+            with socket.create_connection((host, port), timeout):
+                return True
+        except (OSError, socket.timeout):
+            return False
+
+    def http_probe(self, port, path, timeout=2):
+        """GET the path from the local server with the app name as the Host header, returns the status code, or None"""
+        # http.client is only imported when the HTTP probe is turned on.
+        import http.client
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+        try:
+            connection.request("GET", path, headers={"Host": self.app_name})
+            return connection.getresponse().status
+        except (OSError, http.client.HTTPException):
+            return None
+        finally:
+            connection.close()
+
+    def wait_ready(self, ports, http_path=None, timeout=30):
+        """Probe until every port accepts a connection, and the http_path, if one is passed, answers on the first port without
+        a server error. The probe backs off from 50ms to 1s between attempts. Returns (seconds, http status) once Apache is
+        ready, or None if it was not ready within the timeout"""
+        start = time.monotonic()
+        delay = 0.05
+        pending = list(ports)
+        while True:
+            pending = [port for port in pending if not self.port_open(port)]
+            status = None
+            if not pending and http_path:
+                status = self.http_probe(ports[0], http_path)
+            if not pending and (not http_path or (status is not None and status < 500)):
+                return time.monotonic() - start, status
+
+            if time.monotonic() - start + delay > timeout:
+                return None
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+    def apache_start(self):
+        """Start Apache Web Services, and wait for it to accept connections. Returns True once Apache is ready, or False
+        under a staged root. Raises a RuntimeError if Apache could not be started, or was not ready within the timeout, so
+        the step fails and the steps that depend on it are skipped"""
+        INSTALL_LOG.write_log_console("Staring Apache Web Services...", "")
+
+        # A staged root is configured for another machine, so there is nothing to start here.
+        if GLOBALS.root():
+            INSTALL_LOG.write_log("Configuration staged in " + GLOBALS.root() + ", not starting Apache")
+            INSTALL_LOG.step_complete()
+            return False
+
+        # Remove the marker of a previous start, so the orchestrator only sees this one once it is ready.
+        ready_file = os.environ.get('APACHE_READY_FILE', "/run/runconfig/apache.ready")
+        if os.path.isfile(ready_file):
+            os.remove(ready_file)
+
+        # Start Apache, runconfig.py adds the service start to the bashrc file.
+        result = COMMANDS.run(self.start_command())
+        if result.stdout.strip():
+            INSTALL_LOG.write_log(result.stdout.strip())
+        if result.returncode != 0:
+            raise RuntimeError("Could not start Apache, `" + result.command + "` exited with " + str(result.returncode) + ": " + result.stderr.strip())
+
+        # Wait for the listening sockets, and optionally for the generated index.php to be served.
+        ports = [int(port) for port in os.environ.get('APACHE_READY_PORTS', "80").replace(",", " ").split()]
+        http_path = "/index.php" if os.environ.get('APACHE_READY_HTTP', "").lower() in ("1", "true", "yes", "on") else None
+        with INSTALL_LOG.step("apache_ready"):
+            ready = self.wait_ready(ports, http_path, float(os.environ.get('APACHE_READY_TIMEOUT', 30)))
+
+        if ready is None:
+            raise RuntimeError("Apache did not become ready on port(s) " + ", ".join(str(port) for port in ports) + " within " +
+                               os.environ.get('APACHE_READY_TIMEOUT', "30") + " seconds")
+
+        # Write the readiness marker for the orchestrator's readiness check
+        seconds, status = ready
+        INSTALL_LOG.write_log("Apache ready on port(s) %s in %.3f seconds" % (", ".join(str(port) for port in ports), seconds))
+        try:
+            if not os.path.isdir(os.path.dirname(ready_file)):
+                os.makedirs(os.path.dirname(ready_file))
+            tmp_file = ready_file + "." + str(os.getpid()) + ".tmp"
+            with open(tmp_file, "w") as marker:
+                json.dump({"app_name": self.app_name, "ports": ports, "http_status": status, "seconds": seconds, "ready_at": time.time()},
+                          marker, indent=2, sort_keys=True)
+            os.rename(tmp_file, ready_file)
+        except Exception as e:
+            print("Could not write to " + ready_file)
+            print(e)
+
+        # Mark step complete
+        INSTALL_LOG.step_complete()
+        return True
@@ -5,22 +5,30 @@ Authors/Maintainers:    Rich Nason (rnason@appcontainers.io)
 Copyright:              Copyright 2016 Richard Nason
 Description:            This class will provide the ability to generate a self
                         signed certificate that will be configured and used for
-                        the container services.
+                        the container services, or with $CERT_CA set, a leaf
+                        certificate signed by a cached local CA.
 ***************************************************************************
 """
 # *******************************************************************
 # Required Modules:
 # *******************************************************************
 import os  # Used for various os level calls
+import json  # Used to read and write the certificate cache index
+import fcntl  # Used to lock the certificate cache index between writers
 import datetime  # Used for timestamp
+import tempfile  # Used to build the CA directory before publishing it, and the cert, key, and cache index temp files
+from shutil import rmtree  # Used to discard a CA directory that lost the race to be published
+from concurrent.futures import ProcessPoolExecutor, as_completed  # Used to generate certificates in parallel
 from socket import gethostname  # Library used to gather the nodes hostname for the certificate
 
-# pyOpenSSL requires libffi-dev, libssl-dev, and a pip install of pyOpenSSL, and pycrypto
-from OpenSSL import crypto, SSL  # pylint: disable=unused-import
+# pyOpenSSL (which requires libffi-dev, libssl-dev, and a pip install of pyOpenSSL) and cryptography, which is installed as
+# a pyOpenSSL dependency and builds and signs the certificates, are imported by the methods that generate or parse keys and
+# certificates. Checking an unchanged certificate against the cache index is a stat of its files, so restarts never load them.
 
 # Import custom modules
 from modules.globals import Globals
 from modules.log import Log
+from modules.keypool import KeyPool
 
 # Instantiate the global variables.
 GLOBALS = Globals()
@@ -36,16 +44,36 @@ INSTALL_LOG = Log()
 class CertGen():
     """Class to handle all things certficate related"""
 
-    def __init__(self):
+    # Supported private key algorithms, EC and Ed25519 keys generate in well under a millisecond.
+    # Browsers reject Ed25519 server certificates, so ed25519 is only meant for internal clients.
+    KEY_TYPES = ("rsa", "ec-p256", "ec-p384", "ed25519")
+
+    # Loaded CA cert and key pairs keyed by CA path, shared by every CertGen in the process.
+    ca_cache = {}
+
+    def __init__(self, key_pool=None):
         """Set instantiation variables"""
         self.app_name = os.environ['APP_NAME']
 
-        if GLOBALS.is_rhel():
-            self.cert_path = "/etc/pki/tls/certs/"
-            self.key_path = "/etc/pki/tls/private/"
-        else:
-            self.cert_path = "/etc/ssl/certs/"
-            self.key_path = "/etc/ssl/private/"
+        # Claim keys from a pre-generated key pool if one was passed in or configured.
+        if key_pool is None and os.environ.get('CERT_KEY_POOL'):
+            key_pool = KeyPool(os.environ['CERT_KEY_POOL'])
+        self.key_pool = key_pool
+
+        platform = GLOBALS.platform()
+        self.cert_path = GLOBALS.path(platform["cert_path"])
+        self.key_path = GLOBALS.path(platform["key_path"])
+
+        # The certificate cache index lives next to the certs, and is read on first use.
+        self.cache_file = os.environ.get('CERT_CACHE', self.cert_path + "runconfig-certs.json")
+        self.cache = None
+        self.reasons = {}
+
+        # In CA mode leaf certs are signed by a local CA, which is created once in the CA path and shared by the fleet.
+        self.ca_mode = os.environ.get('CERT_CA', "").lower() in ("1", "true", "yes", "on")
+        self.ca_path = os.environ.get('CERT_CA_PATH', GLOBALS.path("/var/lib/runconfig/ca/"))
+        if not self.ca_path.endswith("/"):
+            self.ca_path += "/"
 
     def cert_exists(self):
         """Check to see if a certificate already exists, returns true if it exists, false if not"""
@@ -63,121 +91,601 @@ class CertGen():
         else:
             return False
 
-    def generate_cert(self):
-        """Generate Generic Self Signed Certificates"""
-        self.generate_custom_cert(4096, "US", "US", "Some City", self.app_name, self.app_name, gethostname(), "sha512", self.app_name + ".crt")
+    def default_key_type(self):
+        """Return the key type from $CERT_KEY_TYPE, CA mode defaults to small ec-p256 leaf keys, otherwise rsa"""
+        return os.environ.get('CERT_KEY_TYPE', "ec-p256" if self.ca_mode else "rsa").lower()
+
+    @staticmethod
+    def build_ca_pair(k, common_name, encryption="sha512"):
+        """Build a self signed CA certificate good for 10 years for the passed key, returns the cert and key as PEM"""
+        from cryptography import x509
+        from cryptography.x509.oid import NameOID
+        from cryptography.hazmat.primitives import serialization
+        key = k.to_cryptography_key()
+        subject = x509.Name([x509.NameAttribute(NameOID.ORGANIZATION_NAME, common_name), x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+        now = datetime.datetime.utcnow()
+
+        cert = x509.CertificateBuilder().subject_name(subject).issuer_name(subject).public_key(key.public_key())
+        cert = cert.serial_number(x509.random_serial_number()).not_valid_before(now).not_valid_after(now + datetime.timedelta(seconds=315360000))
+        cert = cert.add_extension(x509.BasicConstraints(ca=True, path_length=0), critical=True)
+        cert = cert.add_extension(x509.KeyUsage(digital_signature=True, content_commitment=False, key_encipherment=False, data_encipherment=False,
+                                                key_agreement=False, key_cert_sign=True, crl_sign=True, encipher_only=False, decipher_only=False),
+                                  critical=True)
+        cert = cert.add_extension(x509.SubjectKeyIdentifier.from_public_key(key.public_key()), critical=False)
+        cert = CertGen.sign(cert, key, encryption)
+
+        key_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+        return cert.public_bytes(serialization.Encoding.PEM), key_pem
+
+    def create_ca(self):
+        """Generate the CA key and cert in a temp directory, and publish it as the CA path with a single rename. If another
+        container published its CA first, ours is discarded and theirs is used. Returns the CA cert and key as PEM"""
+        INSTALL_LOG.write_log("Creating the local certificate authority in " + self.ca_path)
+
+        ca_key_type = os.environ.get('CERT_CA_KEY_TYPE', "ec-p384").lower()
+        ca_name = os.environ.get('CERT_CA_NAME', "Runconfig Local CA")
+        cert_pem, key_pem = self.build_ca_pair(self.new_key(4096, ca_key_type), ca_name)
+
+        ca_dir = self.ca_path.rstrip("/")
+        if not os.path.isdir(os.path.dirname(ca_dir)):
+            os.makedirs(os.path.dirname(ca_dir))
+        tmp_dir = tempfile.mkdtemp(prefix=".ca-", dir=os.path.dirname(ca_dir))
+        with open(os.path.join(tmp_dir, "ca.crt"), "wb") as ca_cert:
+            ca_cert.write(cert_pem)
+        with open(os.path.join(tmp_dir, "ca.key"), "wb") as ca_key:
+            ca_key.write(key_pem)
+        os.chmod(os.path.join(tmp_dir, "ca.key"), 0o600)
+        os.chmod(tmp_dir, 0o755)
+
+        try:
+            os.rename(tmp_dir, ca_dir)
+        except OSError:
+            rmtree(tmp_dir)
+            with open(self.ca_path + "ca.crt", "rb") as ca_cert:
+                cert_pem = ca_cert.read()
+            with open(self.ca_path + "ca.key", "rb") as ca_key:
+                key_pem = ca_key.read()
+
+        return cert_pem, key_pem
+
+    def load_ca(self):
+        """Return the CA cert and key as PEM, the CA is created on first use, and read once per process"""
+        if self.ca_path not in CertGen.ca_cache:
+            try:
+                with open(self.ca_path + "ca.crt", "rb") as ca_cert:
+                    cert_pem = ca_cert.read()
+                with open(self.ca_path + "ca.key", "rb") as ca_key:
+                    key_pem = ca_key.read()
+            except (IOError, OSError):
+                cert_pem, key_pem = self.create_ca()
+            CertGen.ca_cache[self.ca_path] = (cert_pem, key_pem)
+        return CertGen.ca_cache[self.ca_path]
+
+    @staticmethod
+    def build_leaf_pair(k, ca_pems, country, state, loc, org, orgunit, common_name, encryption, sans=None):
+        """Build a leaf certificate for the passed key signed by the CA, with a random serial, the common name and sans as
+        subject alternative names, and a validity of $CERT_LEAF_DAYS, 397 by default. Returns the cert followed by the
+        CA cert, and the key, as PEM"""
+        from cryptography import x509
+        from cryptography.x509.oid import NameOID
+        from cryptography.hazmat.primitives import serialization
+        ca_cert = x509.load_pem_x509_certificate(ca_pems[0])
+        ca_key = serialization.load_pem_private_key(ca_pems[1], None)
+        key = k.to_cryptography_key()
+        subject = x509.Name([
+            x509.NameAttribute(NameOID.COUNTRY_NAME, country),
+            x509.NameAttribute(NameOID.STATE_OR_PROVINCE_NAME, state),
+            x509.NameAttribute(NameOID.LOCALITY_NAME, loc),
+            x509.NameAttribute(NameOID.ORGANIZATION_NAME, org),
+            x509.NameAttribute(NameOID.ORGANIZATIONAL_UNIT_NAME, orgunit),
+            x509.NameAttribute(NameOID.COMMON_NAME, common_name),
+        ])
+        now = datetime.datetime.utcnow()
+        names = [common_name] + [name for name in (sans or []) if name != common_name]
+
+        cert = x509.CertificateBuilder().subject_name(subject).issuer_name(ca_cert.subject).public_key(key.public_key())
+        cert = cert.serial_number(x509.random_serial_number()).not_valid_before(now)
+        cert = cert.not_valid_after(now + datetime.timedelta(days=int(os.environ.get('CERT_LEAF_DAYS', 397))))
+        cert = cert.add_extension(x509.SubjectAlternativeName([x509.DNSName(name) for name in names]), critical=False)
+        cert = cert.add_extension(x509.BasicConstraints(ca=False, path_length=None), critical=True)
+        cert = cert.add_extension(x509.ExtendedKeyUsage([x509.oid.ExtendedKeyUsageOID.SERVER_AUTH]), critical=False)
+        cert = cert.add_extension(x509.AuthorityKeyIdentifier.from_issuer_public_key(ca_key.public_key()), critical=False)
+        cert = CertGen.sign(cert, ca_key, encryption)
+
+        key_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+        return cert.public_bytes(serialization.Encoding.PEM) + ca_pems[0], key_pem
+
+    def load_cache(self):
+        """Return the certificate cache index, a dictionary of cache entries keyed by cert name"""
+        if self.cache is None:
+            try:
+                with open(self.cache_file, "r") as cache:
+                    self.cache = json.load(cache)
+            except (IOError, OSError, ValueError):
+                self.cache = {}
+        return self.cache
+
+    def save_cache(self, cert_name):
+        """Merge the cache entry of the passed cert name into the index on disk, and atomically replace it. Writers hold
+        a lock file and re-read the index first, so CertGen instances running at the same time keep each other's entries"""
+        cache = self.load_cache()
+        try:
+            lock = open(self.cache_file + ".lock", "a")
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    with open(self.cache_file, "r") as cache_json:
+                        merged = json.load(cache_json)
+                except (IOError, OSError, ValueError):
+                    merged = {}
+                merged[cert_name] = cache[cert_name]
+
+                # Every write gets its own temp file in the index directory, so the rename stays on one filesystem.
+                tmp_fd, tmp_file = tempfile.mkstemp(prefix=os.path.basename(self.cache_file) + ".", suffix=".tmp",
+                                                    dir=os.path.dirname(self.cache_file) or ".")
+                with os.fdopen(tmp_fd, "w") as cache_json:
+                    json.dump(merged, cache_json, indent=2, sort_keys=True)
+                os.rename(tmp_file, self.cache_file)
+            finally:
+                lock.close()
+        except (IOError, OSError) as e:
+            print("Could not write to " + self.cache_file)
+            print(e)
+            return
+
+        # Pick up the entries the other writers indexed.
+        cache.update(merged)
+
+    def cert_files(self, cert_name):
+        """Return the cert and key file paths of the passed cert name"""
+        return self.cert_path + cert_name, self.key_path + cert_name.replace(".crt", ".key")
+
+    def file_stats(self, cert_name):
+        """Return the mtime and size of the cert and key files, a cache entry is only used while they are unchanged"""
+        stats = []
+        for file_path in self.cert_files(cert_name):
+            try:
+                stat = os.stat(file_path)
+                stats.append([stat.st_mtime_ns, stat.st_size])
+            except OSError:
+                stats.append(None)
+        return stats
+
+    @staticmethod
+    def key_algorithm(public_key):
+        """Return the key type name of a public key, as passed to generate_custom_cert"""
+        from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+        if isinstance(public_key, rsa.RSAPublicKey):
+            return "rsa"
+        elif isinstance(public_key, ec.EllipticCurvePublicKey):
+            return {"secp256r1": "ec-p256", "secp384r1": "ec-p384"}.get(public_key.curve.name, "ec-" + public_key.curve.name)
+        elif isinstance(public_key, ed25519.Ed25519PublicKey):
+            return "ed25519"
+        return type(public_key).__name__
+
+    @staticmethod
+    def inspect_pair(cert_pem, key_pem):
+        """Parse a cert and key pair, returns a cache entry holding the cert fingerprint, subject, common name, SANs,
+        notAfter, key algorithm, and whether the key matches the cert"""
+        from cryptography import x509
+        from cryptography.x509.oid import NameOID
+        from cryptography.hazmat.primitives import hashes, serialization
+        cert = x509.load_pem_x509_certificate(cert_pem)
+        public_key = cert.public_key()
+
+        try:
+            sans = cert.extensions.get_extension_for_class(x509.SubjectAlternativeName).value.get_values_for_type(x509.DNSName)
+        except x509.ExtensionNotFound:
+            sans = []
+        common_names = cert.subject.get_attributes_for_oid(NameOID.COMMON_NAME)
+
+        # The key matches if its public half is the one the cert was issued for.
+        key_match = False
+        if key_pem is not None:
+            try:
+                key = serialization.load_pem_private_key(key_pem, None)
+                spki = serialization.PublicFormat.SubjectPublicKeyInfo
+                key_match = key.public_key().public_bytes(serialization.Encoding.DER, spki) == public_key.public_bytes(serialization.Encoding.DER, spki)
+            except (ValueError, TypeError):
+                pass
+
+        return {
+            "fingerprint": cert.fingerprint(hashes.SHA256()).hex(),
+            "subject": cert.subject.rfc4514_string(),
+            "issuer": cert.issuer.rfc4514_string(),
+            "common_name": common_names[0].value if common_names else None,
+            "sans": sans,
+            "not_after": cert.not_valid_after_utc.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "algorithm": CertGen.key_algorithm(public_key),
+            "key_match": key_match,
+        }
+
+    def cert_info(self, cert_name):
+        """Return the cache entry of the passed cert name, the cert and key are only parsed if they changed since they
+        were indexed. Returns None if the cert does not exist"""
+        stats = self.file_stats(cert_name)
+        if stats[0] is None:
+            return None
+
+        cache = self.load_cache()
+        entry = cache.get(cert_name)
+        if entry is not None and entry.get("stats") == stats:
+            return entry
+
+        cert_file, key_file = self.cert_files(cert_name)
+        with open(cert_file, "rb") as cert:
+            cert_pem = cert.read()
+        key_pem = None
+        if stats[1] is not None:
+            with open(key_file, "rb") as key:
+                key_pem = key.read()
+
+        try:
+            entry = self.inspect_pair(cert_pem, key_pem)
+        except ValueError as e:
+            print("Could not read " + cert_file)
+            print(e)
+            return {"stats": stats, "unreadable": True}
+
+        # Keep the reason recorded when runconfig generated the cert.
+        entry["reason"] = cache.get(cert_name, {}).get("reason") if cache.get(cert_name, {}).get("fingerprint") == entry["fingerprint"] else None
+        entry["stats"] = stats
+        cache[cert_name] = entry
+        self.save_cache(cert_name)
+        return entry
+
+    def ca_subject(self):
+        """Return the subject of the CA cert, it is only parsed if the CA cert changed since it was indexed. The CA is
+        created on first use"""
+        ca_file = self.ca_path + "ca.crt"
+        cache = self.load_cache()
+        try:
+            stat = os.stat(ca_file)
+            stats = [stat.st_mtime_ns, stat.st_size]
+        except OSError:
+            stats = None
+        entry = cache.get(ca_file)
+        if stats is not None and entry is not None and entry.get("stats") == stats:
+            return entry["subject"]
+
+        from cryptography import x509
+        subject = x509.load_pem_x509_certificate(self.load_ca()[0]).subject.rfc4514_string()
+        stat = os.stat(ca_file)
+        cache[ca_file] = {"stats": [stat.st_mtime_ns, stat.st_size], "subject": subject}
+        self.save_cache(ca_file)
+        return subject
+
+    def regenerate_reason(self, cert_name=None, common_name=None, key_type=None, sans=None):
+        """Check the cert against the cache index, returns None if it can be reused, otherwise the reason it needs to be
+        (re)generated: missing, unreadable, key missing, key mismatch, hostname mismatch, sans mismatch, key type mismatch,
+        issuer mismatch in CA mode, or expiring.
+        The common name defaults to the container hostname, the key type and sans are only checked if they are passed"""
+        if cert_name is None:
+            cert_name = self.app_name + ".crt"
+        if common_name is None:
+            common_name = gethostname()
+
+        entry = self.cert_info(cert_name)
+        if entry is None:
+            return "missing"
+        if entry.get("unreadable"):
+            return "unreadable"
+        if entry["stats"][1] is None:
+            return "key missing"
+        if not entry["key_match"]:
+            return "key mismatch"
+        if common_name != entry["common_name"] and common_name not in entry["sans"]:
+            return "hostname mismatch"
+        if sans is not None and any(name not in entry["sans"] for name in sans):
+            return "sans mismatch"
+        if key_type is not None and key_type != entry["algorithm"]:
+            return "key type mismatch"
+        if self.ca_mode and entry.get("issuer") != self.ca_subject():
+            return "issuer mismatch"
+
+        # Renew the cert once it gets within $CERT_RENEW_DAYS of its notAfter date.
+        not_after = datetime.datetime.strptime(entry["not_after"], "%Y-%m-%dT%H:%M:%SZ")
+        if not_after - datetime.datetime.utcnow() < datetime.timedelta(days=int(os.environ.get('CERT_RENEW_DAYS', 30))):
+            return "expiring"
+        return None
+
+    def generation_reason(self, cert_name=None):
+        """Return the reason runconfig last (re)generated the cert, or None if it was not generated by runconfig"""
+        if cert_name is None:
+            cert_name = self.app_name + ".crt"
+        entry = self.cert_info(cert_name)
+        if entry is None:
+            return None
+        return entry.get("reason")
+
+    def ensure_cert(self, key_type=None):
+        """Reuse the generic certificate if the cache index shows it is still valid for this host, otherwise generate it.
+        Returns the reason the cert was (re)generated, or None if it was reused"""
+        if key_type is None:
+            key_type = self.default_key_type()
 
-    def generate_custom_cert(self, keysize, country, state, loc, org, orgunit, common_name, encryption, cert_name):
-        """Generate Custom Self Signed Certificates"""
-        INSTALL_LOG.write_log_console("Generating " + self.cert_path + cert_name, "")
+        reason = self.regenerate_reason(key_type=key_type)
+        if reason is None:
+            INSTALL_LOG.write_log_console("Existing certificate " + self.cert_path + self.app_name + ".crt is valid...", "Skipping...")
+            return None
 
-        valid = True
+        INSTALL_LOG.write_log("Regenerating " + self.cert_path + self.app_name + ".crt: " + reason)
+        self.reasons[self.app_name + ".crt"] = reason
+        self.generate_cert(key_type)
+        return reason
 
+    @staticmethod
+    def new_key(keysize, key_type="rsa"):
+        """Generate a new private key of the passed key type, keysize is only used for RSA keys"""
+        from OpenSSL import crypto
+        from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+        if key_type == "ec-p256":
+            return crypto.PKey.from_cryptography_key(ec.generate_private_key(ec.SECP256R1()))
+        elif key_type == "ec-p384":
+            return crypto.PKey.from_cryptography_key(ec.generate_private_key(ec.SECP384R1()))
+        elif key_type == "ed25519":
+            return crypto.PKey.from_cryptography_key(ed25519.Ed25519PrivateKey.generate())
+
+        k = crypto.PKey()
+        k.generate_key(crypto.TYPE_RSA, keysize)
+        return k
+
+    def generate_key(self, keysize, key_type="rsa"):
+        """Claim an RSA private key from the key pool, falling back to generating the key inline"""
+        if self.key_pool is not None and key_type == "rsa":
+            k = self.key_pool.claim(keysize)
+            if k is not None:
+                return k
+
+        return self.new_key(keysize, key_type)
+
+    def generate_cert(self, key_type=None):
+        """Generate Generic Self Signed Certificates, or a CA signed leaf certificate in CA mode"""
+        if key_type is None:
+            key_type = self.default_key_type()
+        self.generate_custom_cert(4096, "US", "US", "Some City", self.app_name, self.app_name, gethostname(), "sha512", self.app_name + ".crt", key_type,
+                                  [self.app_name])
+
+    def validate_cert_values(self, keysize, country, state, loc, org, orgunit, common_name, encryption, cert_name, key_type="rsa"):
+        """Validate the values of a custom certificate, returns an error message, or None if the values are valid"""
         # Make sure that the passed in values are legit
         if not isinstance(keysize, int):
             generate_cert_error = "Key Size must be a valid integer value"
-            print(generate_cert_error)
+            INSTALL_LOG.write_console(generate_cert_error)
             return generate_cert_error
-            valid = False
+
+        if key_type not in self.KEY_TYPES:
+            generate_cert_error = "Key Type must be one of " + ", ".join(self.KEY_TYPES)
+            INSTALL_LOG.write_console(generate_cert_error)
+            return generate_cert_error
+
+        # Test the key type, browsers only accept RSA and EC server certificates.
+        if key_type == "ed25519":
+            INSTALL_LOG.write_log_console("WARNING: Ed25519 server certificates are rejected by mainstream browsers, " + str(cert_name) + " will only be accepted by internal clients.",
+                                          "A key type of ec-p256 is recommended for certificates served to browsers.")
 
         # Test the keysize
-        if keysize > 4096:
-            print("WARNING:")
-            print("=================")
-            print("Passed keysize can not be used for sha2 certificate, and could be marked invalid in some browsers.\n")
-            print("A keysize of at least 4096 is recommended.\n")
+        if key_type == "rsa" and keysize > 4096:
+            INSTALL_LOG.write_log_console("WARNING: Passed keysize can not be used for sha2 certificate, and could be marked invalid in some browsers.",
+                                          "A keysize of at least 4096 is recommended.")
+
+        if cert_name == "" or cert_name is None or not isinstance(cert_name, str):
+            generate_cert_error = "Cert Name must be a valid string value"
+            INSTALL_LOG.write_console(generate_cert_error)
+            return generate_cert_error
 
         if country == "" or country is None or not isinstance(country, str):
             generate_cert_error = "Country must be a valid string value"
-            print(generate_cert_error)
+            INSTALL_LOG.write_console(generate_cert_error)
             return generate_cert_error
-            valid = False
 
         if state == "" or state is None or not isinstance(state, str):
             generate_cert_error = "State must be a valid string value"
-            print(generate_cert_error)
+            INSTALL_LOG.write_console(generate_cert_error)
             return generate_cert_error
-            valid = False
 
         if loc == "" or loc is None or not isinstance(loc, str):
             generate_cert_error = "Location must be a valid string value"
-            print(generate_cert_error)
+            INSTALL_LOG.write_console(generate_cert_error)
             return generate_cert_error
-            valid = False
 
         if org == "" or org is None or not isinstance(org, str):
             generate_cert_error = "Organization must be a valid string value"
-            print(generate_cert_error)
+            INSTALL_LOG.write_console(generate_cert_error)
             return generate_cert_error
-            valid = False
 
         if orgunit == "" or orgunit is None or not isinstance(orgunit, str):
             generate_cert_error = "Organizational Unit must be a valid string value"
-            print(generate_cert_error)
+            INSTALL_LOG.write_console(generate_cert_error)
             return generate_cert_error
-            valid = False
 
         if common_name == "" or common_name is None or not isinstance(common_name, str):
             generate_cert_error = "Common Name must be a valid string value"
-            print(generate_cert_error)
+            INSTALL_LOG.write_console(generate_cert_error)
             return generate_cert_error
-            valid = False
 
         if isinstance(encryption, str):
             if encryption == "sha256":
-                print(self.cert_path + cert_name + " will be encrypted using sha256")
+                INSTALL_LOG.write_console(self.cert_path + cert_name + " will be encrypted using sha256")
             elif encryption == "sha512":
-                print(self.cert_path + cert_name + " will be encrypted using sha512")
+                INSTALL_LOG.write_console(self.cert_path + cert_name + " will be encrypted using sha512")
             else:
                 generate_cert_error = "Encryption must be a valid encrytion value such as sha256 or sha512"
-                print(generate_cert_error)
+                INSTALL_LOG.write_console(generate_cert_error)
                 return generate_cert_error
-                valid = False
         else:
             generate_cert_error = "Encryption must be a valid encrytion value such as sha256 or sha512"
-            print(generate_cert_error)
+            INSTALL_LOG.write_console(generate_cert_error)
             return generate_cert_error
-            valid = False
 
         if encryption != "sha512":
-            print("WARNING:")
-            print("=================")
-            print("Passed encrytion can not be used for sha2 certificate, and could be marked invalid in some browsers.\n")
-            print("An encryption level of at least sha512 is recommended.\n")
+            INSTALL_LOG.write_log_console("WARNING: Passed encrytion can not be used for sha2 certificate, and could be marked invalid in some browsers.",
+                                          "An encryption level of at least sha512 is recommended.")
+
+        return None
+
+    @staticmethod
+    def build_cert_pair(k, country, state, loc, org, orgunit, common_name, encryption, sans=None):
+        """Build a self signed certificate good for 10 years for the passed key, with the common name and sans as subject
+        alternative names, returns the cert and key as PEM"""
+        from cryptography import x509
+        from cryptography.x509.oid import NameOID
+        from cryptography.hazmat.primitives import serialization
+        key = k.to_cryptography_key()
+        subject = x509.Name([
+            x509.NameAttribute(NameOID.COUNTRY_NAME, country),
+            x509.NameAttribute(NameOID.STATE_OR_PROVINCE_NAME, state),
+            x509.NameAttribute(NameOID.LOCALITY_NAME, loc),
+            x509.NameAttribute(NameOID.ORGANIZATION_NAME, org),
+            x509.NameAttribute(NameOID.ORGANIZATIONAL_UNIT_NAME, orgunit),
+            x509.NameAttribute(NameOID.COMMON_NAME, common_name),
+        ])
+        now = datetime.datetime.utcnow()
+        names = [common_name] + [name for name in (sans or []) if name != common_name]
+
+        # Browsers only match the hostname against the subject alternative names.
+        cert = x509.CertificateBuilder().subject_name(subject).issuer_name(subject).public_key(key.public_key())
+        cert = cert.serial_number(x509.random_serial_number()).not_valid_before(now).not_valid_after(now + datetime.timedelta(seconds=315360000))
+        cert = cert.add_extension(x509.SubjectAlternativeName([x509.DNSName(name) for name in names]), critical=False)
+        cert = CertGen.sign(cert, key, encryption)
+
+        key_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+        return cert.public_bytes(serialization.Encoding.PEM), key_pem
+
+    @staticmethod
+    def sign(cert, key, encryption):
+        """Sign the certificate builder with the signing key, returns the certificate"""
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import ed25519
+        # Ed25519 signatures carry their own digest, every other key type is signed with the passed sha2 digest.
+        if isinstance(key, ed25519.Ed25519PrivateKey):
+            return cert.sign(key, None)
+        elif encryption == "sha256":
+            return cert.sign(key, hashes.SHA256())
+        return cert.sign(key, hashes.SHA512())
+
+    @staticmethod
+    def _batch_worker(spec, key_pem, ca_pems=None):
+        """Process pool worker, generates the key if one was not passed in and builds the cert pair for a batch spec,
+        signed by the CA if the CA cert and key were passed in"""
+        from OpenSSL import crypto
+        if key_pem is None:
+            k = CertGen.new_key(spec["keysize"], spec.get("key_type", "rsa"))
+        else:
+            k = crypto.load_privatekey(crypto.FILETYPE_PEM, key_pem)
+
+        if ca_pems is not None:
+            return CertGen.build_leaf_pair(k, ca_pems, spec["country"], spec["state"], spec["loc"], spec["org"], spec["orgunit"],
+                                           spec["common_name"], spec["encryption"], spec.get("sans"))
+        return CertGen.build_cert_pair(k, spec["country"], spec["state"], spec["loc"], spec["org"], spec["orgunit"], spec["common_name"], spec["encryption"],
+                                       spec.get("sans"))
+
+    def write_cert_pair(self, cert_name, cert_pem, key_pem):
+        """Atomically write the cert and key files to disk, returns the cert and key file paths"""
+        # Define key name
+        key_name = cert_name.replace(".crt", ".key")
+
+        # Write each file under a unique temp name and rename it into place, so a partial file is never left behind. The
+        # temp file is created 0600, so the private key is never readable by other users, the cert is then made world readable.
+        written = []
+        for file_path, data, mode in ((self.cert_path + cert_name, cert_pem, 0o644), (self.key_path + key_name, key_pem, 0o600)):
+            tmp_fd, tmp_file = tempfile.mkstemp(prefix=os.path.basename(file_path) + ".", suffix=".tmp", dir=os.path.dirname(file_path))
+            try:
+                with os.fdopen(tmp_fd, "wb") as pem_file:
+                    pem_file.write(data)
+                os.chmod(tmp_file, mode)
+                os.rename(tmp_file, file_path)
+            except (IOError, OSError):
+                os.unlink(tmp_file)
+                raise
+            written.append(file_path)
+
+        # Index the new pair, so the next run can reuse it without parsing it.
+        entry = self.inspect_pair(cert_pem, key_pem)
+        entry["reason"] = self.reasons.pop(cert_name, "requested")
+        entry["stats"] = self.file_stats(cert_name)
+        self.load_cache()[cert_name] = entry
+        self.save_cache(cert_name)
+
+        # In CA mode the CA subject is indexed as well, so the issuer check of the next run does not parse the CA cert.
+        if self.ca_mode:
+            self.ca_subject()
+
+        return written[0], written[1]
+
+    def generate_custom_cert(self, keysize, country, state, loc, org, orgunit, common_name, encryption, cert_name, key_type="rsa", sans=None):
+        """Generate Custom Self Signed Certificates, or in CA mode leaf certificates signed by the CA, sans lists the extra
+        subject alternative names"""
+        INSTALL_LOG.write_log_console("Generating " + self.cert_path + str(cert_name), "")
+
+        # Make sure that the passed in values are legit
+        generate_cert_error = self.validate_cert_values(keysize, country, state, loc, org, orgunit, common_name, encryption, cert_name, key_type)
+        if generate_cert_error is not None:
+            INSTALL_LOG.write_log_console("WARNING: Invalid values were passed into the create certificate process, as a result the certificate can not be generated at this time",
+                                          "Please check your values, and try again.")
+            return generate_cert_error
 
         # Generate the Cert Private Key
-        if valid:
-            INSTALL_LOG.write_log("Generating SSL Key....")
-            k = crypto.PKey()
-            k.generate_key(crypto.TYPE_RSA, keysize)
-
-            # Generate the Certifcate using the generated private Key good for 10 years.
-            cert = crypto.X509()
-            cert.get_subject().C = country
-            cert.get_subject().ST = state
-            cert.get_subject().L = loc
-            cert.get_subject().O = org
-            cert.get_subject().OU = orgunit
-            cert.get_subject().CN = common_name
-            cert.set_serial_number(1000)
-            cert.gmtime_adj_notBefore(0)
-            cert.gmtime_adj_notAfter(315360000)
-            cert.set_issuer(cert.get_subject())
-            cert.set_pubkey(k)
-            cert.sign(k, encryption)
-
-            # Define key name
-            key_name = cert_name.replace(".crt", ".key")
-
-            # Write the cert files to disk
-            with open(self.cert_path + cert_name, "wb") as cert_file:
-                cert_file.write(crypto.dump_certificate(crypto.FILETYPE_PEM, cert))
-                cert_file.close()
-            with open(self.key_path + key_name, "wb") as key_file:
-                key_file.write(crypto.dump_privatekey(crypto.FILETYPE_PEM, k))
-                key_file.close()
+        INSTALL_LOG.write_log("Generating " + key_type + " SSL Key....")
+        k = self.generate_key(keysize, key_type)
+
+        # Generate the Certifcate using the generated private Key, and write the cert files to disk
+        if self.ca_mode:
+            cert_pem, key_pem = self.build_leaf_pair(k, self.load_ca(), country, state, loc, org, orgunit, common_name, encryption, sans)
+        else:
+            cert_pem, key_pem = self.build_cert_pair(k, country, state, loc, org, orgunit, common_name, encryption, sans)
+        self.write_cert_pair(cert_name, cert_pem, key_pem)
+
+    def generate_batch(self, specs):
+        """Generate several custom self signed certificates in parallel, returns a result dictionary per spec"""
+        from OpenSSL import crypto
+        INSTALL_LOG.write_log_console("Generating " + str(len(specs)) + " certificates in parallel", "")
+
+        results = []
+        jobs = {}
+
+        # Size the process pool to the cores available to the container.
+        if hasattr(os, "sched_getaffinity"):
+            cores = len(os.sched_getaffinity(0))
         else:
-            print("WARNING:")
-            print("=================")
-            print("Invalid values were passed into the create certificate process, as a result the certificate can not be generated at this time\n")
-            print("Please check your values, and try again.")
+            cores = os.cpu_count() or 1
+
+        # The CA is loaded once here, so the workers only have to sign.
+        ca_pems = self.load_ca() if self.ca_mode else None
+
+        with ProcessPoolExecutor(max_workers=max(1, min(cores, len(specs)))) as executor:
+            for spec in specs:
+                result = {"cert_name": spec.get("cert_name"), "cert_file": None, "key_file": None, "error": None}
+                results.append(result)
+
+                # Make sure that the passed in values are legit
+                result["error"] = self.validate_cert_values(spec.get("keysize"), spec.get("country"), spec.get("state"), spec.get("loc"), spec.get("org"),
+                                                            spec.get("orgunit"), spec.get("common_name"), spec.get("encryption"), spec.get("cert_name"),
+                                                            spec.get("key_type", "rsa"))
+                if result["error"] is not None:
+                    continue
+
+                # Pooled keys are claimed here, so the workers only have to sign.
+                key_pem = None
+                if self.key_pool is not None and spec.get("key_type", "rsa") == "rsa":
+                    k = self.key_pool.claim(spec["keysize"])
+                    if k is not None:
+                        key_pem = crypto.dump_privatekey(crypto.FILETYPE_PEM, k)
+
+                jobs[executor.submit(CertGen._batch_worker, spec, key_pem, ca_pems)] = result
+
+            for job in as_completed(jobs):
+                result = jobs[job]
+                try:
+                    cert_pem, key_pem = job.result()
+                    result["cert_file"], result["key_file"] = self.write_cert_pair(result["cert_name"], cert_pem, key_pem)
+                    INSTALL_LOG.write_log("Generated " + result["cert_file"])
+                except Exception as e:
+                    result["error"] = str(e)
+                    print("Could not generate " + self.cert_path + result["cert_name"])
+                    print(e)
+
+        # Mark step complete
+        INSTALL_LOG.step_complete()
+
+        return results
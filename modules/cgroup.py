@@ -0,0 +1,110 @@
+"""
+***************************************************************************
+Class File:             Runconfig Cgroup Module
+Authors/Maintainers:    Rich Nason (rnason@appcontainers.io)
+Copyright:              Copyright 2016 Richard Nason
+Description:            This class will read the CPU quota and memory limit
+                        the container was given from its cgroup v1 or v2
+                        controllers, falling back to the host CPU count and
+                        memory when the container is not limited.
+***************************************************************************
+"""
+# *******************************************************************
+# Required Modules:
+# *******************************************************************
+import os  # Used for various os level calls
+import math  # Used to round the CPU quota up to whole cores
+
+# *******************************************************************
+# Class Definitions:
+# *******************************************************************
+
+
+class Cgroup():
+    """Class to read the container resource limits"""
+
+    def __init__(self, cgroup_path="/sys/fs/cgroup", meminfo="/proc/meminfo"):
+        """Set instantiation variables"""
+        self.cgroup_path = cgroup_path.rstrip("/")
+        self.meminfo = meminfo
+
+    def read(self, *names):
+        """Return the stripped contents of the first cgroup file found, or None if none of them exist"""
+        for name in names:
+            try:
+                with open(os.path.join(self.cgroup_path, name), "r") as cgroup_file:
+                    return cgroup_file.read().strip()
+            except (IOError, OSError):
+                continue
+        return None
+
+    def version(self):
+        """Return 2 on a cgroup v2 unified hierarchy, otherwise 1"""
+        return 2 if os.path.isfile(os.path.join(self.cgroup_path, "cgroup.controllers")) else 1
+
+    @staticmethod
+    def host_cpus():
+        """Return the number of cores the process may run on"""
+        if hasattr(os, "sched_getaffinity"):
+            return len(os.sched_getaffinity(0))
+        return os.cpu_count() or 1
+
+    def host_memory(self):
+        """Return the host memory in bytes from /proc/meminfo, or None if it can not be read"""
+        try:
+            with open(self.meminfo, "r") as meminfo:
+                for line in meminfo:
+                    if line.startswith("MemTotal:"):
+                        return int(line.split()[1]) * 1024
+        except (IOError, OSError, ValueError, IndexError):
+            pass
+        return None
+
+    def cpu_quota(self):
+        """Return the CPU quota as a number of cores, such as 1.5, or None if the container has no quota"""
+        try:
+            if self.version() == 2:
+                # cpu.max holds "<quota> <period>", or "max <period>" when unlimited.
+                quota, period = (self.read("cpu.max") or "max").split()[:2]
+                if quota == "max":
+                    return None
+            else:
+                quota = self.read("cpu/cpu.cfs_quota_us", "cpu,cpuacct/cpu.cfs_quota_us")
+                period = self.read("cpu/cpu.cfs_period_us", "cpu,cpuacct/cpu.cfs_period_us")
+                if quota is None or period is None or int(quota) <= 0:
+                    return None
+            return float(quota) / float(period)
+        except ValueError:
+            return None
+
+    def memory_limit(self):
+        """Return the memory limit in bytes, or None if the container has no limit"""
+        if self.version() == 2:
+            limit = self.read("memory.max")
+        else:
+            limit = self.read("memory/memory.limit_in_bytes")
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            return None
+
+        # An unlimited v1 cgroup reports a page aligned maximum, treat anything beyond the host memory as no limit.
+        host = self.host_memory()
+        if host is not None and limit >= host:
+            return None
+        return limit
+
+    def cpus(self):
+        """Return the cores available to the container, the CPU quota rounded up, capped by the cores it may run on"""
+        cpus = self.host_cpus()
+        quota = self.cpu_quota()
+        if quota is not None:
+            cpus = min(cpus, max(1, int(math.ceil(quota))))
+        return cpus
+
+    def memory(self):
+        """Return the memory available to the container in bytes, the cgroup limit, or the host memory"""
+        limit = self.memory_limit()
+        if limit is not None:
+            return limit
+        return self.host_memory()
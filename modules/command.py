@@ -0,0 +1,75 @@
+"""
+***************************************************************************
+Class File:             Runconfig Command Module
+Authors/Maintainers:    Rich Nason (rnason@appcontainers.io)
+Copyright:              Copyright 2016 Richard Nason
+Description:            This class will run system commands, wait for them to
+                        finish, and report their exit code, output and run
+                        time, so that no command is left running in the
+                        background.
+***************************************************************************
+"""
+# *******************************************************************
+# Required Modules:
+# *******************************************************************
+import os  # Used for various os level calls
+import time  # Used to time the commands
+import subprocess  # Used to run the commands
+from collections import namedtuple  # Used for the command results
+from concurrent.futures import ThreadPoolExecutor  # Used to run independent commands at the same time
+
+# Import custom modules
+from modules.log import Log
+
+# Instantiate the custom console logger.
+INSTALL_LOG = Log()
+
+# *******************************************************************
+# Class Definitions:
+# *******************************************************************
+
+
+class Command():
+    """Class to run system commands and report their results"""
+
+    # The result of a finished command, returncode is None if the command timed out.
+    Result = namedtuple("Result", ["command", "returncode", "stdout", "stderr", "duration"])
+
+    def __init__(self, timeout=None, max_workers=None):
+        """Set instantiation variables"""
+        if timeout is None:
+            timeout = float(os.environ.get('COMMAND_TIMEOUT', 300))
+        if max_workers is None:
+            max_workers = int(os.environ.get('COMMAND_WORKERS', 4))
+        self.timeout = timeout
+        self.max_workers = max_workers
+
+    def run(self, command, timeout=None):
+        """Run a command and wait for it to finish, a string is ran through the shell, a list is ran directly. Returns a Result"""
+        if timeout is None:
+            timeout = self.timeout
+        shell = isinstance(command, str)
+        command_str = command if shell else " ".join(command)
+
+        start = time.monotonic()
+        try:
+            process = subprocess.run(command, shell=shell, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                     universal_newlines=True, timeout=timeout)
+            result = Command.Result(command_str, process.returncode, process.stdout, process.stderr, time.monotonic() - start)
+        except subprocess.TimeoutExpired as e:
+            result = Command.Result(command_str, None, e.stdout or "", "Timed out after " + str(timeout) + " seconds", time.monotonic() - start)
+        except OSError as e:
+            result = Command.Result(command_str, 127, "", str(e), time.monotonic() - start)
+
+        # Log the result
+        if result.returncode == 0:
+            INSTALL_LOG.write_log("Ran `%s` in %.3f seconds" % (command_str, result.duration))
+        else:
+            INSTALL_LOG.write_log("Command `%s` failed with exit code %s in %.3f seconds: %s" % (
+                command_str, result.returncode, result.duration, result.stderr.strip()))
+        return result
+
+    def run_many(self, commands, timeout=None):
+        """Run independent commands at the same time on a bounded worker pool, returns the Results in command order"""
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(commands)))) as executor:
+            return list(executor.map(lambda command: self.run(command, timeout), commands))
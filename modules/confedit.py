@@ -0,0 +1,131 @@
+"""
+***************************************************************************
+Class File:             Runconfig Config Editor Module
+Authors/Maintainers:    Rich Nason (rnason@appcontainers.io)
+Copyright:              Copyright 2016 Richard Nason
+Description:            This class will queue edits to a config file, apply
+                        them all in a single pass, and atomically write the
+                        file, so that each file is rewritten at most once
+                        without forking sed.
+***************************************************************************
+"""
+# *******************************************************************
+# Required Modules:
+# *******************************************************************
+import os  # Used for various os level calls
+import re  # Used for the line substitutions
+from shutil import copymode  # Used to keep the file permissions on the rewritten file
+
+# Import custom modules
+from modules.log import Log
+
+# Instantiate the custom console logger.
+INSTALL_LOG = Log()
+
+# *******************************************************************
+# Class Definitions:
+# *******************************************************************
+
+
+class ConfigEditor():
+    """Class to edit config files in place"""
+
+    def __init__(self, file_path):
+        """Set instantiation variables"""
+        self.file_path = file_path
+        self.edits = []
+
+    def substitute(self, pattern, replacement):
+        """Queue a regex substitution, the pattern is matched against each line"""
+        self.edits.append(lambda lines: [re.sub(pattern, replacement, line) for line in lines])
+        return self
+
+    def delete_lines(self, pattern):
+        """Queue the removal of every line matching the regex pattern"""
+        self.edits.append(lambda lines: [line for line in lines if not re.search(pattern, line)])
+        return self
+
+    @staticmethod
+    def _append_line(lines, new_line):
+        """Return the lines with new_line appended, if it is not already one of them"""
+        if new_line in [line.rstrip("\n") for line in lines]:
+            return lines
+        if lines and not lines[-1].endswith("\n"):
+            lines[-1] += "\n"
+        return lines + [new_line + "\n"]
+
+    def append_if_missing(self, new_line):
+        """Queue appending a line to the file, if the file does not already contain it"""
+        self.edits.append(lambda lines: self._append_line(lines, new_line))
+        return self
+
+    def replace_block(self, name, text):
+        """Queue replacing the lines between '# BEGIN name' and '# END name' with text, the block is appended if the
+        file does not have it yet"""
+        begin = "# BEGIN " + name + "\n"
+        end = "# END " + name + "\n"
+        block = [begin] + [line + "\n" for line in text.splitlines()] + [end]
+
+        def set_block(lines):
+            """Replace or append the block"""
+            if begin in lines and end in lines[lines.index(begin):]:
+                start = lines.index(begin)
+                return lines[:start] + block + lines[lines.index(end, start) + 1:]
+            if lines and not lines[-1].endswith("\n"):
+                lines[-1] += "\n"
+            return lines + ["\n"] + block
+
+        self.edits.append(set_block)
+        return self
+
+    def set_directive(self, directive, value):
+        """Queue setting a directive such as 'ServerName www.example.com:80'. The first active directive is replaced,
+        otherwise the first commented out one is enabled, otherwise the directive is appended"""
+        active = re.compile(r'^(\s*)' + re.escape(directive) + r'(\s+).*$')
+        commented = re.compile(r'^(\s*)#\s*' + re.escape(directive) + r'(\s+).*$')
+
+        def set_value(lines):
+            """Replace, enable, or append the directive"""
+            for pattern in (active, commented):
+                for position, line in enumerate(lines):
+                    match = pattern.match(line.rstrip("\n"))
+                    if match:
+                        lines[position] = match.group(1) + directive + match.group(2) + value + "\n"
+                        return lines
+            return self._append_line(lines, directive + " " + value)
+
+        self.edits.append(set_value)
+        return self
+
+    def commit(self):
+        """Read the file once, apply every queued edit, and atomically replace the file if it changed. Returns True if it changed"""
+        try:
+            if os.path.isfile(self.file_path):
+                with open(self.file_path, "r") as config_file:
+                    original = config_file.readlines()
+            else:
+                original = []
+
+            lines = list(original)
+            for edit in self.edits:
+                lines = edit(lines)
+            self.edits = []
+
+            if lines == original:
+                return False
+
+            # Write the new file beside the original, following symlinks such as sites-enabled, and rename it into place.
+            real_path = os.path.realpath(self.file_path)
+            tmp_file = real_path + "." + str(os.getpid()) + ".tmp"
+            with open(tmp_file, "w") as config_file:
+                config_file.writelines(lines)
+            if os.path.isfile(real_path):
+                copymode(real_path, tmp_file)
+            os.rename(tmp_file, real_path)
+
+            INSTALL_LOG.write_log("Updated " + self.file_path)
+            return True
+        except Exception as e:
+            print("Could not write to " + self.file_path)
+            print(e)
+            return False
@@ -10,6 +10,7 @@ Description:            Singleton Class that will handle global variable used th
 # Required Modules:
 # *******************************************************************
 import os  # Make System Calls to interact with host
+import json  # Used to read and write the platform cache file
 
 # *******************************************************************
 # Class Definitions:
@@ -22,17 +23,158 @@ class Globals:
     class State:
         """Singleton class for global variables."""
 
-        def __init__(self):
-            """Initialize the State sub class"""
-            # Check to see if the container is a RHEL based distro.
-            if os.path.isfile('/etc/redhat-release'):
-                self.rhel_distro = True
-            else:
-                self.rhel_distro = False
+        # Distro specific paths and commands, keyed by distro family.
+        FAMILIES = {
+            "rhel": {
+                "package_mgr": "yum -y erase",
+                "list_pkgs": ["rpm", "-qa", "--qf", "%{NAME}\n"],
+                "mysql_pkg": "mysql-server",
+                "apache_user": "apache",
+                "apache_group": "apache",
+                "apache_dir": "/etc/httpd/conf/",
+                "apache_app_dir": "/etc/httpd/conf.d/",
+                "apache_conf": "httpd.conf",
+                "apache_app_conf": "apache_cent.conf",
+                "apache_binary": "httpd",
+                "apache_ctl": "apachectl",
+                "apache_log_dir": "logs",
+                "apache_run_dir": "/run/httpd",
+                "env_var_path": "/etc/sysconfig/httpd",
+                "cert_path": "/etc/pki/tls/certs/",
+                "key_path": "/etc/pki/tls/private/",
+                "www_root": "/var/www/html/",
+            },
+            "debian": {
+                "package_mgr": "apt-get -y remove --purge --auto-remove",
+                "list_pkgs": ["dpkg-query", "-W", "-f", "${Package} ${Status}\n"],
+                "mysql_pkg": "mysql-server-5.5",
+                "apache_user": "www-data",
+                "apache_group": "www-data",
+                "apache_dir": "/etc/apache2/",
+                "apache_app_dir": "/etc/apache2/sites-enabled/",
+                "apache_conf": "apache2.conf",
+                "apache_app_conf": "apache_deb.conf",
+                "apache_binary": "apache2",
+                "apache_ctl": "apache2ctl",
+                "apache_log_dir": "${APACHE_LOG_DIR}",
+                "apache_run_dir": "${APACHE_RUN_DIR}",
+                "env_var_path": "/etc/apache2/envvars",
+                "cert_path": "/etc/ssl/certs/",
+                "key_path": "/etc/ssl/private/",
+                "www_root": "/var/www/html/",
+            },
+        }
+
+        def __init__(self, cache_file=None):
+            """Initialize the State sub class, the platform is not probed until it is first needed"""
+            if cache_file is None:
+                cache_file = os.environ.get('PLATFORM_CACHE')
+            self.cache_file = cache_file
+            self.profile = None
+
+        @staticmethod
+        def root():
+            """Return the filesystem root the configuration is written under, $RUNCONFIG_ROOT, or "" for the real root"""
+            return os.environ.get('RUNCONFIG_ROOT', "").rstrip("/")
+
+        def path(self, target):
+            """Return where the absolute target path lives under the filesystem root"""
+            root = self.root()
+            if root and os.path.isabs(target):
+                return root + target
+            return target
+
+        def target(self, path):
+            """Return the absolute path a file under the filesystem root will have once the root is committed"""
+            root = self.root()
+            if root and (path == root or path.startswith(root + "/")):
+                return path[len(root):] or "/"
+            return path
+
+        def release_file(self, release_file):
+            """Return the release file to probe, the staged tree's own release files are used if it has them"""
+            if self.root() and os.path.isfile(self.path("/etc/os-release")):
+                return self.path(release_file)
+            return release_file
+
+        def os_release(self):
+            """Parse /etc/os-release into a dictionary, returns an empty dictionary on distros that do not ship it"""
+            release = {}
+            try:
+                with open(self.release_file("/etc/os-release"), "r") as os_release:
+                    for line in os_release:
+                        key, _, value = line.strip().partition("=")
+                        if key and not key.startswith("#"):
+                            release[key] = value.strip('"\'')
+            except (IOError, OSError):
+                pass
+            return release
+
+        def cache_key(self):
+            """Return the stat of the release files, a cached profile is only used while they are unchanged"""
+            key = {}
+            for release_file in ("/etc/os-release", "/etc/redhat-release"):
+                try:
+                    stat = os.stat(self.release_file(release_file))
+                    key[release_file] = [stat.st_mtime_ns, stat.st_size]
+                except OSError:
+                    key[release_file] = None
+            return key
+
+        def probe(self):
+            """Probe the distro, and return the platform profile"""
+            release = self.os_release()
+            like = (release.get("ID", "") + " " + release.get("ID_LIKE", "")).split()
+
+            # Check to see if the container is a RHEL based distro, CentOS 6 does not ship /etc/os-release.
+            rhel = os.path.isfile(self.release_file('/etc/redhat-release')) or bool(set(like) & set(["rhel", "centos", "fedora"]))
+
+            profile = {
+                "rhel": rhel,
+                "family": "rhel" if rhel else "debian",
+                "distro": release.get("ID", "centos" if rhel else "debian"),
+                "version": release.get("VERSION_ID", ""),
+                "service_mgr": "systemd" if os.path.isdir("/run/systemd/system") else "sysv",
+            }
+            profile.update(self.FAMILIES[profile["family"]])
+            return profile
+
+        def platform(self):
+            """Return the platform profile, it is probed once per process, and read from the cache file if one is set"""
+            if self.profile is not None:
+                return self.profile
+
+            key = self.cache_key() if self.cache_file else None
+            if key is not None:
+                try:
+                    with open(self.cache_file, "r") as cache:
+                        cached = json.load(cache)
+                    # A profile cached by an older runconfig that lacks a fact is probed again.
+                    if cached.get("key") == key and set(self.FAMILIES["rhel"]) <= set(cached["profile"]):
+                        self.profile = cached["profile"]
+                        return self.profile
+                except (IOError, OSError, ValueError, KeyError):
+                    pass
+
+            self.profile = self.probe()
+
+            if key is not None:
+                try:
+                    cache_dir = os.path.dirname(self.cache_file)
+                    if cache_dir and not os.path.isdir(cache_dir):
+                        os.makedirs(cache_dir)
+                    tmp_file = self.cache_file + "." + str(os.getpid()) + ".tmp"
+                    with open(tmp_file, "w") as cache:
+                        json.dump({"key": key, "profile": self.profile}, cache, indent=2, sort_keys=True)
+                    os.rename(tmp_file, self.cache_file)
+                except (IOError, OSError) as e:
+                    print("Could not write to " + self.cache_file)
+                    print(e)
+            return self.profile
 
         def is_rhel(self):
             """If the container is rhel based, return bool value defining if rhel based or not"""
-            return self.rhel_distro
+            return self.platform()["rhel"]
 
     instance = None
 
@@ -41,10 +183,26 @@ class Globals:
         if Globals.instance is None:
             Globals.instance = Globals.State()
 
+    def platform(self):
+        """Return the platform profile dictionary of distro, package, apache, cert and service facts"""
+        return Globals.instance.platform()
+
     def is_rhel(self):
         """If the container is rhel based, return bool value defining if rhel based or not"""
         return Globals.instance.is_rhel()
 
+    def root(self):
+        """Return the filesystem root the configuration is written under, $RUNCONFIG_ROOT, or "" for the real root"""
+        return Globals.instance.root()
+
+    def path(self, target):
+        """Return where the absolute target path lives under the filesystem root"""
+        return Globals.instance.path(target)
+
+    def target(self, path):
+        """Return the absolute path a file under the filesystem root will have once the root is committed"""
+        return Globals.instance.target(path)
+
     def __getattr__(self, name):
         """Get Attributes"""
         return getattr(self.instance, name)
@@ -0,0 +1,206 @@
+"""
+***************************************************************************
+Class File:             Runconfig Key Pool Module
+Authors/Maintainers:    Rich Nason (rnason@appcontainers.io)
+Copyright:              Copyright 2016 Richard Nason
+Description:            This class will maintain an on disk pool of pre-generated
+                        private keys, so that certificate generation can claim a
+                        ready key instead of generating one on the container boot
+                        path.
+***************************************************************************
+"""
+# *******************************************************************
+# Required Modules:
+# *******************************************************************
+import os  # Used for various os level calls
+import sys  # Used to read the producer arguments
+import json  # Used to read and write the pool index
+import time  # Used to time key generation for the refill rate
+import uuid  # Used to generate unique key file names
+import fcntl  # Used to lock the pool index between processes
+import threading  # Used to fill the pool in the background
+from socket import gethostname  # Used to record which container generated each key
+
+# pyOpenSSL, which requires libffi-dev, libssl-dev, and a pip install of pyOpenSSL, is imported by the methods that
+# generate or load keys, so a restart that claims no key never loads it.
+
+# Import custom modules
+from modules.globals import Globals
+from modules.log import Log
+
+# Instantiate the global variables.
+GLOBALS = Globals()
+
+# Instantiate the custom console logger.
+INSTALL_LOG = Log()
+
+# *******************************************************************
+# Class Definitions:
+# *******************************************************************
+
+
+class KeyPool():
+    """Class to produce and claim pre-generated private keys"""
+
+    def __init__(self, pool_path=None):
+        """Set instantiation variables, the pool defaults to /var/lib/runconfig/keypool/ under $RUNCONFIG_ROOT"""
+        if pool_path is None:
+            pool_path = GLOBALS.path("/var/lib/runconfig/keypool/")
+        self.pool_path = pool_path
+        self.ready_path = os.path.join(self.pool_path, "ready/")
+        self.claimed_path = os.path.join(self.pool_path, "claimed/")
+        self.index_file = os.path.join(self.pool_path, "index.json")
+        self.lock_file = os.path.join(self.pool_path, ".lock")
+
+        for directory in (self.ready_path, self.claimed_path):
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+
+    def _lock(self):
+        """Open and exclusively lock the pool lock file, returns the open lock file"""
+        lock = open(self.lock_file, "a")
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock
+
+    def _read_index(self):
+        """Read the pool index, returns an empty index if it does not exist yet"""
+        index = {"keys": {}, "stats": {"hits": 0, "misses": 0, "produced": 0, "fill_seconds": 0.0}}
+        try:
+            with open(self.index_file, "r") as index_file:
+                index.update(json.load(index_file))
+        except (IOError, OSError, ValueError):
+            pass
+        return index
+
+    def _write_index(self, index):
+        """Atomically replace the pool index"""
+        tmp_file = self.index_file + "." + str(os.getpid()) + ".tmp"
+        with open(tmp_file, "w") as index_file:
+            json.dump(index, index_file, indent=2, sort_keys=True)
+        os.rename(tmp_file, self.index_file)
+
+    def in_image_layer(self):
+        """Return True if the pool is on the root filesystem rather than a volume mounted for the container, so keys
+        generated during an image build are part of the image, and shared by every container started from it"""
+        try:
+            return os.stat(self.pool_path).st_dev == os.stat(GLOBALS.path("/")).st_dev
+        except OSError:
+            return False
+
+    def available(self, keysize=4096):
+        """Return the number of ready keys of the given size in the pool"""
+        index = self._read_index()
+        return len([name for name, key in index["keys"].items() if key["bits"] == keysize])
+
+    def stats(self):
+        """Return a dictionary of the pool metrics"""
+        index = self._read_index()
+        stats = dict(index["stats"])
+        stats["available"] = len(index["keys"])
+        if stats["fill_seconds"] > 0:
+            stats["refill_rate"] = stats["produced"] / stats["fill_seconds"]
+        else:
+            stats["refill_rate"] = 0.0
+        return stats
+
+    def log_metrics(self):
+        """Write the pool metrics to the logfile"""
+        stats = self.stats()
+        INSTALL_LOG.write_log("Key pool metrics: hits=%d misses=%d produced=%d available=%d refill_rate=%.2f keys/s" % (
+            stats["hits"], stats["misses"], stats["produced"], stats["available"], stats["refill_rate"]))
+
+    def fill(self, count, keysize=4096):
+        """Generate keys until the pool holds count ready keys of the given size"""
+        from OpenSSL import crypto
+        INSTALL_LOG.write_log("Filling key pool " + self.pool_path + " to " + str(count) + " keys")
+        if self.in_image_layer():
+            INSTALL_LOG.write_log_console("WARNING: key pool " + self.pool_path + " is not on a volume, keys filled into it during an image build are shared by every container started from the image",
+                                          "Fill the pool at container start, or mount a volume for each container at the pool path")
+
+        while self.available(keysize) < count:
+            start = time.time()
+            k = crypto.PKey()
+            k.generate_key(crypto.TYPE_RSA, keysize)
+
+            # Write the key under a temp name, and rename it into place so a claimer never sees a partial key
+            key_name = "rsa-" + str(keysize) + "-" + uuid.uuid4().hex + ".pem"
+            tmp_file = os.path.join(self.pool_path, key_name + ".tmp")
+            with open(tmp_file, "wb") as key_file:
+                key_file.write(crypto.dump_privatekey(crypto.FILETYPE_PEM, k))
+            os.chmod(tmp_file, 0o600)
+            os.rename(tmp_file, os.path.join(self.ready_path, key_name))
+            elapsed = time.time() - start
+
+            lock = self._lock()
+            try:
+                index = self._read_index()
+                index["keys"][key_name] = {"type": "rsa", "bits": keysize, "created": time.time(), "host": gethostname()}
+                index["stats"]["produced"] += 1
+                index["stats"]["fill_seconds"] += elapsed
+                self._write_index(index)
+            finally:
+                lock.close()
+
+        self.log_metrics()
+
+    def fill_background(self, count, keysize=4096):
+        """Fill the pool from a background thread, returns the running thread"""
+        producer = threading.Thread(target=self.fill, args=(count, keysize))
+        producer.daemon = True
+        producer.start()
+        return producer
+
+    def claim(self, keysize=4096):
+        """Claim a ready key of the given size, returns the key or None if the pool is empty"""
+        claimed_file = None
+        claimed_key = None
+
+        lock = self._lock()
+        try:
+            index = self._read_index()
+            for key_name in sorted(index["keys"]):
+                if index["keys"][key_name]["bits"] != keysize:
+                    continue
+                claimed_key = index["keys"].pop(key_name)
+
+                # The rename is the claim, if the file is already gone the index was stale.
+                try:
+                    claimed_file = os.path.join(self.claimed_path, key_name + "." + str(os.getpid()))
+                    os.rename(os.path.join(self.ready_path, key_name), claimed_file)
+                    break
+                except OSError:
+                    claimed_file = None
+                    claimed_key = None
+
+            if claimed_file:
+                index["stats"]["hits"] += 1
+            else:
+                index["stats"]["misses"] += 1
+            self._write_index(index)
+        finally:
+            lock.close()
+
+        if not claimed_file:
+            INSTALL_LOG.write_log("Key pool miss for a " + str(keysize) + " bit key")
+            self.log_metrics()
+            return None
+
+        from OpenSSL import crypto
+        with open(claimed_file, "rb") as key_file:
+            k = crypto.load_privatekey(crypto.FILETYPE_PEM, key_file.read())
+        os.remove(claimed_file)
+
+        INSTALL_LOG.write_log("Key pool hit for a " + str(keysize) + " bit key")
+
+        # A key that another host put in a pool on the root filesystem was most likely baked into the image.
+        if claimed_key.get("host") != gethostname() and self.in_image_layer():
+            INSTALL_LOG.write_log_console("WARNING: claimed a private key generated by " + str(claimed_key.get("host")) + " from key pool " + self.pool_path +
+                                          ", which is not on a volume", "Every container started from the image may share this key, fill the pool at container start instead")
+        self.log_metrics()
+        return k
+
+
+# Fill the pool at container start, or on a volume mounted for the container: python -m modules.keypool <count> [keysize]
+if __name__ == '__main__':
+    POOL = KeyPool(os.environ.get('CERT_KEY_POOL'))
+    POOL.fill(int(sys.argv[1]), int(sys.argv[2]) if len(sys.argv) > 2 else 4096)
@@ -10,7 +10,21 @@ Description:            This class will provide very basic logging capabilities.
 # Required Modules:
 # *******************************************************************
 import os  # Used for various os level calls
+import sys  # Used to write structured events to stdout
+import json  # Used to write the step timing file and structured events
+import queue  # Used to hand records to the background log writer
 import datetime  # Used for timestamp
+import time  # Used for time based flushing and step timing
+import contextlib  # Used to build the step context manager/decorator
+import atexit  # Used to flush the log when the process exits
+import signal  # Used to flush the log when the container is stopped
+import threading  # Used to lock the log buffer
+
+# Import custom modules
+from modules.globals import Globals
+
+# Instantiate the global variables.
+GLOBALS = Globals()
 
 # *******************************************************************
 # Class Definitions:
@@ -20,56 +34,368 @@ import datetime  # Used for timestamp
 class Log():
     """This module will handle logging config info to the console and to the logfile"""
 
+    class Writer:
+        """Buffered writer that keeps the logfile open for the life of the process"""
+
+        def __init__(self, log_file):
+            """Initialize the Writer sub class"""
+            self.log_file = log_file
+            self.buffer_size = int(os.environ.get('LOG_BUFFER_SIZE', 8192))
+            self.flush_interval = float(os.environ.get('LOG_FLUSH_INTERVAL', 1.0))
+            self.buffer = []
+            self.buffered = 0
+            self.last_flush = time.time()
+            self.handle = None
+            self.lock = threading.RLock()
+
+        def write(self, data, flush=False, console=False):
+            """Add data to the buffer, and flush the buffer if it is full, stale, or a flush was requested"""
+            if not Log.previous_handlers:
+                Log.install_handlers()
+            if console:
+                sys.stdout.write(data)
+            with self.lock:
+                self.buffer.append(data)
+                self.buffered += len(data)
+                if flush or self.buffered >= self.buffer_size or time.time() - self.last_flush >= self.flush_interval:
+                    self._flush()
+
+        def flush(self):
+            """Write the buffer to the logfile in a single write"""
+            self._flush()
+
+        def _flush(self):
+            """Write the buffer to the logfile in a single write"""
+            with self.lock:
+                # Swap the buffer out first, so a flush from a signal handler can not write the same records twice.
+                buffer, self.buffer = self.buffer, []
+                self.buffered = 0
+                self.last_flush = time.time()
+                if not buffer:
+                    return
+                try:
+                    if self.handle is None:
+                        # The log directory is created on the first write, so importing a module never touches the disk.
+                        # The logfile is opened under $RUNCONFIG_ROOT, close the writer to follow a change of root.
+                        log_file = GLOBALS.path(self.log_file)
+                        if not os.path.isdir(os.path.dirname(log_file)):
+                            os.makedirs(os.path.dirname(log_file))
+                        self.handle = open(log_file, 'a')
+                    self.handle.write("".join(buffer))
+                    self.handle.flush()
+                except Exception as e:
+                    print("Failed to write to " + self.log_file + "\n")
+                    print(e)
+
+        def close(self):
+            """Flush the buffer and close the logfile"""
+            with self.lock:
+                self._flush()
+                if self.handle is not None:
+                    self.handle.close()
+                    self.handle = None
+
+    class AsyncWriter(Writer):
+        """Buffered writer that hands records to a background thread, so the configuration steps never block on log I/O"""
+
+        def __init__(self, log_file):
+            """Initialize the AsyncWriter sub class, the background thread is started by the first write"""
+            Log.Writer.__init__(self, log_file)
+            self.queue = queue.Queue()
+            self.thread = None
+
+        def _start(self):
+            """Start the background thread on the first write"""
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._drain, name="log-writer")
+                    self.thread.daemon = True
+                    self.thread.start()
+
+        def _drain(self):
+            """Background thread that writes the queued records"""
+            while True:
+                data, flush, console = self.queue.get()
+                try:
+                    if data:
+                        Log.Writer.write(self, data, flush, console)
+                    elif flush:
+                        self._flush()
+                finally:
+                    self.queue.task_done()
+
+        def write(self, data, flush=False, console=False):
+            """Queue the data for the background thread"""
+            if not Log.previous_handlers:
+                Log.install_handlers()
+            if self.thread is None:
+                self._start()
+            self.queue.put((data, flush, console))
+
+        def flush(self):
+            """Queue a flush, and wait for the background thread to write everything queued before it"""
+            if self.thread is None:
+                return
+            self.queue.put(("", True, False))
+            self.queue.join()
+
+        def close(self):
+            """Flush the queue and close the logfile"""
+            self.flush()
+            Log.Writer.close(self)
+
+    class Step(contextlib.ContextDecorator):
+        """Context manager and decorator that records the start, end, and duration of a configuration step"""
+
+        def __init__(self, log, name):
+            """Initialize the Step sub class"""
+            self.log = log
+            self.name = name
+            self.start = None
+
+        def _recreate_cm(self):
+            """Give every decorated call its own Step, so concurrent calls do not share a start time"""
+            return Log.Step(self.log, self.name)
+
+        def __enter__(self):
+            """Record the step start time"""
+            self.start = time.monotonic()
+            Log.context.__dict__.setdefault("steps", []).append(self.name)
+            self.log.write_log("Step " + self.name + " started")
+            return self
+
+        def __exit__(self, exc_type, exc_value, traceback):
+            """Record the step end time and duration"""
+            end = time.monotonic()
+            status = "failed" if exc_type is not None else "ok"
+            with Log.lock:
+                Log.timings.append({
+                    "step": self.name,
+                    "start": Log.zoned_stamp(self.start),
+                    "end": Log.zoned_stamp(end),
+                    "offset": self.start - Log.mono_start,
+                    "duration": end - self.start,
+                    "status": status,
+                })
+            self.log.write_record("Step %s %s in %.3f seconds" % (self.name, "finished" if status == "ok" else "failed", end - self.start),
+                                  "INFO" if status == "ok" else "ERROR", end - self.start)
+            Log.context.steps.pop()
+            return False
+
+    writers = {}
+    previous_handlers = {}
+    exit_handler = False
+    timings = []
+    lock = threading.Lock()
+    context = threading.local()
+
+    # Record timestamps are derived from a monotonic clock anchored to the wall clock at startup.
+    wall_start = time.time()
+    mono_start = time.monotonic()
+
     def __init__(self):
         """Set instantiation variables"""
-        self.date = datetime.datetime.now()
-        self.date = str(self.date)
         self.log_path = "/var/log/docker/"
         self.log_filename = "install.log"
         self.log_file = os.path.join(self.log_path, self.log_filename)
 
-        if not os.path.isdir(self.log_path):
-            os.makedirs(self.log_path)
+        # Write JSON lines events instead of the banner format when $LOG_FORMAT is set to json.
+        self.structured = os.environ.get('LOG_FORMAT', "banner").lower() == "json"
+
+        # Every Log instance writing to the same file shares one buffered writer, which writes from a
+        # background thread when $LOG_ASYNC is true, the default for the structured format.
+        if self.log_file not in Log.writers:
+            if os.environ.get('LOG_ASYNC', "true" if self.structured else "false").lower() == "true":
+                Log.writers[self.log_file] = Log.AsyncWriter(self.log_file)
+            else:
+                Log.writers[self.log_file] = Log.Writer(self.log_file)
+        self.writer = Log.writers[self.log_file]
+
+    @staticmethod
+    def timestamp(monotonic=None):
+        """Return the local wall clock datetime of a monotonic clock reading, with its UTC offset, defaults to now"""
+        if monotonic is None:
+            monotonic = time.monotonic()
+        return datetime.datetime.fromtimestamp(Log.wall_start + monotonic - Log.mono_start).astimezone()
+
+    @staticmethod
+    def stamp(monotonic=None):
+        """Return the timestamp of a monotonic clock reading formatted for a log record, defaults to now"""
+        return Log.timestamp(monotonic).strftime("%Y-%m-%d %H:%M:%S.%f")
+
+    @staticmethod
+    def zoned_stamp(monotonic=None):
+        """Return the timestamp of a monotonic clock reading with its UTC offset, such as 2016-05-01 12:00:00.000000+00:00,
+        for the structured events and the timings file, defaults to now"""
+        return Log.timestamp(monotonic).isoformat(" ", "microseconds")
+
+    @staticmethod
+    def current_step():
+        """Return the name of the step running in the calling thread, or None"""
+        steps = getattr(Log.context, "steps", None)
+        if steps:
+            return steps[-1]
+        return None
+
+    @staticmethod
+    def flush_all():
+        """Flush every open logfile"""
+        for writer in list(Log.writers.values()):
+            writer.flush()
+
+    @staticmethod
+    def close_all():
+        """Flush and close every open logfile"""
+        for writer in list(Log.writers.values()):
+            writer.close()
+
+    @staticmethod
+    def install_handlers():
+        """Flush the buffered log on exit, and when the container is stopped or interrupted. The handlers are installed by
+        the first write, signal handlers can only be installed from the main thread, so a later write from it installs them"""
+        is_main = threading.current_thread() is threading.main_thread()
+        if Log.exit_handler and not is_main:
+            return
+        with Log.lock:
+            if not Log.exit_handler:
+                atexit.register(Log.close_all)
+                Log.exit_handler = True
+            if not Log.previous_handlers and is_main:
+                for signum in (signal.SIGTERM, signal.SIGINT):
+                    Log.previous_handlers[signum] = signal.getsignal(signum)
+                    signal.signal(signum, Log._signal_flush)
+
+    @staticmethod
+    def _signal_flush(signum, frame):
+        """Flush the logfiles when the process is signalled, then hand the signal to the previous handler"""
+        Log.close_all()
+        previous = Log.previous_handlers.get(signum)
+        if callable(previous):
+            previous(signum, frame)
+        elif previous != signal.SIG_IGN:
+            signal.signal(signum, signal.SIG_DFL)
+            os.kill(os.getpid(), signum)
+
+    def flush(self):
+        """Write any buffered messages to the logfile"""
+        self.writer.flush()
+
+    def close(self):
+        """Write any buffered messages to the logfile, and close it"""
+        self.writer.close()
+
+    def step(self, name):
+        """Return a context manager/decorator that times the named step"""
+        return Log.Step(self, name)
+
+    def timing_summary(self):
+        """Return a table of the recorded step timings"""
+        with Log.lock:
+            timings = list(Log.timings)
+
+        lines = ["%-24s %10s %10s  %s" % ("Step", "Start (s)", "Time (s)", "Status")]
+        for timing in timings:
+            lines.append("%-24s %10.3f %10.3f  %s" % (timing["step"], timing["offset"], timing["duration"], timing["status"]))
+        lines.append("%-24s %10s %10.3f" % ("Total", "", time.monotonic() - Log.mono_start))
+        return "\n".join(lines)
+
+    def write_timing_summary(self):
+        """Write the step timing table to the console and the logfile"""
+        if self.structured:
+            with Log.lock:
+                timings = list(Log.timings)
+            for timing in timings:
+                self.writer.write(self.event("INFO", "Step " + timing["step"] + " " + timing["status"], timing["duration"], timing["step"]), console=True)
+            self.writer.write(self.event("INFO", "Total", time.monotonic() - Log.mono_start), flush=True, console=True)
+            return
+
+        summary = self.timing_summary()
+        print(summary)
+        stamp = self.stamp()
+        self.writer.write("".join(stamp + " : " + line + "\n" for line in summary.split("\n")), flush=True)
+
+    def write_timings(self, timing_file=None):
+        """Write the recorded step timings to a JSON file, defaults to timings.json in the log directory"""
+        if timing_file is None:
+            timing_file = GLOBALS.path(os.path.join(self.log_path, "timings.json"))
+
+        with Log.lock:
+            timings = {
+                "pid": os.getpid(),
+                "started": Log.zoned_stamp(Log.mono_start),
+                "total": time.monotonic() - Log.mono_start,
+                "steps": list(Log.timings),
+            }
 
-    def write_log(self, msg):
-        """Write sent message to logfile"""
         try:
-            with open(self.log_file, 'a') as log:
-                log.write(self.date + " : " + msg + "\n")
-                log.close()
+            if not os.path.isdir(os.path.dirname(timing_file)):
+                os.makedirs(os.path.dirname(timing_file))
+            tmp_file = timing_file + "." + str(os.getpid()) + ".tmp"
+            with open(tmp_file, "w") as timings_json:
+                json.dump(timings, timings_json, indent=2)
+            os.rename(tmp_file, timing_file)
         except Exception as e:
-            print("Failed to write to " + self.log_file + "\n")
+            print("Failed to write to " + timing_file + "\n")
             print(e)
 
+    def event(self, level, message, duration=None, step=None):
+        """Render a structured log event as a JSON line"""
+        return json.dumps({
+            "timestamp": self.zoned_stamp(),
+            "level": level,
+            "step": step or Log.current_step(),
+            "message": message,
+            "duration": duration,
+            "pid": os.getpid(),
+        }) + "\n"
+
+    def write_record(self, msg, level="INFO", duration=None):
+        """Write a single record to the logfile, or a structured event to the logfile and stdout"""
+        if self.structured:
+            self.writer.write(self.event(level, msg, duration), console=True)
+        else:
+            self.writer.write(self.stamp() + " : " + msg + "\n")
+
+    def write_log(self, msg):
+        """Write sent message to logfile"""
+        self.write_record(msg)
+
+    def write_console(self, msg, duration=None):
+        """Write a single record to the logfile and the console, a structured event carries the duration in seconds"""
+        if self.structured:
+            self.writer.write(self.event("INFO", msg, duration), console=True)
+            return
+
+        print(msg)
+        self.writer.write(self.stamp() + " : " + msg + "\n")
+
     def write_log_console(self, msg1, msg2):
         """Write the sent messages to the log and to the console"""
-        print("\n")
-        print("**************************************************")
-        print(msg1)
-        print(msg2)
-        print("**************************************************")
-        print("\n")
+        if self.structured:
+            self.writer.write(self.event("INFO", (msg1 + " " + msg2).strip()), flush=True, console=True)
+            return
 
-        try:
-            with open(self.log_file, 'a') as log:
-                log.write("\n")
-                log.write("**************************************************\n")
-                log.write(self.date + " : " + msg1 + "\n")
-                log.write(self.date + " : " + msg2 + "\n")
-                log.write("**************************************************\n")
-                log.write("\n")
-                log.close()
-        except Exception as e:
-            print("Failed to write to " + self.log_file + "\n")
-            print(e)
+        print("\n\n"
+              "**************************************************\n" +
+              msg1 + "\n" +
+              msg2 + "\n"
+              "**************************************************\n"
+              "\n\n", end="")
+
+        stamp = self.stamp()
+        self.writer.write("\n"
+                          "**************************************************\n" +
+                          stamp + " : " + msg1 + "\n" +
+                          stamp + " : " + msg2 + "\n"
+                          "**************************************************\n"
+                          "\n", flush=True)
 
     def step_complete(self):
         """Echo that the step has completed."""
-        try:
-            with open(self.log_file, 'a') as log:
-                print("Complete")
-                log.write(self.date + " : Complete\n")
-                log.close()
-        except Exception as e:
-            print("Failed to write to " + self.log_file + "\n")
-            print(e)
+        if self.structured:
+            self.writer.write(self.event("INFO", "Complete"), flush=True, console=True)
+            return
+
+        print("Complete")
+        self.writer.write(self.stamp() + " : Complete\n", flush=True)
+
@@ -13,8 +13,10 @@ Description:            This class pull a Mode value from the containers
 # Required Modules:
 # *******************************************************************
 import os  # Used for various os level calls
+import time  # Used to time the package removal
 from modules.globals import Globals
 from modules.log import Log
+from modules.command import Command
 
 # Instantiate the global variables.
 GLOBALS = Globals()
@@ -22,6 +24,9 @@ GLOBALS = Globals()
 # Instantiate the custom console logger.
 INSTALL_LOG = Log()
 
+# Instantiate the command runner.
+COMMANDS = Command()
+
 # *******************************************************************
 # Class Definitions:
 # *******************************************************************
@@ -32,15 +37,29 @@ class Mode():
 
     def __init__(self):
         """Set instantiation variables"""
-        # Create a list of packages that get installed
-        if GLOBALS.is_rhel:
-            self.package_mgr = "yum -y erase"
-            self.remove_pkgs = self.package_mgr + " %s"
-            self.mysql_pkg = "mysql-server"
-        else:
-            self.package_mgr = "apt-get -y remove --purge"
-            self.remove_pkgs = self.package_mgr + " %s" + "; apt-get -y autoremove"
-            self.mysql_pkg = "mysql-server-5.5"
+        # Read the package manager commands from the platform profile
+        platform = GLOBALS.platform()
+        self.package_mgr = platform["package_mgr"]
+        self.remove_pkgs = self.package_mgr + " %s"
+        self.list_pkgs = platform["list_pkgs"]
+        self.mysql_pkg = platform["mysql_pkg"]
+
+        self.installed = None
+
+    def installed_packages(self):
+        """Return the set of installed package names, or None if the package database can not be read. The snapshot is cached"""
+        if self.installed is None:
+            result = COMMANDS.run(self.list_pkgs)
+            if result.returncode != 0:
+                return None
+
+            # rpm lists one name per line, dpkg-query lists the name followed by its status.
+            self.installed = set()
+            for line in result.stdout.splitlines():
+                fields = line.split()
+                if len(fields) == 1 or (fields and line.endswith("install ok installed")):
+                    self.installed.add(fields[0])
+        return self.installed
 
     def config_verify(self, checkfile):
         """Method to determine if the environment has already been configured, Returns True/False value"""
@@ -55,9 +74,29 @@ class Mode():
         # Log to console/logfile
         INSTALL_LOG.write_log_console("Data Volume Mode Detected...", "Removing unnecessary packages...")
 
-        # Remove unnecessary packages, and recreate rpm/yum sync
-        os.popen(self.remove_pkgs % (deplist,))
-        os.popen(self.remove_pkgs % (self.mysql_pkg,))
+        # Work out the full set of packages to remove, and drop the ones that are not installed.
+        start = time.monotonic()
+        packages = set(deplist.split()) | set([self.mysql_pkg])
+        installed = self.installed_packages()
+        if installed is not None:
+            packages &= installed
+        packages = sorted(packages)
+
+        # Remove unnecessary packages in a single package manager transaction, and recreate rpm/yum sync.
+        if packages:
+            result = COMMANDS.run(self.remove_pkgs % (" ".join(packages),))
+            if result.returncode == 0:
+                INSTALL_LOG.write_log("Removed %d packages in %.3f seconds: %s" % (len(packages), time.monotonic() - start, " ".join(packages)))
+            else:
+                print("Could not remove " + " ".join(packages))
+                print(result.stderr)
+
+            # The package database changed, so the next snapshot has to be read again.
+            self.installed = None
+        else:
+            INSTALL_LOG.write_log("None of the packages are installed, nothing to remove")
 
         # Mark step complete
         INSTALL_LOG.step_complete()
+
+        return packages
@@ -0,0 +1,205 @@
+"""
+***************************************************************************
+Class File:             Runconfig PHP Configuration Module
+Authors/Maintainers:    Rich Nason (rnason@appcontainers.io)
+Copyright:              Copyright 2016 Richard Nason
+Description:            This class will configure the PHP opcode cache that
+                        the Apache application runs under, sized to the
+                        container memory and the application's PHP files.
+***************************************************************************
+"""
+# *******************************************************************
+# Required Modules:
+# *******************************************************************
+import os  # Used for various os level calls
+
+# Import custom modules
+from modules.globals import Globals
+from modules.log import Log
+from modules.command import Command
+from modules.template import TemplateEngine
+from modules.cgroup import Cgroup
+
+# Instantiate the global variables.
+GLOBALS = Globals()
+
+# Instantiate the custom console logger.
+INSTALL_LOG = Log()
+
+# Instantiate the command runner.
+COMMANDS = Command()
+
+# Instantiate the template engine.
+TEMPLATES = TemplateEngine()
+
+# *******************************************************************
+# Class Definitions:
+# *******************************************************************
+
+
+class Php():
+    """Class to configure PHP"""
+
+    # Opcode caches in order of preference, with the name PHP lists them under, their extension file, and their template.
+    CACHES = (
+        ("opcache", "Zend OPcache", "opcache.so", "opcache.ini"),
+        ("xcache", "XCache", "xcache.so", "xcache.ini"),
+        ("apc", "apc", "apc.so", "apc.ini"),
+        ("apcu", "apcu", "apcu.so", "apc.ini"),
+    )
+
+    # PHP rounds opcache.max_accelerated_files up to the first of these primes.
+    PRIMES = (223, 463, 983, 1979, 3907, 7963, 16229, 32531, 65407, 130987, 262237, 524521, 1048793)
+
+    # Extensions of the files PHP compiles.
+    PHP_EXTENSIONS = (".php", ".inc", ".phtml")
+
+    def __init__(self):
+        """Set instantiation variables"""
+        self.app_name = os.environ['APP_NAME']
+        self.php_binary = os.environ.get('PHP_BINARY', "php")
+        self.www_root = GLOBALS.path(GLOBALS.platform()["www_root"])
+
+    def php_info(self):
+        """Ask the PHP CLI for its version, extension directory, ini scan directory and loaded extensions, returns a
+        dictionary, or None if PHP is not installed"""
+        script = ('echo PHP_VERSION, "\\n", ini_get("extension_dir"), "\\n", PHP_CONFIG_FILE_SCAN_DIR, "\\n", '
+                  'implode(",", array_merge(get_loaded_extensions(), get_loaded_extensions(true))), "\\n";')
+        result = COMMANDS.run([self.php_binary, "-r", script])
+        if result.returncode != 0:
+            return None
+
+        lines = result.stdout.split("\n")
+        if len(lines) < 4:
+            return None
+        return {
+            "version": lines[0].strip(),
+            "extension_dir": lines[1].strip(),
+            "scan_dir": lines[2].strip(),
+            "extensions": [extension.lower() for extension in lines[3].strip().split(",") if extension],
+        }
+
+    @staticmethod
+    def version_tuple(version):
+        """Return the major and minor version numbers of a PHP version string, such as (7, 4) for 7.4.33"""
+        numbers = []
+        for part in version.split(".")[:2]:
+            digits = "".join(character for character in part if character.isdigit())
+            numbers.append(int(digits) if digits else 0)
+        return tuple(numbers + [0] * (2 - len(numbers)))
+
+    def select_cache(self, info):
+        """Return the (cache, template, load line) of the preferred opcode cache, a cache that is already loaded is
+        preferred over one that is only installed. Returns None if no opcode cache is available"""
+        for cache, name, extension_file, template in self.CACHES:
+            if name.lower() in info["extensions"]:
+                return cache, template, "; " + name + " is loaded by the distro ini files"
+        for cache, name, extension_file, template in self.CACHES:
+            if info["extension_dir"] and os.path.isfile(os.path.join(info["extension_dir"], extension_file)):
+                return cache, template, ("zend_extension=" if cache == "opcache" else "extension=") + extension_file
+        return None
+
+    def ini_dir(self, info):
+        """Return the directory the ini file is written to, $PHP_INI_DIR, or the PHP scan directory, which on debian is
+        the apache2 SAPI directory beside the cli one. Returns None if PHP was built without a scan directory, as an ini
+        file written anywhere else is never read"""
+        ini_dir = os.environ.get('PHP_INI_DIR') or info["scan_dir"]
+        if not ini_dir:
+            return None
+        apache_dir = ini_dir.replace("/cli/", "/apache2/")
+        if apache_dir != ini_dir and os.path.isdir(GLOBALS.path(apache_dir)):
+            ini_dir = apache_dir
+        return GLOBALS.path(ini_dir.rstrip("/") + "/")
+
+    def count_php_files(self, app_path=None):
+        """Return the number of PHP files under the application document root"""
+        if app_path is None:
+            app_path = self.www_root + self.app_name
+        count = 0
+        for _, _, file_names in os.walk(app_path):
+            count += sum(1 for name in file_names if name.endswith(self.PHP_EXTENSIONS))
+        return count
+
+    @classmethod
+    def cache_settings(cls, cache, version, files, memory, cpus):
+        """Size the opcode cache to the PHP file count, and the memory in bytes and cores the container was given, returns
+        the template variables. The shared memory is a 32MB base plus $PHP_OPCACHE_KB_PER_FILE (64) for each file, capped at
+        an eighth of the memory. Every value can be set outright with $PHP_OPCACHE_MEMORY, $PHP_OPCACHE_INTERNED_STRINGS,
+        $PHP_OPCACHE_MAX_FILES, $PHP_OPCACHE_REVALIDATE_FREQ, and $PHP_OPCACHE_VALIDATE_TIMESTAMPS"""
+        def setting(name, default):
+            """Return the integer environment override, or the default"""
+            return int(os.environ.get(name) or default)
+
+        memory_mb = memory // 1048576 if memory else 1024
+        needed = 32 + files * setting('PHP_OPCACHE_KB_PER_FILE', 64) // 1024
+        shm_mb = setting('PHP_OPCACHE_MEMORY', max(16, min(needed, memory_mb // 8)))
+
+        # Leave headroom for the application to grow, max_accelerated_files is rounded up to PHP's own primes.
+        target = max(2000, files * 2)
+        max_files = setting('PHP_OPCACHE_MAX_FILES', next((prime for prime in cls.PRIMES if prime >= target), cls.PRIMES[-1]))
+
+        # Images are rebuilt to deploy new code, so the files are only checked for changes every few minutes.
+        validate = setting('PHP_OPCACHE_VALIDATE_TIMESTAMPS', 1)
+
+        version_settings = []
+        if cache == "opcache" and cls.version_tuple(version) < (7, 2):
+            version_settings.append("opcache.fast_shutdown=1")
+
+        slots = 1024
+        while slots < files // max(1, cpus):
+            slots *= 2
+
+        return {
+            "PHP_VERSION": version,
+            "PHP_FILES": files,
+            "MEMORY_MB": memory_mb,
+            "CPUS": cpus,
+            "SHM_MB": shm_mb,
+            "INTERNED_MB": setting('PHP_OPCACHE_INTERNED_STRINGS', max(4, min(64, shm_mb // 8))),
+            "MAX_FILES": max_files,
+            "SLOTS": slots,
+            "VALIDATE_TIMESTAMPS": validate,
+            "STAT": "On" if validate else "Off",
+            "REVALIDATE_FREQ": setting('PHP_OPCACHE_REVALIDATE_FREQ', 300),
+            "VERSION_SETTINGS": "\n".join(version_settings),
+        }
+
+    def php_opcache(self):
+        """Write the opcode cache ini file, returns the file written, or None if PHP or an opcode cache is not installed"""
+        INSTALL_LOG.write_log_console("Configuring the PHP opcode cache...", "")
+
+        # Detect the PHP version and the available opcode caches
+        info = self.php_info()
+        if info is None:
+            INSTALL_LOG.write_log("PHP is not installed, skipping the opcode cache")
+            INSTALL_LOG.step_complete()
+            return None
+
+        selected = self.select_cache(info)
+        if selected is None:
+            print("No opcode cache is installed for PHP " + info["version"])
+            INSTALL_LOG.write_log("No opcode cache is installed for PHP " + info["version"])
+            INSTALL_LOG.step_complete()
+            return None
+        cache, template, load_extension = selected
+
+        # Size the cache to the application and the container
+        cgroup = Cgroup()
+        settings = self.cache_settings(cache, info["version"], self.count_php_files(), cgroup.memory(), cgroup.cpus())
+        settings["LOAD_EXTENSION"] = load_extension
+        INSTALL_LOG.write_log("Sizing %s for PHP %s, %s PHP files and %sMB of memory: %sMB shared memory, %s max files, %s second revalidation" % (
+            cache, info["version"], settings["PHP_FILES"], settings["MEMORY_MB"], settings["SHM_MB"], settings["MAX_FILES"],
+            settings["REVALIDATE_FREQ"]))
+
+        # The ini file sorts after the distro ini files, so its settings win.
+        ini_dir = self.ini_dir(info)
+        if ini_dir is None:
+            INSTALL_LOG.write_log_console("WARNING: PHP " + info["version"] + " has no ini scan directory, and PHP_INI_DIR is not set", "Skipping the opcode cache")
+            INSTALL_LOG.step_complete()
+            return None
+        ini_file = ini_dir + "99-runconfig-" + cache + ".ini"
+        TEMPLATES.write_all([(ini_file, template, settings)])
+
+        # Mark step complete
+        INSTALL_LOG.step_complete()
+        return ini_file
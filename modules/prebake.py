@@ -0,0 +1,201 @@
+"""
+***************************************************************************
+Class File:             Runconfig Prebake Module
+Authors/Maintainers:    Rich Nason (rnason@appcontainers.io)
+Copyright:              Copyright 2016 Richard Nason
+Description:            This class will run the configuration steps at image
+                        build time with placeholder values for the runtime
+                        environment variables, record which files depend on
+                        them, and patch in the real values on first boot, so
+                        the container starts with a handful of small edits.
+***************************************************************************
+"""
+# *******************************************************************
+# Required Modules:
+# *******************************************************************
+import os  # Used for various os level calls
+import json  # Used to read and write the prebake manifest
+from socket import gethostname  # Used for the runtime hostname
+
+# Import custom modules
+from modules.globals import Globals
+from modules.log import Log
+
+# Instantiate the global variables.
+GLOBALS = Globals()
+
+# Instantiate the custom console logger.
+INSTALL_LOG = Log()
+
+# *******************************************************************
+# Class Definitions:
+# *******************************************************************
+
+
+class Prebake():
+    """Class to prebake the configuration into an image, and patch it on first boot"""
+
+    # The runtime environment variables, and the placeholder written in their place at build time.
+    PLACEHOLDERS = {
+        "APP_NAME": "__RUNCONFIG_APP_NAME__",
+        "APACHE_SVRALIAS": "__RUNCONFIG_APACHE_SVRALIAS__",
+        "HOSTNAME": "__RUNCONFIG_HOSTNAME__",
+    }
+
+    def __init__(self, manifest_file=None):
+        """Set instantiation variables"""
+        if manifest_file is None:
+            manifest_file = os.environ.get('PREBAKE_MANIFEST', GLOBALS.path("/var/lib/runconfig/prebake.json"))
+        self.manifest_file = manifest_file
+
+    def set_placeholders(self):
+        """Set the runtime environment variables to their placeholders, call this before the steps read them"""
+        for var, placeholder in self.PLACEHOLDERS.items():
+            os.environ[var] = placeholder
+
+    @staticmethod
+    def runtime_values():
+        """Return the runtime value of each placeholder variable"""
+        app_name = os.environ['APP_NAME']
+        return {
+            "APP_NAME": app_name,
+            "APACHE_SVRALIAS": os.environ.get('APACHE_SVRALIAS') or "www." + app_name,
+            "HOSTNAME": os.environ.get('HOSTNAME') or gethostname(),
+        }
+
+    def placeholders_in(self, text):
+        """Return the sorted names of the variables whose placeholder appears in the text"""
+        return sorted(var for var, placeholder in self.PLACEHOLDERS.items() if placeholder in text)
+
+    def scan(self, paths):
+        """Walk the paths the prebaked steps wrote, returns the files whose contents or link targets hold a placeholder,
+        with the variables they depend on, and the paths whose names hold one"""
+        files = {}
+        renames = []
+        for path in paths:
+            path = path.rstrip("/")
+            if not os.path.lexists(path):
+                continue
+            if self.placeholders_in(os.path.basename(path)):
+                renames.append(GLOBALS.target(path))
+            walked = [(os.path.dirname(path), [], [os.path.basename(path)])] if not os.path.isdir(path) else os.walk(path)
+            for dir_path, dir_names, file_names in walked:
+                for name in dir_names + file_names:
+                    file_path = os.path.join(dir_path, name)
+                    if self.placeholders_in(name):
+                        renames.append(GLOBALS.target(file_path))
+                    if os.path.islink(file_path):
+                        found = self.placeholders_in(os.readlink(file_path))
+                    elif os.path.isfile(file_path):
+                        with open(file_path, "rb") as scanned:
+                            found = self.placeholders_in(scanned.read().decode("utf-8", "replace"))
+                    else:
+                        continue
+                    if found:
+                        files[GLOBALS.target(file_path)] = found
+        return files, sorted(set(renames))
+
+    def bake(self, steps, paths, key_count=None):
+        """Record the files the prebaked steps left placeholders in. steps are the names of the prebaked steps that
+        completed, paths are the files and directories they wrote. The key pool for the first boot certificate is only
+        filled when key_count, or $PREBAKE_KEYS, asks for it, as the keys become part of the image"""
+        INSTALL_LOG.write_log_console("Recording the prebaked configuration...", "")
+
+        files, renames = self.scan(paths)
+        manifest = {"steps": sorted(steps), "placeholders": self.PLACEHOLDERS, "files": files, "renames": renames, "key_pool": None}
+
+        # Keys generated now are stored in the image layer, so every container started from the image claims the same
+        # private key, and anyone who can pull the image can read it. The pool is left empty unless it is asked for.
+        if key_count is None:
+            key_count = int(os.environ.get('PREBAKE_KEYS', 0))
+        # CA mode defaults to EC leaf keys, which need no pool.
+        ca_mode = os.environ.get('CERT_CA', "").lower() in ("1", "true", "yes", "on")
+        if key_count > 0 and os.environ.get('CERT_KEY_TYPE', "ec-p256" if ca_mode else "rsa").lower() == "rsa":
+            INSTALL_LOG.write_log_console("WARNING: baking " + str(key_count) + " private keys into the image, every container started from it shares them",
+                                          "Anyone who can pull the image can read the keys, unset PREBAKE_KEYS to generate them at container start")
+            from modules.keypool import KeyPool
+            key_pool = KeyPool(os.environ.get('CERT_KEY_POOL'))
+            key_pool.fill(key_count, 4096)
+            manifest["key_pool"] = GLOBALS.target(key_pool.pool_path)
+
+        manifest_path = os.path.dirname(self.manifest_file)
+        if manifest_path and not os.path.isdir(manifest_path):
+            os.makedirs(manifest_path)
+        tmp_file = self.manifest_file + "." + str(os.getpid()) + ".tmp"
+        with open(tmp_file, "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+        os.rename(tmp_file, self.manifest_file)
+
+        INSTALL_LOG.write_log("Prebaked " + str(len(steps)) + " steps, " + str(len(files)) + " files depend on the runtime environment")
+        INSTALL_LOG.step_complete()
+        return manifest
+
+    def pending(self):
+        """Return True if the image was prebaked and has not been patched yet"""
+        return os.path.isfile(self.manifest_file)
+
+    def load(self):
+        """Read the prebake manifest"""
+        with open(self.manifest_file, "r") as manifest_file:
+            return json.load(manifest_file)
+
+    def apply(self):
+        """Patch the runtime values into the prebaked files and paths, returns the names of the prebaked steps. If a file
+        could not be patched no step is returned, so every step runs again and rewrites its files, and the manifest is
+        left pending"""
+        INSTALL_LOG.write_log_console("Applying the prebaked configuration...", "")
+        manifest = self.load()
+        values = self.runtime_values()
+        replacements = [(placeholder, values[var]) for var, placeholder in manifest["placeholders"].items()]
+
+        def patch(text):
+            """Replace every placeholder in the text"""
+            for placeholder, value in replacements:
+                text = text.replace(placeholder, value)
+            return text
+
+        # Patch the file contents and link targets first, while the files still have their prebaked names.
+        failed = []
+        for target in sorted(manifest["files"]):
+            file_path = GLOBALS.path(target)
+            tmp_file = file_path + "." + str(os.getpid()) + ".tmp"
+            try:
+                if os.path.islink(file_path):
+                    os.symlink(patch(os.readlink(file_path)), tmp_file)
+                else:
+                    with open(file_path, "r") as prebaked:
+                        text = patch(prebaked.read())
+                    with open(tmp_file, "w") as patched:
+                        patched.write(text)
+                    os.chmod(tmp_file, os.stat(file_path).st_mode & 0o7777)
+                os.rename(tmp_file, file_path)
+            except Exception as e:
+                INSTALL_LOG.write_log_console("ERROR: Could not patch " + file_path, str(e))
+                if os.path.lexists(tmp_file):
+                    os.unlink(tmp_file)
+                failed.append(target)
+
+        # The manifest does not record which step wrote each file, so a file left holding placeholders runs every step again.
+        if failed:
+            INSTALL_LOG.write_log_console("WARNING: " + str(len(failed)) + " prebaked files still hold placeholders",
+                                          "Running every configuration step")
+            INSTALL_LOG.step_complete()
+            return []
+
+        # Rename the paths named after a placeholder, deepest first, so each parent is renamed after its children.
+        for target in sorted(manifest["renames"], key=lambda path: path.count("/"), reverse=True):
+            file_path = GLOBALS.path(target)
+            renamed = os.path.join(os.path.dirname(file_path), patch(os.path.basename(file_path)))
+            if os.path.lexists(file_path) and not os.path.lexists(renamed):
+                os.rename(file_path, renamed)
+
+        # Certificates are generated from the key pool that was filled at build time.
+        if manifest.get("key_pool") and not os.environ.get('CERT_KEY_POOL'):
+            os.environ['CERT_KEY_POOL'] = GLOBALS.path(manifest["key_pool"])
+
+        # Keep the manifest for reference, under a name that marks it as applied.
+        os.rename(self.manifest_file, self.manifest_file.replace(".json", "") + ".applied.json")
+
+        INSTALL_LOG.write_log("Patched " + str(len(manifest["files"])) + " files and " + str(len(manifest["renames"])) + " paths")
+        INSTALL_LOG.step_complete()
+        return manifest["steps"]
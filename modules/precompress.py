@@ -0,0 +1,204 @@
+"""
+***************************************************************************
+Class File:             Runconfig Precompress Module
+Authors/Maintainers:    Rich Nason (rnason@appcontainers.io)
+Copyright:              Copyright 2016 Richard Nason
+Description:            This class will write .gz, and .br if brotli is
+                        installed, siblings of the compressible static assets
+                        in the application document root across a process
+                        pool, so Apache can serve them as is instead of
+                        compressing every response.
+***************************************************************************
+"""
+# *******************************************************************
+# Required Modules:
+# *******************************************************************
+import os  # Used for various os level calls
+import gzip  # Used to write the .gz siblings
+import json  # Used to read and write the precompress index
+import hashlib  # Used to detect assets whose contents did not change
+import importlib.util  # Used to check for the optional brotli module
+from concurrent.futures import ProcessPoolExecutor  # Used to compress the assets in parallel
+
+# Import custom modules
+from modules.globals import Globals
+from modules.log import Log
+
+# Instantiate the global variables.
+GLOBALS = Globals()
+
+# Instantiate the custom console logger.
+INSTALL_LOG = Log()
+
+# *******************************************************************
+# Class Definitions:
+# *******************************************************************
+
+
+class Precompress():
+    """Class to precompress the application static assets"""
+
+    # Text assets that compress well, images and fonts such as woff2 are already compressed.
+    EXTENSIONS = ("css", "js", "mjs", "map", "json", "xml", "svg", "txt", "html", "htm", "ico", "ttf", "otf", "eot")
+
+    def __init__(self, app_path=None, index_file=None):
+        """Set instantiation variables, the application defaults to /var/www/html/$APP_NAME"""
+        if app_path is None:
+            app_path = GLOBALS.path(GLOBALS.platform()["www_root"]) + os.environ['APP_NAME']
+        if index_file is None:
+            index_file = os.environ.get('PRECOMPRESS_INDEX', GLOBALS.path("/var/lib/runconfig/precompress.json"))
+        self.app_path = app_path.rstrip("/")
+        self.index_file = index_file
+        self.min_bytes = int(os.environ.get('PRECOMPRESS_MIN_BYTES', 1024))
+        self.brotli = os.environ.get('PRECOMPRESS_BROTLI', "1").lower() in ("1", "true", "yes", "on") and \
+            importlib.util.find_spec("brotli") is not None
+
+    @staticmethod
+    def enabled():
+        """Return True if $PRECOMPRESS turns precompression on"""
+        return os.environ.get('PRECOMPRESS', "").lower() in ("1", "true", "yes", "on")
+
+    def assets(self):
+        """Return the path of every compressible asset under the application, relative to it"""
+        suffixes = tuple("." + extension for extension in self.EXTENSIONS)
+        assets = []
+        for dir_path, dir_names, file_names in os.walk(self.app_path):
+            dir_names[:] = [name for name in dir_names if not name.startswith(".")]
+            for name in file_names:
+                if name.lower().endswith(suffixes):
+                    assets.append(os.path.relpath(os.path.join(dir_path, name), self.app_path))
+        return sorted(assets)
+
+    def load_index(self):
+        """Read the precompress index, a dictionary of the compressed assets keyed by their path relative to the
+        application, so the index still matches after a prebaked document root is renamed"""
+        try:
+            with open(self.index_file, "r") as index:
+                return json.load(index)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def save_index(self, index):
+        """Atomically write the precompress index"""
+        try:
+            if not os.path.isdir(os.path.dirname(self.index_file)):
+                os.makedirs(os.path.dirname(self.index_file))
+            tmp_file = self.index_file + "." + str(os.getpid()) + ".tmp"
+            with open(tmp_file, "w") as index_json:
+                json.dump(index, index_json, indent=2, sort_keys=True)
+            os.rename(tmp_file, self.index_file)
+        except (IOError, OSError) as e:
+            print("Could not write to " + self.index_file)
+            print(e)
+
+    @staticmethod
+    def digest(file_path):
+        """Return the sha256 of a file"""
+        sha256 = hashlib.sha256()
+        with open(file_path, "rb") as asset:
+            for chunk in iter(lambda: asset.read(1048576), b""):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    @staticmethod
+    def _compress_worker(file_path, use_brotli):
+        """Process pool worker, writes the .gz and .br siblings of an asset beside it and renames them into place. A
+        sibling that is not smaller than the asset is removed instead. Returns the encodings written"""
+        with open(file_path, "rb") as asset:
+            data = asset.read()
+        stat = os.stat(file_path)
+
+        encoders = [("gz", lambda raw: gzip.compress(raw, 9, mtime=0))]
+        if use_brotli:
+            import brotli
+            encoders.append(("br", lambda raw: brotli.compress(raw, quality=11)))
+
+        written = []
+        for encoding, encode in encoders:
+            sibling = file_path + "." + encoding
+            compressed = encode(data)
+            if len(compressed) >= len(data):
+                if os.path.isfile(sibling):
+                    os.remove(sibling)
+                continue
+            tmp_file = sibling + "." + str(os.getpid()) + ".tmp"
+            with open(tmp_file, "wb") as output:
+                output.write(compressed)
+            # The sibling carries the asset mtime, so Last-Modified is the same whichever variant is served.
+            os.utime(tmp_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+            os.rename(tmp_file, sibling)
+            written.append(encoding)
+        return written
+
+    def up_to_date(self, entry, file_path, stat):
+        """Return True if the index entry shows the asset siblings are current for its stat, or for its contents"""
+        if entry is None or entry.get("brotli") != self.brotli:
+            return False
+        if any(not os.path.isfile(file_path + "." + encoding) for encoding in entry["encodings"]):
+            return False
+        if entry["stat"] == [stat.st_mtime_ns, stat.st_size]:
+            return True
+        return entry["sha256"] == self.digest(file_path)
+
+    def run(self):
+        """Compress every asset whose siblings are missing or out of date, across a process pool sized to the cores
+        available to the container. Returns a dictionary of the assets compressed, skipped, and removed"""
+        INSTALL_LOG.write_log_console("Precompressing the static assets in " + self.app_path + "...", "")
+
+        index = self.load_index()
+        pending = []
+        kept = set()
+        for asset in self.assets():
+            file_path = os.path.join(self.app_path, asset)
+            stat = os.stat(file_path)
+            if stat.st_size < self.min_bytes:
+                continue
+            if self.up_to_date(index.get(asset), file_path, stat):
+                # An asset that was only touched keeps its siblings, which take its new mtime, and is not hashed again.
+                if index[asset]["stat"] != [stat.st_mtime_ns, stat.st_size]:
+                    for encoding in index[asset]["encodings"]:
+                        os.utime(file_path + "." + encoding, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+                    index[asset]["stat"] = [stat.st_mtime_ns, stat.st_size]
+                kept.add(asset)
+                continue
+            pending.append(asset)
+            kept.add(asset)
+
+        # Remove the siblings of assets that were deleted, or that fell below the minimum size.
+        removed = 0
+        for asset in [asset for asset in index if asset not in kept]:
+            for encoding in index[asset]["encodings"]:
+                sibling = os.path.join(self.app_path, asset) + "." + encoding
+                if os.path.isfile(sibling):
+                    os.remove(sibling)
+            del index[asset]
+            removed += 1
+
+        if pending:
+            if hasattr(os, "sched_getaffinity"):
+                cores = len(os.sched_getaffinity(0))
+            else:
+                cores = os.cpu_count() or 1
+
+            with ProcessPoolExecutor(max_workers=max(1, min(cores, len(pending)))) as executor:
+                jobs = [(asset, executor.submit(Precompress._compress_worker, os.path.join(self.app_path, asset), self.brotli)) for asset in pending]
+                for asset, job in jobs:
+                    file_path = os.path.join(self.app_path, asset)
+                    try:
+                        encodings = job.result()
+                    except Exception as e:
+                        print("Could not precompress " + file_path)
+                        print(e)
+                        continue
+                    stat = os.stat(file_path)
+                    index[asset] = {"stat": [stat.st_mtime_ns, stat.st_size], "sha256": self.digest(file_path), "encodings": encodings,
+                                    "brotli": self.brotli}
+
+        self.save_index(index)
+
+        INSTALL_LOG.write_log("Precompressed %d assets%s, %d were up to date, removed %d stale" % (
+            len(pending), " with brotli" if self.brotli else "", len(kept) - len(pending), removed))
+
+        # Mark step complete
+        INSTALL_LOG.step_complete()
+        return {"compressed": len(pending), "skipped": len(kept) - len(pending), "removed": removed}
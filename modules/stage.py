@@ -0,0 +1,95 @@
+"""
+***************************************************************************
+Class File:             Runconfig Stage Module
+Authors/Maintainers:    Rich Nason (rnason@appcontainers.io)
+Copyright:              Copyright 2016 Richard Nason
+Description:            This class will commit a configuration staged under
+                        $RUNCONFIG_ROOT, such as a tmpfs directory, onto the
+                        real root in a single bulk pass.
+
+Usage:                  python -m modules.stage <staged root> [target root]
+***************************************************************************
+"""
+# *******************************************************************
+# Required Modules:
+# *******************************************************************
+import os  # Used for various os level calls
+import sys  # Used to read the command line arguments
+from shutil import copy2  # Used to copy the staged files with their permissions
+
+# Import custom modules
+from modules.globals import Globals
+from modules.log import Log
+
+# Instantiate the global variables.
+GLOBALS = Globals()
+
+# Instantiate the custom console logger.
+INSTALL_LOG = Log()
+
+# *******************************************************************
+# Class Definitions:
+# *******************************************************************
+
+
+class Stage():
+    """Class to commit a staged configuration root"""
+
+    def __init__(self, root=None):
+        """Set instantiation variables, the root defaults to $RUNCONFIG_ROOT"""
+        if root is None:
+            root = GLOBALS.root()
+        if not root or not os.path.isdir(root):
+            raise ValueError("Staged root " + str(root) + " is not a directory")
+        self.root = root.rstrip("/")
+
+    def files(self):
+        """Return the target path of every staged file and symlink"""
+        staged = []
+        for dir_path, dir_names, file_names in os.walk(self.root):
+            for name in file_names + [name for name in dir_names if os.path.islink(os.path.join(dir_path, name))]:
+                staged.append(os.path.join(dir_path, name)[len(self.root):])
+        return sorted(staged)
+
+    def commit(self, target="/"):
+        """Copy the staged tree onto the target root. A target that does not exist yet is a single rename of the staged root,
+        otherwise each file is copied beside its destination and renamed into place. Returns the number of files committed"""
+        target = target.rstrip("/")
+        files = self.files()
+
+        if target and not os.path.exists(target):
+            if not os.path.isdir(os.path.dirname(target)):
+                os.makedirs(os.path.dirname(target))
+            try:
+                os.rename(self.root, target)
+                INSTALL_LOG.write_log("Committed " + str(len(files)) + " staged files by renaming " + self.root + " to " + target)
+                return len(files)
+            except OSError:
+                # The staged root is on another filesystem, such as a tmpfs, so fall back to copying it.
+                os.makedirs(target)
+
+        for staged_file in files:
+            source = self.root + staged_file
+            destination = target + staged_file
+            if not os.path.isdir(os.path.dirname(destination)):
+                os.makedirs(os.path.dirname(destination))
+
+            tmp_file = destination + "." + str(os.getpid()) + ".tmp"
+            if os.path.islink(source):
+                os.symlink(os.readlink(source), tmp_file)
+            else:
+                copy2(source, tmp_file)
+            os.rename(tmp_file, destination)
+
+        INSTALL_LOG.write_log("Committed " + str(len(files)) + " staged files from " + self.root + " to " + (target or "/"))
+        return len(files)
+
+
+if __name__ == '__main__':
+    # Commit a staged root: python -m modules.stage <staged root> [target root]
+    if len(sys.argv) < 2:
+        print("Usage: python -m modules.stage <staged root> [target root]")
+        sys.exit(1)
+    STAGE = Stage(sys.argv[1])
+    print("Committed " + str(STAGE.commit(sys.argv[2] if len(sys.argv) > 2 else "/")) + " files")
+    Log.close_all()
@@ -0,0 +1,132 @@
+"""
+***************************************************************************
+Class File:             Runconfig State Manifest Module
+Authors/Maintainers:    Rich Nason (rnason@appcontainers.io)
+Copyright:              Copyright 2016 Richard Nason
+Description:            This class will keep a manifest of the inputs and outputs
+                        of every configuration step, so that a container restart
+                        only re-runs the steps whose inputs changed or whose
+                        outputs are missing.
+***************************************************************************
+"""
+# *******************************************************************
+# Required Modules:
+# *******************************************************************
+import os  # Used for various os level calls
+import json  # Used to read and write the manifest
+import hashlib  # Used to fingerprint step inputs and outputs
+
+# Import custom modules
+from modules.globals import Globals
+from modules.log import Log
+
+# Instantiate the global variables.
+GLOBALS = Globals()
+
+# Instantiate the custom console logger.
+INSTALL_LOG = Log()
+
+# *******************************************************************
+# Class Definitions:
+# *******************************************************************
+
+
+class StateManifest():
+    """Class to track which configuration steps are up to date"""
+
+    def __init__(self, manifest_file=None):
+        """Set instantiation variables"""
+        if manifest_file is None:
+            manifest_file = os.environ.get('RUNCONFIG_MANIFEST', GLOBALS.path("/var/lib/runconfig/manifest.json"))
+        self.manifest_file = manifest_file
+        self.adopted = set()
+        self.platform = self.platform_fingerprint()
+        self.steps = {}
+
+        # A manifest written on a different platform says nothing about this one.
+        manifest = self.load()
+        if manifest.get("platform") == self.platform:
+            self.steps = manifest.get("steps", {})
+
+    @staticmethod
+    def file_hash(file_path):
+        """Return the sha256 of a file, or None if it does not exist"""
+        try:
+            with open(file_path, "rb") as hashed_file:
+                return hashlib.sha256(hashed_file.read()).hexdigest()
+        except (IOError, OSError):
+            return None
+
+    def platform_fingerprint(self):
+        """Return a fingerprint of the distro the container is running"""
+        return hashlib.sha256(json.dumps({
+            "rhel": GLOBALS.is_rhel(),
+            "os_release": self.file_hash(GLOBALS.release_file("/etc/os-release")),
+        }, sort_keys=True).encode()).hexdigest()
+
+    def exists(self):
+        """Return True if a manifest has been written"""
+        return os.path.isfile(self.manifest_file)
+
+    def load(self):
+        """Read the manifest file, returns an empty manifest if it does not exist"""
+        try:
+            with open(self.manifest_file, "r") as manifest_file:
+                return json.load(manifest_file)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def save(self):
+        """Atomically write the manifest file"""
+        manifest_path = os.path.dirname(self.manifest_file)
+        if manifest_path and not os.path.isdir(manifest_path):
+            os.makedirs(manifest_path)
+
+        tmp_file = self.manifest_file + "." + str(os.getpid()) + ".tmp"
+        with open(tmp_file, "w") as manifest_file:
+            json.dump({"platform": self.platform, "steps": self.steps}, manifest_file, indent=2, sort_keys=True)
+        os.rename(tmp_file, self.manifest_file)
+
+    def fingerprint(self, step):
+        """Return a fingerprint of the environment variables and input files of a step"""
+        return hashlib.sha256(json.dumps({
+            "step": step.name,
+            "env": dict((var, os.environ.get(var)) for var in step.env),
+            "inputs": dict((GLOBALS.target(file_path), self.file_hash(file_path)) for file_path in step.inputs),
+        }, sort_keys=True).encode()).hexdigest()
+
+    def adopt(self, names):
+        """Treat the named steps as up to date, for containers that were configured before the manifest existed"""
+        self.adopted.update(names)
+
+    def stale_reason(self, step):
+        """Return the reason a step has to run, or None if it is up to date"""
+        if step.always:
+            return "it runs on every start"
+        if step.name in self.adopted and step.name not in self.steps:
+            return None
+
+        record = self.steps.get(step.name)
+        if record is None:
+            return "it has not run before"
+        if record["fingerprint"] != self.fingerprint(step):
+            return "its inputs changed"
+        for file_path, file_hash in record["outputs"].items():
+            current_hash = self.file_hash(GLOBALS.path(file_path))
+            if current_hash is None:
+                return "output " + file_path + " is missing"
+            if current_hash != file_hash:
+                return "output " + file_path + " changed"
+        return None
+
+    def record(self, step):
+        """Record the current fingerprint and output hashes of a step that completed. Files are recorded by the path they
+        have once a staged root is committed, so the manifest stays valid after the tree moves to its real root"""
+        self.steps[step.name] = {
+            "fingerprint": self.fingerprint(step),
+            "outputs": dict((GLOBALS.target(file_path), self.file_hash(file_path)) for file_path in step.outputs if os.path.isfile(file_path)),
+        }
+
+    def forget(self, step):
+        """Remove a step from the manifest, so it runs again on the next start"""
+        self.steps.pop(step.name, None)
@@ -0,0 +1,151 @@
+"""
+***************************************************************************
+Class File:             Runconfig Step Graph Module
+Authors/Maintainers:    Rich Nason (rnason@appcontainers.io)
+Copyright:              Copyright 2016 Richard Nason
+Description:            This class will run the container configuration steps
+                        on a thread pool, running independent steps at the same
+                        time and only waiting where a step depends on another.
+***************************************************************************
+"""
+# *******************************************************************
+# Required Modules:
+# *******************************************************************
+import os  # Used for various os level calls
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED  # Used to run the steps concurrently
+
+# Import custom modules
+from modules.log import Log
+
+# Instantiate the custom console logger.
+INSTALL_LOG = Log()
+
+# *******************************************************************
+# Class Definitions:
+# *******************************************************************
+
+
+class StepGraph():
+    """Class to run configuration steps concurrently in dependency order"""
+
+    class Step:
+        """A single configuration step"""
+
+        def __init__(self, name, func, requires, inputs, outputs, env, always):
+            """Initialize the Step sub class"""
+            self.name = name
+            self.func = func
+            self.requires = list(requires)
+            self.inputs = list(inputs)
+            self.outputs = list(outputs)
+            self.env = list(env)
+            self.always = always
+            self.depends = set()
+
+    def __init__(self, max_workers=None):
+        """Set instantiation variables"""
+        if max_workers is None:
+            max_workers = int(os.environ.get('STEP_WORKERS', 4))
+        self.max_workers = max_workers
+        self.steps = {}
+        self.step_order = []
+
+    def add(self, name, func, requires=(), inputs=(), outputs=(), env=(), always=False):
+        """Add a step, requires lists the steps it must run after, inputs and outputs list the files it reads and writes,
+        env lists the environment variables it reads, and always marks a step that runs on every start"""
+        if name in self.steps:
+            raise ValueError("Step " + name + " has already been added")
+
+        step = StepGraph.Step(name, func, requires, inputs, outputs, env, always)
+
+        # A step also depends on any earlier step that writes a file the step reads or writes.
+        for earlier in self.step_order:
+            if set(self.steps[earlier].outputs) & set(step.inputs + step.outputs):
+                step.depends.add(earlier)
+        step.depends.update(step.requires)
+
+        self.steps[name] = step
+        self.step_order.append(name)
+        return step
+
+    def order(self):
+        """Return the step names in a dependency respecting order, raises ValueError on unknown steps or cycles"""
+        for step in self.steps.values():
+            for dependency in step.depends:
+                if dependency not in self.steps:
+                    raise ValueError("Step " + step.name + " requires unknown step " + dependency)
+
+        ordered = []
+        remaining = list(self.step_order)
+        while remaining:
+            ready = [name for name in remaining if self.steps[name].depends.issubset(ordered)]
+            if not ready:
+                raise ValueError("Step dependency cycle detected between: " + ", ".join(remaining))
+            ordered.extend(ready)
+            remaining = [name for name in remaining if name not in ready]
+        return ordered
+
+    def _run_step(self, step):
+        """Run a single step, returns True if it succeeded"""
+        try:
+            with INSTALL_LOG.step(step.name):
+                step.func()
+            return True
+        except Exception as e:
+            print("Step " + step.name + " failed")
+            print(e)
+            return False
+
+    def run(self, manifest=None):
+        """Run every step, returns a dictionary of step name to ok, current, failed, or skipped.
+        When a StateManifest is passed in, only the steps that are out of date, or depend on one that is, are ran"""
+        ordered = self.order()
+        status = {}
+        running = {}
+
+        if manifest is not None:
+            rerun = set()
+            for name in ordered:
+                step = self.steps[name]
+                reason = manifest.stale_reason(step)
+                if reason is None and step.depends & rerun:
+                    reason = "a step it depends on is running"
+                if reason is None:
+                    status[name] = "current"
+                    INSTALL_LOG.write_log("Step " + name + " is up to date, skipping")
+                else:
+                    rerun.add(name)
+                    INSTALL_LOG.write_log("Step " + name + " will run, " + reason)
+        pending = [name for name in ordered if name not in status]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                # Start every step whose dependencies have finished, and skip those whose dependencies did not succeed.
+                for name in list(pending):
+                    depends = self.steps[name].depends
+                    if any(status.get(dependency) in ("failed", "skipped") for dependency in depends):
+                        status[name] = "skipped"
+                        pending.remove(name)
+                        INSTALL_LOG.write_log("Skipping step " + name + ", a step it depends on did not complete")
+                    elif all(status.get(dependency) in ("ok", "current") for dependency in depends):
+                        pending.remove(name)
+                        running[executor.submit(self._run_step, self.steps[name])] = name
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    status[name] = "ok" if future.result() else "failed"
+
+        # Record the steps that are now up to date, and forget the ones that have to run again.
+        if manifest is not None:
+            for name in ordered:
+                if status[name] in ("ok", "current"):
+                    manifest.record(self.steps[name])
+                else:
+                    manifest.forget(self.steps[name])
+            manifest.save()
+
+        return status
@@ -0,0 +1,101 @@
+"""
+***************************************************************************
+Class File:             Runconfig Template Module
+Authors/Maintainers:    Rich Nason (rnason@appcontainers.io)
+Copyright:              Copyright 2016 Richard Nason
+Description:            This class will render config files such as the Apache
+                        vhost, ssl and envvars files from templates. Each
+                        template is compiled once into a cached list of
+                        literal and variable segments keyed by the template
+                        hash, so rendering many vhosts is a single join each.
+***************************************************************************
+"""
+# *******************************************************************
+# Required Modules:
+# *******************************************************************
+import os  # Used for various os level calls
+import re  # Used to find the template variables
+import hashlib  # Used to key the compiled template cache
+
+# Import custom modules
+from modules.log import Log
+
+# Instantiate the custom console logger.
+INSTALL_LOG = Log()
+
+# *******************************************************************
+# Class Definitions:
+# *******************************************************************
+
+
+class TemplateEngine():
+    """Class to render config files from templates"""
+
+    # Template variables look like {{APP_NAME}}, so that Apache's own ${VAR} syntax passes through untouched.
+    variable = re.compile(r'\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}\}')
+
+    # Compiled templates keyed by the sha256 of the template text, shared by every engine in the process.
+    compiled = {}
+
+    def __init__(self, template_path=None):
+        """Set instantiation variables"""
+        if template_path is None:
+            template_path = os.environ.get('TEMPLATE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates"))
+        self.template_path = template_path
+        self.sources = {}
+
+    def template_file(self, name):
+        """Return the path of the named template"""
+        return os.path.join(self.template_path, name + ".tmpl")
+
+    def load(self, name):
+        """Return the text of the named template, the file is only re-read if it changed"""
+        template_file = self.template_file(name)
+        mtime = os.stat(template_file).st_mtime_ns
+        cached = self.sources.get(template_file)
+        if cached is None or cached[0] != mtime:
+            with open(template_file, "r") as template:
+                cached = (mtime, template.read())
+            self.sources[template_file] = cached
+        return cached[1]
+
+    @classmethod
+    def compile(cls, text):
+        """Return the compiled form of the template text, a tuple alternating literal text and variable names"""
+        key = hashlib.sha256(text.encode()).hexdigest()
+        segments = cls.compiled.get(key)
+        if segments is None:
+            segments = tuple(cls.variable.split(text))
+            cls.compiled[key] = segments
+        return segments
+
+    def render(self, name, variables):
+        """Render the named template with the variables dictionary, a variable missing from it raises a ValueError"""
+        segments = self.compile(self.load(name))
+        try:
+            return "".join([segment if position % 2 == 0 else str(variables[segment]) for position, segment in enumerate(segments)])
+        except KeyError as e:
+            raise ValueError("Template " + name + " needs variable " + str(e) + " to be set")
+
+    def write_all(self, outputs):
+        """Render a list of (output_file, template_name, variables) and write them. Every output is rendered before any
+        file is written, and each file is written beside its destination and renamed into place. Returns the files written"""
+        rendered = [(output_file, self.render(name, variables)) for output_file, name, variables in outputs]
+
+        written = []
+        for output_file, text in rendered:
+            try:
+                output_dir = os.path.dirname(output_file)
+                if output_dir and not os.path.isdir(output_dir):
+                    os.makedirs(output_dir)
+                tmp_file = output_file + "." + str(os.getpid()) + ".tmp"
+                with open(tmp_file, "w") as output:
+                    output.write(text)
+                os.rename(tmp_file, output_file)
+                written.append(output_file)
+            except Exception as e:
+                print("Could not write to " + output_file)
+                print(e)
+
+        INSTALL_LOG.write_log("Rendered " + str(len(written)) + " config files from templates")
+        return written
@@ -0,0 +1,153 @@
+"""
+***************************************************************************
+Class File:             Runconfig Warm Up Module
+Authors/Maintainers:    Rich Nason (rnason@appcontainers.io)
+Copyright:              Copyright 2016 Richard Nason
+Description:            This class will warm the application up once Apache
+                        is ready, by requesting its PHP entry points so the
+                        opcode cache is filled, and pre-reading its static
+                        assets into the page cache, before real traffic
+                        arrives.
+***************************************************************************
+"""
+# *******************************************************************
+# Required Modules:
+# *******************************************************************
+import os  # Used for various os level calls
+import time  # Used to time the warm up requests
+from concurrent.futures import ThreadPoolExecutor  # Used to bound the concurrent warm up requests
+
+# Import custom modules
+from modules.globals import Globals
+from modules.log import Log
+
+# Instantiate the global variables.
+GLOBALS = Globals()
+
+# Instantiate the custom console logger.
+INSTALL_LOG = Log()
+
+# *******************************************************************
+# Class Definitions:
+# *******************************************************************
+
+
+class Warmup():
+    """Class to warm up the application caches"""
+
+    # Files that are served as is, and are pre-read into the page cache.
+    STATIC_EXTENSIONS = (".css", ".js", ".html", ".htm", ".png", ".jpg", ".jpeg", ".gif", ".svg", ".ico", ".webp", ".woff", ".woff2",
+                         ".ttf", ".json", ".txt")
+
+    # Directories that hold libraries rather than entry points.
+    SKIP_DIRS = ("vendor", "node_modules", "lib", "libs", "include", "includes", "cache", "tmp", ".git")
+
+    def __init__(self, app_path=None, port=None):
+        """Set instantiation variables, the application defaults to /var/www/html/$APP_NAME"""
+        self.app_name = os.environ['APP_NAME']
+        if app_path is None:
+            app_path = GLOBALS.path(GLOBALS.platform()["www_root"]) + self.app_name
+        if port is None:
+            port = int(os.environ.get('WARMUP_PORT') or os.environ.get('APACHE_READY_PORTS', "80").replace(",", " ").split()[0])
+        self.app_path = app_path.rstrip("/")
+        self.port = port
+        self.workers = max(1, int(os.environ.get('WARMUP_WORKERS', 4)))
+        self.timeout = float(os.environ.get('WARMUP_TIMEOUT', 10))
+
+    def discover(self, max_urls=None):
+        """Return the URL paths of the application entry points, the PHP files outside the library directories, index
+        files first, then by depth. $WARMUP_URLS, a space separated list of paths, is used instead if it is set"""
+        if os.environ.get('WARMUP_URLS'):
+            return os.environ['WARMUP_URLS'].split()
+        if max_urls is None:
+            max_urls = int(os.environ.get('WARMUP_MAX_URLS', 50))
+
+        urls = []
+        for dir_path, dir_names, file_names in os.walk(self.app_path):
+            dir_names[:] = sorted(name for name in dir_names if name not in self.SKIP_DIRS and not name.startswith("."))
+            for name in file_names:
+                if name.endswith(".php") and not name.startswith("_"):
+                    urls.append(os.path.join(dir_path, name)[len(self.app_path):])
+        urls.sort(key=lambda url: (url.count("/"), not url.endswith("/index.php"), url))
+        return urls[:max_urls]
+
+    def static_files(self):
+        """Return the static assets of the application"""
+        assets = []
+        for dir_path, dir_names, file_names in os.walk(self.app_path):
+            dir_names[:] = [name for name in dir_names if not name.startswith(".")]
+            assets.extend(os.path.join(dir_path, name) for name in file_names if name.lower().endswith(self.STATIC_EXTENSIONS))
+        return sorted(assets)
+
+    @staticmethod
+    def preload(file_path):
+        """Pull a file into the page cache, returns the bytes loaded"""
+        with open(file_path, "rb") as asset:
+            size = os.fstat(asset.fileno()).st_size
+            # Ask the kernel to read the file ahead, reading it ourselves is the fallback where fadvise is missing.
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(asset.fileno(), 0, size, os.POSIX_FADV_WILLNEED)
+            else:
+                while asset.read(1048576):
+                    pass
+        return size
+
+    def fetch(self, url):
+        """Request a URL from the local server with the app name as the Host header, returns a result dictionary with the
+        url, status, and seconds taken, the status is None if the request failed"""
+        # http.client is only imported when a warm up runs.
+        import http.client
+        start = time.monotonic()
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=self.timeout)
+        try:
+            connection.request("GET", url, headers={"Host": self.app_name})
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            status = None
+        finally:
+            connection.close()
+        return {"url": url, "status": status, "seconds": time.monotonic() - start}
+
+    def warm(self):
+        """Request the entry points, and pre-read the static assets, on at most $WARMUP_WORKERS threads. Returns a
+        dictionary of the per URL results, and the static files and bytes loaded, or None under a staged root"""
+        INSTALL_LOG.write_log_console("Warming up " + self.app_name + "...", "")
+
+        # A staged root is configured for another machine, so there is no local server to warm.
+        if GLOBALS.root():
+            INSTALL_LOG.write_log("Configuration staged in " + GLOBALS.root() + ", not warming up")
+            INSTALL_LOG.step_complete()
+            return None
+
+        urls = self.discover()
+        assets = self.static_files()
+        budget = int(os.environ.get('WARMUP_STATIC_MB', 256)) * 1048576
+
+        # The requests and the page cache reads share one bounded pool, the requests go first as they are the slow part.
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            requests = [executor.submit(self.fetch, url) for url in urls]
+            loads = []
+            for asset in assets:
+                budget -= os.path.getsize(asset)
+                if budget < 0:
+                    break
+                loads.append(executor.submit(self.preload, asset))
+            results = [request.result() for request in requests]
+
+            loaded = 0
+            for load in loads:
+                try:
+                    loaded += load.result()
+                except (IOError, OSError):
+                    pass
+
+        # Report the warm up latency of each URL
+        for result in results:
+            INSTALL_LOG.write_console("Warmed %s: %s in %.3f seconds" % (result["url"], result["status"], result["seconds"]), result["seconds"])
+        INSTALL_LOG.write_log("Warmed %d URLs, and pre-read %d static files (%d bytes)" % (len(results), len(loads), loaded))
+
+        # Mark step complete
+        INSTALL_LOG.step_complete()
+        return {"urls": results, "static_files": len(loads), "static_bytes": loaded}
@@ -1,13 +1,22 @@
 """Runconfig Main Module"""
 import os  # Used for various os level calls
+import sys  # Used for the exit status
 
 # Import custom modules
 from modules.globals import Globals
 from modules.log import Log
 from modules.mode import Mode
+from modules.steps import StepGraph
+from modules.state import StateManifest
+from modules.confedit import ConfigEditor
+from modules.template import TemplateEngine
+from modules.prebake import Prebake
 
 # Import the application modules
 from modules.apache import Apache
+from modules.php import Php
+from modules.warmup import Warmup
+from modules.precompress import Precompress
 
 # Instantiate the global variables.
 GLOBALS = Globals()
@@ -20,10 +29,16 @@ INSTALL_LOG = Log()
 #####################################################################
 
 # Get Environment variables passed in by the Docker run statement
-APP_NAME = os.environ['APP_NAME']
 MODE = os.environ['MODE']
 MODE = MODE.upper()
 
+# MODE=PREBAKE runs during the image build, with placeholders for the values only known when the container runs.
+PREBAKE = Prebake()
+if "PREBAKE" in MODE:
+    PREBAKE.set_placeholders()
+
+APP_NAME = os.environ['APP_NAME']
+
 #####################################################################
 # *************************  MODIFY VALUES  *************************
 #####################################################################
@@ -36,8 +51,8 @@ APPLICATION = "Apache"
 CHECKFILE = "index.php"
 CHECKFILE_PATH = "/var/www/html/"
 
-# Full path to the file that the script will check if the application has already been configured.
-CHECKFILE_PATH = os.path.join(CHECKFILE_PATH + APP_NAME + "/", CHECKFILE)
+# Full path to the file that the script will check if the application has already been configured, under $RUNCONFIG_ROOT.
+CHECKFILE_PATH = GLOBALS.path(os.path.join(CHECKFILE_PATH + APP_NAME + "/", CHECKFILE))
 
 # APPVER will correspond to the APPLICATION VERSION such as WIKIVER or master.zip.
 # Its the file that gets dumped in /var/www/html and gets moved to /var/www/html/APP_NAME
@@ -53,7 +68,7 @@ DEB_DEPLIST = "apache2 php5 php5-cli php5-common php5-mysql php5-xmlrpc imagemag
 #####################################################################
 
 # Create a list of packages that get installed
-if GLOBALS.is_rhel:
+if GLOBALS.is_rhel():
     DEPLIST = CENT_DEPLIST
 else:
     DEPLIST = DEB_DEPLIST
@@ -63,11 +78,22 @@ else:
 ##################################################################
 app_mode = Mode()
 
+# A data volume container is never configured, and has nothing prebaked
+CONFIGURED = False
+PREBAKED = []
+
 if "DATAVOL" in MODE:
-    app_mode.datavol(DEPLIST)
+    with INSTALL_LOG.step("datavol"):
+        app_mode.datavol(DEPLIST)
 else:
+    # Patch the runtime values into a prebaked image, the prebaked steps do not run again.
+    if "PREBAKE" not in MODE and PREBAKE.pending():
+        with INSTALL_LOG.step("prebake_apply"):
+            PREBAKED = PREBAKE.apply()
+
     # Check to see if the environment has already been configured
-    CONFIGURED = app_mode.config_verify(CHECKFILE_PATH)
+    with INSTALL_LOG.step("config_verify"):
+        CONFIGURED = app_mode.config_verify(CHECKFILE_PATH)
 
 ##################################################################
 # ***********************  CONFIGURE APP  ***********************
@@ -75,23 +101,92 @@ else:
 # Instantiate the Application Module
 configuration = Apache()
 
-if not CONFIGURED:
-    # Configure apache
-    configuration.apache_config()
-    # Generate Certificates
-    configuration.apache_certs()
-    # Create the php.info page
-    configuration.apache_init()
 
-# Set Apache Envars
-configuration.apache_envvars()
+def remove_config_scripts():
+    """Replace the configuration script with the apache service start in the root bashrc file"""
+    INSTALL_LOG.write_log_console("Removing configuration scripts", "")
+    bashrc = ConfigEditor(GLOBALS.path("/root/.bashrc"))
+    bashrc.delete_lines(r'/tmp/\./\.runconfig\.py')
+    bashrc.append_if_missing(" ".join(configuration.start_command()))
+    bashrc.commit()
 
-# Start Apache
-configuration.apache_start()
+    # Mark step complete
+    INSTALL_LOG.step_complete()
 
-# Remove config scripts
-INSTALL_LOG.write_log_console("Removing configuration scripts", "")
-os.popen("sed -i '/\/tmp\/.\/.runconfig.py/d' /root/.bashrc")
+# Build the step graph, steps without a dependency between them run at the same time,
+# so the slow certificate generation overlaps the file system steps.
+APP_CONF = configuration.apache_app_dir + configuration.app_name + ".conf"
+CERT_FILES = [configuration.cert_path + configuration.app_name + ".crt", configuration.key_path + configuration.app_name + ".key"]
+STEPS = StepGraph()
 
-# Mark step complete
-INSTALL_LOG.step_complete()
+# Configure apache
+STEPS.add("apache_config", configuration.apache_config, env=["APP_NAME", "HOSTNAME"],
+          outputs=[configuration.apache_dir + configuration.apache_conf])
+# Configure the application config files
+STEPS.add("apache_app_config", configuration.apache_app_config, env=["APP_NAME", "PRECOMPRESS"], outputs=[APP_CONF])
+# Create the php.info page
+STEPS.add("apache_init", configuration.apache_init, env=["APP_NAME"], outputs=[CHECKFILE_PATH])
+
+# Precompress the static assets, the index skips the assets that are already compressed, so it runs on every start
+if Precompress.enabled():
+    STEPS.add("precompress", lambda: Precompress().run(), requires=["apache_init"], always=True, env=["PRECOMPRESS_BROTLI"])
+
+# Set Apache Envars
+STEPS.add("apache_envvars", configuration.apache_envvars, env=["APP_NAME", "APACHE_SVRALIAS", "HOSTNAME"],
+          inputs=[TemplateEngine().template_file("envvars")], outputs=[configuration.env_var_path])
+
+# A prebake stops here, and records which of the files it wrote hold placeholders.
+# Only the steps that completed are prebaked, first boot runs the rest, and a failed step fails the image build.
+if "DATAVOL" in MODE:
+    # A data volume container only holds the application data, the Apache and PHP packages were just removed, so no step runs
+    STATUS = {}
+elif "PREBAKE" in MODE:
+    STATUS = STEPS.run()
+    PREBAKE.bake([name for name in STEPS.step_order if STATUS[name] == "ok"],
+                 [configuration.apache_dir, configuration.apache_app_dir, configuration.env_var_path, configuration.www_root + configuration.app_name])
+else:
+    # Generate Certificates, the certificate names the runtime host so it is never prebaked. It runs on every start so an
+    # expiring certificate is renewed, the cache index makes checking an unchanged certificate a stat of its files.
+    STEPS.add("apache_certs", configuration.apache_certs, always=True, env=["APP_NAME", "HOSTNAME", "CERT_KEY_TYPE", "CERT_CA"], outputs=CERT_FILES)
+
+    # Provision the extra sites hosted by the container, $APP_SITES lists them as "site[=alias,alias] ..."
+    if os.environ.get('APP_SITES'):
+        SITES = Apache.parse_sites(os.environ['APP_SITES'])
+        STEPS.add("apache_sites", lambda: configuration.provision_sites(SITES), requires=["apache_app_config"], always=True,
+                  env=["APP_SITES", "CERT_KEY_TYPE", "CERT_CA"], outputs=[configuration.site_conf(site) for site, _ in SITES])
+
+    # Size the MPM limits to the container, the limits can change on every start so it always runs
+    STEPS.add("apache_mpm", configuration.apache_mpm, requires=["apache_app_config"], always=True,
+              env=["APACHE_START_SERVERS", "APACHE_MAX_REQUEST_WORKERS", "APACHE_THREADS_PER_CHILD", "APACHE_SERVER_LIMIT"])
+
+    # Size the PHP opcode cache to the container and the application's PHP files
+    STEPS.add("php_opcache", Php().php_opcache, requires=["apache_init"], always=True,
+              env=["PHP_OPCACHE_MEMORY", "PHP_OPCACHE_MAX_FILES", "PHP_OPCACHE_REVALIDATE_FREQ", "PHP_OPCACHE_VALIDATE_TIMESTAMPS"])
+
+    # Start Apache once everything it reads is in place
+    STEPS.add("apache_start", configuration.apache_start, requires=list(STEPS.steps), always=True)
+
+    # Warm the opcode and page caches up once Apache is serving, $WARMUP turns it on
+    if os.environ.get('WARMUP', "").lower() in ("1", "true", "yes", "on"):
+        STEPS.add("warmup", Warmup().warm, requires=["apache_start"], always=True)
+
+    # Remove config scripts
+    STEPS.add("cleanup", remove_config_scripts, requires=["apache_start"], outputs=[GLOBALS.path("/root/.bashrc")], always=True)
+
+    # The manifest records the inputs and outputs of every step, so a restart only re-runs the steps that are out of date.
+    # Containers configured before the manifest existed keep their configuration, as do the steps of a prebaked image.
+    MANIFEST = StateManifest()
+    if CONFIGURED and not PREBAKED and not MANIFEST.exists():
+        MANIFEST.adopt(["apache_config", "apache_app_config", "apache_certs", "apache_init"])
+    MANIFEST.adopt(PREBAKED)
+
+    STATUS = STEPS.run(MANIFEST)
+
+# Report where the boot time went, and save it for regression tracking
+INSTALL_LOG.write_log_console("Configuration step timings", "")
+INSTALL_LOG.write_timing_summary()
+INSTALL_LOG.write_timings()
+
+# Fail the image build, or the container start, if a step failed
+if "failed" in STATUS.values():
+    sys.exit(1)
\ No newline at end of file
@@ -11,7 +11,11 @@ Description:            These Unit tests will tests the Apache Class to ensure p
 # *******************************************************************
 import unittest
 import os
-from shutil import copyfile, move
+import tempfile
+import threading
+import http.server
+from shutil import copyfile, move, rmtree
+from cryptography import x509
 from modules.globals import Globals
 from modules.apache import Apache
 
@@ -100,8 +104,55 @@ class ApacheTests(unittest.TestCase):
             assert os.path.exists(self.apache_app_dir + "000-default.conf") == 0
             assert os.path.exists(self.apache_app_dir + self.app_name + ".conf") == 1
 
+    def test_apache_certs(self):
+        """Generate the container certificate and ensure that the crt and key file were created"""
+        self.apache.apache_certs()
+
+        # Ensure that the crt and key files were created.
+        assert os.path.exists(self.apache.cert_path + self.app_name + ".crt") == 1
+        assert os.path.exists(self.apache.key_path + self.app_name + ".key") == 1
+
+    def test_provision_sites(self):
+        """Provision two sites in one run and ensure each got a document root, vhost, and certificate"""
+        os.environ['CERT_KEY_TYPE'] = "ec-p256"
+        sites = Apache.parse_sites("site1.Test.com site2.Test.com=www.site2.Test.com,cdn.site2.Test.com")
+        self.assertEqual(sites, [("site1.Test.com", None), ("site2.Test.com", "www.site2.Test.com cdn.site2.Test.com")])
+
+        site_confs = self.apache.provision_sites(sites)
+        del os.environ['CERT_KEY_TYPE']
+
+        for site, _ in sites:
+            assert os.path.exists("/var/www/html/" + site + "/index.php") == 1
+            assert os.path.exists(self.apache.cert_path + site + ".crt") == 1
+            assert os.path.exists(self.apache.key_path + site + ".key") == 1
+            if not self.global_variables.is_rhel():
+                assert os.path.exists(self.apache_app_dir + site + ".conf") == 1
+        with open(site_confs["site2.Test.com"], "r") as site_conf:
+            self.assertIn("ServerAlias www.site2.Test.com cdn.site2.Test.com", site_conf.read())
+
+        # Each server alias is its own subject alternative name, a site without aliases gets www.
+        expected = {"site1.Test.com": ["site1.Test.com", "www.site1.Test.com"],
+                    "site2.Test.com": ["site2.Test.com", "www.site2.Test.com", "cdn.site2.Test.com"]}
+        for site, names in expected.items():
+            with open(self.apache.cert_path + site + ".crt", "rb") as cert_file:
+                cert = x509.load_pem_x509_certificate(cert_file.read())
+            self.assertEqual(cert.extensions.get_extension_for_class(x509.SubjectAlternativeName).value.get_values_for_type(x509.DNSName), names)
+
     def tearDown(self):
         """Perform file cleanup from tests"""
+        if os.path.isfile(self.apache.cert_path + self.app_name + ".crt"):
+            os.remove(self.apache.cert_path + self.app_name + ".crt")
+        if os.path.isfile(self.apache.key_path + self.app_name + ".key"):
+            os.remove(self.apache.key_path + self.app_name + ".key")
+
+        for site in ("site1.Test.com", "site2.Test.com"):
+            for file_path in (self.apache.cert_path + site + ".crt", self.apache.key_path + site + ".key", self.apache.site_conf(site),
+                              self.apache.apache_app_dir + site + ".conf"):
+                if os.path.lexists(file_path):
+                    os.remove(file_path)
+            if os.path.isdir("/var/www/html/" + site):
+                rmtree("/var/www/html/" + site)
+
         if os.path.isfile("/var/www/html/" + self.app_name + "/index.php"):
             os.remove("/var/www/html/" + self.app_name + "/index.php")
 
@@ -126,5 +177,128 @@ class ApacheTests(unittest.TestCase):
             if not os.path.exists(self.apache_app_dir + "000-default.conf"):
                 os.symlink(self.apache_dir + "sites-available/000-default.conf", self.apache_app_dir + "000-default.conf")
 
+
+class ApacheStagedTests(unittest.TestCase):
+    """Tests for apache.py that do not need Apache installed, they run under a temporary $RUNCONFIG_ROOT"""
+
+    def setUp(self):
+        """Stage a temporary root, so the tests never touch the real Apache configuration"""
+        self.global_variables = Globals()
+        self.saved_env = dict(os.environ)
+        self.root = tempfile.mkdtemp()
+        os.environ['RUNCONFIG_ROOT'] = self.root
+        os.environ['APP_NAME'] = os.environ.get('APP_NAME') or "Test.com"
+        self.app_name = os.environ['APP_NAME']
+
+    def test_staged_root(self):
+        """Configure apache under $RUNCONFIG_ROOT and ensure the files are staged there, pointing at the real paths"""
+        apache = Apache()
+        self.assertTrue(apache.apache_dir.startswith(self.root + "/"))
+        os.makedirs(apache.apache_dir + "sites-available")
+        os.makedirs(apache.apache_app_dir)
+        with open(apache.apache_dir + apache.apache_conf, "w") as apache_conf:
+            apache_conf.write("#ServerName www.example.com:80\n")
+
+        apache.apache_config()
+        apache.apache_app_config()
+        apache.apache_init()
+
+        assert os.path.exists(self.root + "/var/www/html/" + self.app_name + "/index.php") == 1
+        with open(apache.apache_app_dir + self.app_name + ".conf", "r") as app_conf:
+            config = app_conf.read()
+        self.assertIn("DocumentRoot /var/www/html/" + self.app_name + "\n", config)
+        self.assertIn("SSLCertificateFile " + self.global_variables.platform()["cert_path"] + self.app_name + ".crt\n", config)
+        self.assertNotIn(self.root, config)
+
+    def test_mpm_settings(self):
+        """Ensure that the MPM limits are sized to the container, and that the environment overrides win"""
+        small = Apache.mpm_settings(1, 256 * 1048576)
+        self.assertEqual(small["PREFORK_MAX_REQUEST_WORKERS"], 4)
+        self.assertEqual(small["MAX_REQUEST_WORKERS"], 25)
+        self.assertEqual(small["SERVER_LIMIT"], 1)
+
+        large = Apache.mpm_settings(8, 16384 * 1048576)
+        self.assertEqual(large["PREFORK_MAX_REQUEST_WORKERS"], 307)
+        self.assertEqual(large["MAX_REQUEST_WORKERS"], 500)
+        self.assertEqual(large["SERVER_LIMIT"], 20)
+
+        os.environ['APACHE_THREADS_PER_CHILD'] = "64"
+        os.environ['APACHE_MAX_REQUEST_WORKERS'] = "200"
+        tuned = Apache.mpm_settings(8, 16384 * 1048576)
+        self.assertEqual(tuned["THREADS_PER_CHILD"], 64)
+        self.assertEqual(tuned["MAX_REQUEST_WORKERS"], 192)
+        self.assertEqual(tuned["SERVER_LIMIT"], 3)
+        self.assertEqual(tuned["PREFORK_MAX_REQUEST_WORKERS"], 200)
+
+    def test_server_conf(self):
+        """Ensure that the server wide MPM and precompress configs are kept out of the vhost directory"""
+        apache = Apache()
+        os.makedirs(apache.apache_app_dir)
+        with open(apache.apache_app_dir + "runconfig-mpm.conf", "w") as stale_conf:
+            stale_conf.write("# Written by an earlier version\n")
+
+        apache.apache_mpm()
+        if self.global_variables.is_rhel():
+            assert os.path.exists(apache.apache_app_dir + "runconfig-mpm.conf") == 1
+        else:
+            assert os.path.exists(apache.apache_app_dir + "runconfig-mpm.conf") == 0
+            self.assertEqual(os.readlink(apache.apache_dir + "conf-enabled/runconfig-mpm.conf"), "../conf-available/runconfig-mpm.conf")
+            with open(apache.apache_dir + "conf-enabled/runconfig-mpm.conf", "r") as mpm_conf:
+                self.assertIn("MaxRequestWorkers", mpm_conf.read())
+
+        # The precompress rules must survive an application .htaccess that turns on mod_rewrite
+        precompress_conf = apache.write_server_conf("runconfig-precompress.conf", "precompress.conf",
+                                                    dict(apache.template_vars(), EXTENSIONS="css|js"))
+        with open(precompress_conf, "r") as precompress:
+            self.assertIn("RewriteOptions InheritDownBefore", precompress.read())
+
+    def test_wait_ready(self):
+        """Ensure that the readiness probe waits for the port and the HTTP check, and gives up after the timeout"""
+        server = http.server.HTTPServer(("127.0.0.1", 0), http.server.SimpleHTTPRequestHandler)
+        port = server.server_address[1]
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            apache = Apache()
+            self.assertTrue(apache.port_open(port))
+            seconds, status = apache.wait_ready([port], "/index.php", timeout=5)
+            self.assertEqual(status, 404)
+            self.assertLess(seconds, 5)
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+        self.assertFalse(apache.port_open(port))
+        self.assertIsNone(apache.wait_ready([port], timeout=0.2))
+
+    def test_start_failure(self):
+        """Ensure that a failed start, or a server that never becomes ready, fails the step instead of returning"""
+        # A staged root is never started, the control script stand ins keep the test off the real Apache.
+        del os.environ['RUNCONFIG_ROOT']
+        os.environ['APACHE_READY_FILE'] = self.root + "/apache.ready"
+        os.environ['APACHE_READY_TIMEOUT'] = "0.2"
+        apache = Apache()
+        apache.service_mgr = "none"
+        apache.apache_ctl = "false"
+        with self.assertRaises(RuntimeError):
+            apache.apache_start()
+
+        # The control script succeeds, but nothing listens on the port.
+        server = http.server.HTTPServer(("127.0.0.1", 0), http.server.SimpleHTTPRequestHandler)
+        os.environ['APACHE_READY_PORTS'] = str(server.server_address[1])
+        server.server_close()
+        apache.apache_ctl = "true"
+        with self.assertRaises(RuntimeError):
+            apache.apache_start()
+        assert os.path.exists(self.root + "/apache.ready") == 0
+
+    def tearDown(self):
+        """Restore the environment, and remove the staged root"""
+        os.environ.clear()
+        os.environ.update(self.saved_env)
+        rmtree(self.root)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,246 @@
+"""
+***************************************************************************
+Benchmark:              Runconfig Startup Benchmark
+Authors/Maintainers:    Rich Nason (rnason@appcontainers.io)
+Copyright:              Copyright 2016 Richard Nason
+Description:            This benchmark will run each runconfig.py step under a
+                        sandboxed $RUNCONFIG_ROOT, repeat it, and report the
+                        median and p95 timings and the tracemalloc allocations, with a
+                        JSON baseline to compare against. It does not need apache,
+                        yum or apt to be installed.
+
+Usage:                  python -m tests.benchmark [--repeat N] [--output FILE] [--baseline FILE] [--tolerance 0.25]
+***************************************************************************
+"""
+# *******************************************************************
+# Required Modules:
+# *******************************************************************
+import os  # Used for various os level calls
+import io  # Used to silence the step console output
+import sys  # Used for the exit status
+import json  # Used to read and write the baseline files
+import math  # Used for the percentiles
+import time  # Used to time the steps
+import argparse  # Used to parse the command line
+import tempfile  # Used to create the sandbox root
+import contextlib  # Used to silence the step console output
+import tracemalloc  # Used to count the step allocations
+from shutil import rmtree
+
+# Import custom modules
+from modules.globals import Globals
+from modules.log import Log
+from modules.mode import Mode
+from modules.apache import Apache
+
+# Instantiate the global variables.
+GLOBALS = Globals()
+
+# *******************************************************************
+# Class Definitions:
+# *******************************************************************
+
+
+class Benchmark():
+    """Class to time the runconfig steps against a sandboxed filesystem root"""
+
+    def __init__(self, repeat=5):
+        """Set instantiation variables, and build the sandbox root"""
+        self.repeat = repeat
+        self.root = tempfile.mkdtemp(prefix="runconfig-bench-")
+        self.results = {}
+
+        # Run every step under the sandbox root, the open logfiles are closed so they reopen under it.
+        self.previous_root = os.environ.get('RUNCONFIG_ROOT')
+        os.environ['RUNCONFIG_ROOT'] = self.root
+
+        # APP_NAME is read by the Apache and CertGen constructors, it is only set for the benchmark, and restored by cleanup.
+        self.previous_app_name = os.environ.get('APP_NAME')
+        if not self.previous_app_name:
+            os.environ['APP_NAME'] = "benchmark.com"
+        Log.close_all()
+
+        self.log = Log()
+        self.apache = Apache()
+        self.checkfile = self.apache.www_root + self.apache.app_name + "/index.php"
+
+        for path in (self.apache.apache_dir + "sites-available", self.apache.apache_app_dir, self.apache.cert_path, self.apache.key_path,
+                     self.apache.www_root):
+            if not os.path.isdir(path):
+                os.makedirs(path)
+
+    def reset_apache(self):
+        """Put the stock apache config files back, so each run starts from a fresh image"""
+        with open(self.apache.apache_dir + self.apache.apache_conf, "w") as apache_conf:
+            apache_conf.write("ServerRoot \"/etc/httpd\"\nListen 80\n#ServerName www.example.com:80\nIncludeOptional conf.d/*.conf\n")
+        with open(self.apache.apache_dir + "sites-available/" + self.apache.apache_app_conf, "w") as app_conf:
+            app_conf.write("<VirtualHost *:443>\n    SSLEngine on\n    SSLCertificateFile /etc/ssl/certs/ssl-cert-snakeoil.pem\n"
+                           "    SSLCertificateKeyFile /etc/ssl/private/ssl-cert-snakeoil.key\n</VirtualHost>\n")
+        for conf in os.listdir(self.apache.apache_app_dir):
+            os.unlink(os.path.join(self.apache.apache_app_dir, conf))
+        if os.path.isdir(self.apache.www_root + self.apache.app_name):
+            rmtree(self.apache.www_root + self.apache.app_name)
+
+    def cert_gen(self):
+        """Return a CertGen writing to the sandbox, without a key pool so every run generates its key"""
+        from modules.certs import CertGen
+        cert_gen = CertGen()
+        cert_gen.key_pool = None
+        return cert_gen
+
+    def cases(self):
+        """Return the list of (name, setup, step) benchmark cases, setup runs before each timed run"""
+        def write_log():
+            """Write a thousand records and flush them"""
+            for record in range(1000):
+                self.log.write_log("Benchmark record " + str(record))
+            self.log.flush()
+
+        def generate_cert(keysize, key_type):
+            """Generate a self signed certificate"""
+            return lambda: self.cert_gen().generate_custom_cert(keysize, "US", "US", "Some City", "benchmark.com", "benchmark.com",
+                                                                 "benchmark.com", "sha512", "benchmark.com.crt", key_type)
+
+        mode = Mode()
+        cases = [
+            ("log_write", None, write_log),
+            ("globals_probe", None, lambda: Globals.State(cache_file=None).platform()),
+            ("config_verify", None, lambda: mode.config_verify(self.checkfile)),
+        ]
+        for keysize, key_type in ((2048, "rsa"), (4096, "rsa"), (256, "ec-p256"), (384, "ec-p384"), (256, "ed25519")):
+            cases.append(("generate_cert_" + key_type + ("_" + str(keysize) if key_type == "rsa" else ""), None, generate_cert(keysize, key_type)))
+
+        def generate_ca_leaf():
+            """Issue an ec-p256 leaf cert from the cached local CA"""
+            cert_gen = self.cert_gen()
+            cert_gen.ca_mode = True
+            cert_gen.generate_custom_cert(0, "US", "US", "Some City", "benchmark.com", "benchmark.com", "benchmark.com", "sha512", "benchmark.com.crt",
+                                          "ec-p256", ["www.benchmark.com"])
+        cases.append(("generate_ca_leaf_ec-p256", None, generate_ca_leaf))
+        cases.extend([
+            ("apache_config", self.reset_apache, self.apache.apache_config),
+            ("apache_app_config", self.reset_apache, self.apache.apache_app_config),
+            ("apache_init", self.reset_apache, self.apache.apache_init),
+        ])
+        return cases
+
+    @staticmethod
+    def summarize(durations):
+        """Return the median and p95 of a list of durations"""
+        durations = sorted(durations)
+        middle = len(durations) // 2
+        if len(durations) % 2:
+            median = durations[middle]
+        else:
+            median = (durations[middle - 1] + durations[middle]) / 2
+        return median, durations[max(0, int(math.ceil(0.95 * len(durations))) - 1)]
+
+    def run_case(self, name, setup, step):
+        """Time the step, then run it once more under tracemalloc to record its peak traced memory, and the number of
+        memory blocks it allocated that are still held when it returns"""
+        durations = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(self.repeat):
+                if setup is not None:
+                    setup()
+                start = time.perf_counter()
+                step()
+                durations.append(time.perf_counter() - start)
+
+            if setup is not None:
+                setup()
+            tracemalloc.start()
+            before = tracemalloc.take_snapshot()
+            step()
+            after = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        median, p95 = self.summarize(durations)
+        self.results[name] = {
+            "runs": len(durations),
+            "median": median,
+            "p95": p95,
+            "retained_blocks": sum(stat.count_diff for stat in after.compare_to(before, "lineno") if stat.count_diff > 0),
+            "peak_kb": peak / 1024.0,
+        }
+        return self.results[name]
+
+    def run(self, only=None):
+        """Run every benchmark case, or the cases named in only, returns the results dictionary"""
+        for name, setup, step in self.cases():
+            if only and name not in only:
+                continue
+            self.run_case(name, setup, step)
+        return self.results
+
+    def report(self):
+        """Return a table of the results"""
+        lines = ["%-28s %10s %10s %12s %10s" % ("Step", "Median ms", "p95 ms", "Kept blocks", "Peak KiB")]
+        for name, result in self.results.items():
+            lines.append("%-28s %10.3f %10.3f %12d %10.1f" % (name, result["median"] * 1000, result["p95"] * 1000, result["retained_blocks"], result["peak_kb"]))
+        return "\n".join(lines)
+
+    def save(self, output_file):
+        """Write the results to a JSON baseline file"""
+        with open(output_file, "w") as output:
+            json.dump({"platform": GLOBALS.platform()["distro"], "repeat": self.repeat, "results": self.results}, output, indent=2, sort_keys=True)
+
+    @staticmethod
+    def compare(results, baseline, tolerance=0.25):
+        """Compare results to a baseline dictionary, returns a list of regression messages for steps whose median
+        got slower than the baseline by more than the tolerance"""
+        regressions = []
+        for name, result in sorted(results.items()):
+            previous = baseline.get("results", {}).get(name)
+            if previous is None:
+                continue
+            if result["median"] > previous["median"] * (1 + tolerance):
+                regressions.append("%s median %.3fms is %.0f%% slower than the baseline %.3fms" % (
+                    name, result["median"] * 1000, (result["median"] / previous["median"] - 1) * 100, previous["median"] * 1000))
+        return regressions
+
+    def cleanup(self):
+        """Remove the sandbox root, and go back to the real root"""
+        Log.close_all()
+        if self.previous_root is None:
+            del os.environ['RUNCONFIG_ROOT']
+        else:
+            os.environ['RUNCONFIG_ROOT'] = self.previous_root
+        if self.previous_app_name is None:
+            os.environ.pop('APP_NAME', None)
+        else:
+            os.environ['APP_NAME'] = self.previous_app_name
+        rmtree(self.root)
+
+
+def main():
+    """Run the benchmark from the command line, exits 1 if a step regressed against the baseline"""
+    parser = argparse.ArgumentParser(description="Benchmark the runconfig startup steps")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per step")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare the results to this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed median slowdown against the baseline")
+    parser.add_argument("steps", nargs="*", help="only run these steps")
+    args = parser.parse_args()
+
+    benchmark = Benchmark(args.repeat)
+    try:
+        benchmark.run(args.steps)
+    finally:
+        benchmark.cleanup()
+    print(benchmark.report())
+
+    if args.output:
+        benchmark.save(args.output)
+
+    if args.baseline:
+        with open(args.baseline, "r") as baseline:
+            regressions = benchmark.compare(benchmark.results, json.load(baseline), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION: " + regression)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
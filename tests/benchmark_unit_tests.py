@@ -0,0 +1,52 @@
+"""
+***************************************************************************
+Unit Test:              Runconfig Startup Benchmark Unit Tests
+Authors/Maintainers:    Rich Nason (rnason@appcontainers.io)
+Copyright:              Copyright 2016 Richard Nason
+Description:            These Unit tests will tests the Benchmark Class to ensure proper code level functionality.
+***************************************************************************
+"""
+# *******************************************************************
+# Required Modules:
+# *******************************************************************
+import unittest
+import os
+from tests.benchmark import Benchmark
+
+
+class BenchmarkTests(unittest.TestCase):
+    """Tests for benchmark.py"""
+
+    def setUp(self):
+        """Initialize the class, and instantiate a Benchmark instance"""
+        self.benchmark = Benchmark(repeat=3)
+
+    def test_summarize(self):
+        """Test the median and p95 of the durations"""
+        self.assertEqual(Benchmark.summarize([3, 1, 2]), (2, 3))
+        self.assertEqual(Benchmark.summarize([4, 1, 3, 2]), (2.5, 4))
+        self.assertEqual(Benchmark.summarize(list(range(1, 101))), (50.5, 95))
+
+    def test_compare(self):
+        """Test that only steps slower than the baseline by more than the tolerance are reported"""
+        baseline = {"results": {"apache_init": {"median": 0.010}, "apache_config": {"median": 0.010}}}
+        results = {"apache_init": {"median": 0.012}, "apache_config": {"median": 0.020}, "log_write": {"median": 1.0}}
+        regressions = Benchmark.compare(results, baseline, 0.25)
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith("apache_config"))
+
+    def test_run(self):
+        """Test that the steps run inside the sandbox root"""
+        results = self.benchmark.run(["config_verify", "apache_init"])
+        self.assertEqual(sorted(results), ["apache_init", "config_verify"])
+        self.assertEqual(results["apache_init"]["runs"], 3)
+        self.assertLessEqual(results["apache_init"]["median"], results["apache_init"]["p95"])
+        assert os.path.exists(self.benchmark.checkfile) == 1
+        self.assertTrue(self.benchmark.checkfile.startswith(self.benchmark.root))
+
+    def tearDown(self):
+        """Perform file cleanup from tests"""
+        self.benchmark.cleanup()
+
+if __name__ == '__main__':
+    unittest.main()
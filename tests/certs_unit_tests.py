@@ -11,8 +11,22 @@ Description:            These Unit tests will tests the CertGen Class to ensure
 # *******************************************************************
 import unittest
 import os
+import sys
+import json
+import datetime
+import subprocess
+import tempfile
+from shutil import rmtree
+from concurrent.futures import ThreadPoolExecutor
+from socket import gethostname
 from modules.globals import Globals
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
 from modules.certs import CertGen
+from modules.steps import StepGraph
+from modules.state import StateManifest
 
 
 class CertTests(unittest.TestCase):
@@ -152,6 +166,205 @@ class CertTests(unittest.TestCase):
         print("Validating custom cert exists success...")
         self.assertTrue(self.cert_gen.custom_cert_exists("bogus.crt"))
 
+    def test_generate_key_types(self):
+        """Generate EC and Ed25519 certificates and ensure that the key and signature algorithms are correct"""
+        expected = {"ec-p256": ("secp256r1", "sha256"), "ec-p384": ("secp384r1", "sha512"), "ed25519": (None, None)}
+
+        for key_type, (curve, digest) in expected.items():
+            print("Generating " + key_type + " certificate key pair...")
+            encryption = digest or "sha512"
+            cert = self.cert_gen.generate_custom_cert(0, "US", "NC", "Raleigh", "Bogus", "Bogus", "www.bogus.com", encryption, "bogus.crt", key_type)
+            self.assertIsNone(cert)
+
+            with open(self.cert_path + "bogus.crt", "rb") as cert_file:
+                cert = x509.load_pem_x509_certificate(cert_file.read())
+            with open(self.key_path + "bogus.key", "rb") as key_file:
+                key = serialization.load_pem_private_key(key_file.read(), None)
+
+            # Ensure that the key matches the certificate, and the certificate was signed with the right algorithm.
+            self.assertEqual(cert.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo),
+                             key.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo))
+            if curve:
+                self.assertEqual(key.curve.name, curve)
+                self.assertEqual(cert.signature_hash_algorithm.name, digest)
+            else:
+                self.assertIsInstance(key, ed25519.Ed25519PrivateKey)
+
+            # Ensure that the hostname is set as a subject alternative name.
+            sans = cert.extensions.get_extension_for_class(x509.SubjectAlternativeName).value
+            self.assertEqual(sans.get_values_for_type(x509.DNSName), ["www.bogus.com"])
+
+            # Ensure that only the owner can read the private key, and that no temp files were left behind.
+            self.assertEqual(os.stat(self.key_path + "bogus.key").st_mode & 0o777, 0o600)
+            self.assertEqual(os.stat(self.cert_path + "bogus.crt").st_mode & 0o777, 0o644)
+            self.assertEqual([name for name in os.listdir(self.key_path) if name.endswith(".tmp")], [])
+
+        print("Testing faulty key type...")
+        cert = self.cert_gen.generate_custom_cert(0, "US", "NC", "Raleigh", "Bogus", "Bogus", "www.bogus.com", "sha512", "bogusfail.crt", "dsa")
+        self.assertIn('Key Type must be one of', cert, msg="A valid key type was not passed in.")
+
+        print("Testing missing ed25519 cert name...")
+        cert = self.cert_gen.generate_custom_cert(0, "US", "NC", "Raleigh", "Bogus", "Bogus", "www.bogus.com", "sha512", None, "ed25519")
+        self.assertEqual(cert, "Cert Name must be a valid string value")
+
+    def test_structured_warnings(self):
+        """Ensure that the validation warnings keep the LOG_FORMAT=json console output one JSON event per line"""
+        root = tempfile.mkdtemp()
+        try:
+            script = ("from modules.certs import CertGen\n"
+                      "CertGen().validate_cert_values(8192, 'US', 'NC', 'Raleigh', 'Bogus', 'Bogus', 'www.bogus.com', 'sha256', 'bogus.crt', 'rsa')\n"
+                      "CertGen().validate_cert_values(0, 'US', 'NC', 'Raleigh', 'Bogus', 'Bogus', 'www.bogus.com', 'sha512', None, 'ed25519')\n")
+            env = dict(os.environ, LOG_FORMAT="json", LOG_ASYNC="false", RUNCONFIG_ROOT=root)
+            process = subprocess.run([sys.executable, "-c", script], stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True,
+                                     env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            self.assertEqual(process.returncode, 0, process.stderr)
+            events = [json.loads(line) for line in process.stdout.splitlines()]
+        finally:
+            rmtree(root)
+
+        messages = [event["message"] for event in events]
+        self.assertIn("/etc/", messages[1])
+        self.assertTrue(any(message.startswith("WARNING: Ed25519") for message in messages))
+        self.assertIn("Cert Name must be a valid string value", messages)
+
+    def test_generate_batch(self):
+        """Generate a batch of certificates in parallel and ensure that each spec reports its result"""
+        spec = {"keysize": 1024, "country": "US", "state": "NC", "loc": "Raleigh", "org": "Bogus", "orgunit": "Bogus",
+                "common_name": "www.bogus.com", "encryption": "sha256", "cert_name": "bogus.crt"}
+        specs = [spec, dict(spec, common_name="db.bogus.com", cert_name="bogusdb.crt"), dict(spec, country=1234, cert_name="bogusfail.crt")]
+
+        print("Generating certificate batch...")
+        results = self.cert_gen.generate_batch(specs)
+
+        # Ensure that the results are returned in spec order.
+        self.assertEqual([result["cert_name"] for result in results], ["bogus.crt", "bogusdb.crt", "bogusfail.crt"])
+
+        print("Validating batch cert and key files were created...")
+        for result in results[:2]:
+            self.assertIsNone(result["error"])
+            assert os.path.exists(result["cert_file"]) == 1
+            assert os.path.exists(result["key_file"]) == 1
+
+        print("Validating batch faulty values...")
+        self.assertIn('Country must be a valid string value', results[2]["error"])
+        assert os.path.exists(self.cert_path + "bogusfail.crt") == 0
+
+    def test_cert_cache(self):
+        """Ensure that a valid cert is reused from the cache index, and that the reason for a regeneration is recorded"""
+        print("Generating a cert when none exists...")
+        self.assertEqual(self.cert_gen.ensure_cert("ec-p256"), "missing")
+        self.assertEqual(self.cert_gen.generation_reason(), "missing")
+        entry = self.cert_gen.load_cache()[self.app_name + ".crt"]
+        self.assertTrue(entry["key_match"])
+        self.assertEqual(entry["algorithm"], "ec-p256")
+
+        print("Validating that the valid cert is reused...")
+        self.assertIsNone(CertGen().ensure_cert("ec-p256"))
+        self.assertEqual(CertGen().load_cache()[self.app_name + ".crt"]["fingerprint"], entry["fingerprint"])
+
+        print("Validating the regeneration reasons...")
+        self.assertEqual(self.cert_gen.regenerate_reason(common_name="other.host"), "hostname mismatch")
+        self.assertEqual(self.cert_gen.regenerate_reason(key_type="rsa"), "key type mismatch")
+        os.environ['CERT_RENEW_DAYS'] = "4000"
+        try:
+            self.assertEqual(self.cert_gen.regenerate_reason(), "expiring")
+        finally:
+            del os.environ['CERT_RENEW_DAYS']
+        with open(self.key_path + self.app_name + ".key", "wb") as key:
+            key.write(ec.generate_private_key(ec.SECP256R1()).private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                                                            serialization.NoEncryption()))
+        self.assertEqual(self.cert_gen.regenerate_reason(), "key mismatch")
+        self.assertEqual(self.cert_gen.ensure_cert("ec-p256"), "key mismatch")
+        self.assertEqual(CertGen().generation_reason(), "key mismatch")
+
+    def test_cache_writers(self):
+        """Ensure that CertGen instances indexing certs at the same time keep each other's cache entries"""
+        writers = [CertGen() for _ in range(2)]
+        for writer in writers:
+            writer.load_cache()
+
+        print("Generating certs from two CertGen instances at once...")
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            jobs = [executor.submit(writer.generate_custom_cert, 0, "US", "NC", "Raleigh", "Bogus", "Bogus", common_name, "sha256", cert_name, "ec-p256")
+                    for writer, (common_name, cert_name) in zip(writers, (("www.bogus.com", "bogus.crt"), ("db.bogus.com", "bogusdb.crt")))]
+            for job in jobs:
+                self.assertIsNone(job.result())
+
+        print("Validating the cache index holds both certs...")
+        self.assertEqual(sorted(CertGen().load_cache()), ["bogus.crt", "bogusdb.crt"])
+        self.assertEqual([name for name in os.listdir(os.path.dirname(self.cert_gen.cache_file)) if name.endswith(".tmp")], [])
+
+    def test_expired_cert_renewed(self):
+        """Ensure that an expired cert is renewed on restart when the step manifest shows nothing changed"""
+        key = ec.generate_private_key(ec.SECP256R1())
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, gethostname())])
+        now = datetime.datetime.utcnow()
+        cert = x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key()).serial_number(x509.random_serial_number())
+        cert = cert.not_valid_before(now - datetime.timedelta(days=400)).not_valid_after(now - datetime.timedelta(days=1)).sign(key, hashes.SHA256())
+        self.cert_gen.write_cert_pair(self.app_name + ".crt", cert.public_bytes(serialization.Encoding.PEM),
+                                      key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+
+        # The certificate step as runconfig.py adds it, recorded as up to date on the previous start.
+        manifest_path = tempfile.mkdtemp()
+        try:
+            steps = StepGraph()
+            steps.add("apache_certs", lambda: CertGen().ensure_cert("ec-p256"), always=True, env=["APP_NAME", "HOSTNAME", "CERT_KEY_TYPE", "CERT_CA"],
+                      outputs=list(self.cert_gen.cert_files(self.app_name + ".crt")))
+            manifest = StateManifest(manifest_path + "/manifest.json")
+            manifest.record(steps.steps["apache_certs"])
+            manifest.save()
+
+            print("Restarting with an expired cert and an unchanged manifest...")
+            self.assertEqual(steps.run(StateManifest(manifest_path + "/manifest.json")), {"apache_certs": "ok"})
+            self.assertEqual(CertGen().generation_reason(), "expiring")
+            self.assertIsNone(CertGen().regenerate_reason(key_type="ec-p256"))
+        finally:
+            rmtree(manifest_path)
+
+    def test_ca_mode(self):
+        """Ensure that CA mode creates the CA once, and issues leaf certs signed by it with SANs and unique serials"""
+        ca_path = tempfile.mkdtemp()
+        os.environ['CERT_CA'] = "1"
+        os.environ['CERT_CA_PATH'] = ca_path + "/ca/"
+        try:
+            cert_gen = CertGen()
+            self.assertEqual(cert_gen.default_key_type(), "ec-p256")
+
+            print("Generating CA signed leaf certs...")
+            cert_gen.generate_custom_cert(0, "US", "NC", "Raleigh", "Bogus", "Bogus", "www.bogus.com", "sha256", "bogus.crt", "ec-p256", ["bogus.com"])
+            assert os.path.exists(ca_path + "/ca/ca.crt") == 1
+            ca_cert = x509.load_pem_x509_certificate(cert_gen.load_ca()[0])
+            CertGen.ca_cache.clear()
+            results = CertGen().generate_batch([{"keysize": 0, "country": "US", "state": "NC", "loc": "Raleigh", "org": "Bogus", "orgunit": "Bogus",
+                                                 "common_name": "db.bogus.com", "encryption": "sha256", "cert_name": "bogusdb.crt", "key_type": "ec-p256"}])
+            self.assertIsNone(results[0]["error"])
+
+            print("Validating the leaf certs were signed by the cached CA...")
+            serials = []
+            for cert_name in ("bogus.crt", "bogusdb.crt"):
+                with open(self.cert_path + cert_name, "rb") as cert_file:
+                    cert = x509.load_pem_x509_certificate(cert_file.read())
+                self.assertEqual(cert.issuer, ca_cert.subject)
+                cert.verify_directly_issued_by(ca_cert)
+                self.assertFalse(cert.extensions.get_extension_for_class(x509.BasicConstraints).value.ca)
+                serials.append(cert.serial_number)
+            self.assertNotEqual(serials[0], serials[1])
+            sans = cert_gen.load_cache()["bogus.crt"]["sans"]
+            self.assertEqual(sans, ["www.bogus.com", "bogus.com"])
+
+            print("Validating self signed certs are reissued by the CA...")
+            self.assertIsNone(cert_gen.regenerate_reason("bogus.crt", "bogus.com"))
+            del os.environ['CERT_CA']
+            self.cert_gen.generate_custom_cert(0, "US", "NC", "Raleigh", "Bogus", "Bogus", "www.bogus.com", "sha256", "bogus.crt", "ec-p256")
+            self.assertEqual(CertGen().regenerate_reason("bogus.crt", "www.bogus.com"), None)
+            os.environ['CERT_CA'] = "1"
+            self.assertEqual(CertGen().regenerate_reason("bogus.crt", "www.bogus.com"), "issuer mismatch")
+        finally:
+            os.environ.pop('CERT_CA', None)
+            del os.environ['CERT_CA_PATH']
+            CertGen.ca_cache.clear()
+            rmtree(ca_path)
+
     def tearDown(self):
         """Perform file cleanup from tests"""
         if os.path.isfile(self.cert_path + self.app_name + ".crt"):
@@ -162,6 +375,14 @@ class CertTests(unittest.TestCase):
             os.remove(self.cert_path + "bogus.crt")
         if os.path.isfile(self.key_path + "bogus.key"):
             os.remove(self.key_path + "bogus.key")
+        if os.path.isfile(self.cert_path + "bogusdb.crt"):
+            os.remove(self.cert_path + "bogusdb.crt")
+        if os.path.isfile(self.key_path + "bogusdb.key"):
+            os.remove(self.key_path + "bogusdb.key")
+        if os.path.isfile(self.cert_gen.cache_file):
+            os.remove(self.cert_gen.cache_file)
+        if os.path.isfile(self.cert_gen.cache_file + ".lock"):
+            os.remove(self.cert_gen.cache_file + ".lock")
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,78 @@
+"""
+***************************************************************************
+Unit Test:              Runconfig Cgroup Module Unit Tests
+Authors/Maintainers:    Rich Nason (rnason@appcontainers.io)
+Copyright:              Copyright 2016 Richard Nason
+Description:            These Unit tests will tests the Cgroup Class to ensure proper code level functionality.
+***************************************************************************
+"""
+# *******************************************************************
+# Required Modules:
+# *******************************************************************
+import unittest
+import os
+import tempfile
+from shutil import rmtree
+from modules.cgroup import Cgroup
+
+
+class CgroupTests(unittest.TestCase):
+    """Tests for cgroup.py"""
+
+    def setUp(self):
+        """Create a fake cgroup hierarchy and meminfo file with 8GB of host memory"""
+        self.cgroup_path = tempfile.mkdtemp()
+        self.meminfo = os.path.join(self.cgroup_path, "meminfo")
+        self.write("meminfo", "MemTotal:        8388608 kB\nMemFree:         4194304 kB\n")
+
+    def write(self, name, text):
+        """Write a fake cgroup file"""
+        file_path = os.path.join(self.cgroup_path, name)
+        if not os.path.isdir(os.path.dirname(file_path)):
+            os.makedirs(os.path.dirname(file_path))
+        with open(file_path, "w") as cgroup_file:
+            cgroup_file.write(text)
+
+    def test_cgroup_v2(self):
+        """Read the CPU quota and memory limit from a cgroup v2 hierarchy"""
+        self.write("cgroup.controllers", "cpu memory\n")
+        self.write("cpu.max", "150000 100000\n")
+        self.write("memory.max", "536870912\n")
+        cgroup = Cgroup(self.cgroup_path, self.meminfo)
+        self.assertEqual(cgroup.version(), 2)
+        self.assertEqual(cgroup.cpu_quota(), 1.5)
+        self.assertEqual(cgroup.cpus(), min(2, Cgroup.host_cpus()))
+        self.assertEqual(cgroup.memory(), 536870912)
+
+        print("Testing an unlimited cgroup v2 hierarchy...")
+        self.write("cpu.max", "max 100000\n")
+        self.write("memory.max", "max\n")
+        self.assertIsNone(cgroup.cpu_quota())
+        self.assertEqual(cgroup.cpus(), Cgroup.host_cpus())
+        self.assertIsNone(cgroup.memory_limit())
+        self.assertEqual(cgroup.memory(), 8589934592)
+
+    def test_cgroup_v1(self):
+        """Read the CPU quota and memory limit from a cgroup v1 hierarchy"""
+        self.write("cpu/cpu.cfs_quota_us", "50000\n")
+        self.write("cpu/cpu.cfs_period_us", "100000\n")
+        self.write("memory/memory.limit_in_bytes", "268435456\n")
+        cgroup = Cgroup(self.cgroup_path, self.meminfo)
+        self.assertEqual(cgroup.version(), 1)
+        self.assertEqual(cgroup.cpu_quota(), 0.5)
+        self.assertEqual(cgroup.cpus(), 1)
+        self.assertEqual(cgroup.memory(), 268435456)
+
+        print("Testing an unlimited cgroup v1 hierarchy...")
+        self.write("cpu/cpu.cfs_quota_us", "-1\n")
+        self.write("memory/memory.limit_in_bytes", "9223372036854771712\n")
+        self.assertIsNone(cgroup.cpu_quota())
+        self.assertIsNone(cgroup.memory_limit())
+        self.assertEqual(cgroup.memory(), 8589934592)
+
+    def tearDown(self):
+        """Perform file cleanup from tests"""
+        rmtree(self.cgroup_path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+"""
+***************************************************************************
+Unit Test:              Runconfig Command Module Unit Tests
+Authors/Maintainers:    Rich Nason (rnason@appcontainers.io)
+Copyright:              Copyright 2016 Richard Nason
+Description:            These Unit tests will tests the Command Class to ensure proper code level functionality.
+***************************************************************************
+"""
+# *******************************************************************
+# Required Modules:
+# *******************************************************************
+import unittest
+import time
+from modules.command import Command
+
+
+class CommandTests(unittest.TestCase):
+    """Tests for command.py"""
+
+    def setUp(self):
+        """Initialize the class, and instantiate a Command instance"""
+        self.commands = Command(timeout=5, max_workers=4)
+
+    def test_run(self):
+        """Test that the exit code and output of a command are captured"""
+        result = self.commands.run("echo Test1; echo Test2 >&2; exit 3")
+        self.assertEqual(result.returncode, 3)
+        self.assertEqual(result.stdout, "Test1\n")
+        self.assertEqual(result.stderr, "Test2\n")
+        self.assertGreaterEqual(result.duration, 0)
+
+        # Commands passed as a list are ran without a shell
+        result = self.commands.run(["echo", "$HOME"])
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(result.stdout, "$HOME\n")
+
+    def test_failures(self):
+        """Test that timeouts and missing binaries are reported instead of raised"""
+        result = self.commands.run(["sleep", "5"], timeout=0.2)
+        self.assertIsNone(result.returncode)
+        self.assertIn("Timed out", result.stderr)
+
+        result = self.commands.run(["/bin/bogus-command"])
+        self.assertEqual(result.returncode, 127)
+
+    def test_run_many(self):
+        """Test that independent commands run at the same time, and results are returned in command order"""
+        start = time.monotonic()
+        results = self.commands.run_many(["sleep 0.5; echo 1", "sleep 0.5; echo 2", "sleep 0.5; echo 3"])
+        self.assertLess(time.monotonic() - start, 1.4)
+        self.assertEqual([result.stdout for result in results], ["1\n", "2\n", "3\n"])
+
+if __name__ == '__main__':
+    unittest.main()
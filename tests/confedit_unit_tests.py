@@ -0,0 +1,80 @@
+"""
+***************************************************************************
+Unit Test:              Runconfig Config Editor Module Unit Tests
+Authors/Maintainers:    Rich Nason (rnason@appcontainers.io)
+Copyright:              Copyright 2016 Richard Nason
+Description:            These Unit tests will tests the ConfigEditor Class to ensure proper code level functionality.
+***************************************************************************
+"""
+# *******************************************************************
+# Required Modules:
+# *******************************************************************
+import unittest
+import os
+import tempfile
+from shutil import rmtree
+from modules.confedit import ConfigEditor
+
+
+class ConfigEditorTests(unittest.TestCase):
+    """Tests for confedit.py"""
+
+    def setUp(self):
+        """Create a temp config file to edit"""
+        self.config_path = tempfile.mkdtemp()
+        self.config_file = os.path.join(self.config_path, "httpd.conf")
+        with open(self.config_file, "w") as config_file:
+            config_file.write("Listen 80\n#ServerName www.example.com:80\nSSLCertificateFile /etc/pki/tls/certs/localhost.crt\n/tmp/./.runconfig.py\n")
+        os.chmod(self.config_file, 0o640)
+
+    def read_config(self):
+        """Return the lines of the test config file"""
+        with open(self.config_file, "r") as config_file:
+            return config_file.read().splitlines()
+
+    def test_commit(self):
+        """Test that every queued edit is applied in one rewrite"""
+        editor = ConfigEditor(self.config_file)
+        editor.set_directive("ServerName", "www.Test.com:80")
+        editor.substitute(r'^(SSLCertificateFile\s+)\S+', r'\g<1>/etc/pki/tls/certs/Test.com.crt')
+        editor.delete_lines(r'/tmp/\./\.runconfig\.py')
+        editor.append_if_missing("service httpd start")
+        self.assertTrue(editor.commit())
+
+        self.assertEqual(self.read_config(), ["Listen 80", "ServerName www.Test.com:80", "SSLCertificateFile /etc/pki/tls/certs/Test.com.crt",
+                                              "service httpd start"])
+
+        # The rewritten file should keep its permissions, and leave no temp file behind.
+        self.assertEqual(os.stat(self.config_file).st_mode & 0o777, 0o640)
+        self.assertEqual(os.listdir(self.config_path), ["httpd.conf"])
+
+    def test_idempotent(self):
+        """Test that running the same edits again does not change or rewrite the file"""
+        ConfigEditor(self.config_file).set_directive("ServerName", "www.Test.com:80").append_if_missing("service httpd start").commit()
+        mtime = os.stat(self.config_file).st_mtime_ns
+
+        self.assertFalse(ConfigEditor(self.config_file).set_directive("ServerName", "www.Test.com:80").append_if_missing("service httpd start").commit())
+        self.assertEqual(os.stat(self.config_file).st_mtime_ns, mtime)
+
+        # Setting the directive to a new value replaces the active directive instead of adding another one.
+        ConfigEditor(self.config_file).set_directive("ServerName", "www.Other.com:80").commit()
+        self.assertEqual([line for line in self.read_config() if "ServerName" in line], ["ServerName www.Other.com:80"])
+
+    def test_append_directive(self):
+        """Test that a directive that is not in the file is appended, as on debian"""
+        ConfigEditor(self.config_file).set_directive("ServerTokens", "Prod").commit()
+        self.assertEqual(self.read_config()[-1], "ServerTokens Prod")
+
+    def test_replace_block(self):
+        """Test that a marked block is appended once, and replaced when it is written again"""
+        ConfigEditor(self.config_file).replace_block("runconfig", 'APP="Test.com"').commit()
+        ConfigEditor(self.config_file).replace_block("runconfig", 'APP="Other.com"\nexport APP').commit()
+        self.assertEqual(self.read_config()[4:], ["", "# BEGIN runconfig", 'APP="Other.com"', "export APP", "# END runconfig"])
+        self.assertFalse(ConfigEditor(self.config_file).replace_block("runconfig", 'APP="Other.com"\nexport APP').commit())
+
+    def tearDown(self):
+        """Perform file cleanup from tests"""
+        rmtree(self.config_path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,6 +11,9 @@ Description:            These Unit tests will tests the Globals Class to ensure
 # *******************************************************************
 import unittest
 import os
+import json
+import tempfile
+from shutil import rmtree
 from modules.globals import Globals
 
 
@@ -30,5 +33,38 @@ class GlobalTests(unittest.TestCase):
         else:
             self.assertFalse(self.global_variables.is_rhel())
 
+    def test_platform(self):
+        """Check that the platform profile covers the distro, package, apache, and cert facts, and is only probed once"""
+        platform = self.global_variables.platform()
+        self.assertEqual(platform["rhel"], self.global_variables.is_rhel())
+        for fact in ("family", "distro", "version", "service_mgr", "package_mgr", "apache_dir", "apache_binary", "cert_path", "key_path"):
+            self.assertIn(fact, platform)
+        self.assertIs(Globals().platform(), platform)
+
+    def test_platform_cache(self):
+        """Check that the platform profile is written to the cache file, and read back while the release files are unchanged"""
+        cache_path = tempfile.mkdtemp()
+        cache_file = os.path.join(cache_path, "runconfig", "platform.json")
+        try:
+            platform = Globals.State(cache_file).platform()
+            self.assertEqual(platform, self.global_variables.platform())
+            assert os.path.exists(cache_file) == 1
+
+            # A cached profile is used as is, without probing the distro again
+            with open(cache_file, "r") as cache:
+                cached = json.load(cache)
+            cached["profile"]["distro"] = "cached"
+            with open(cache_file, "w") as cache:
+                json.dump(cached, cache)
+            self.assertEqual(Globals.State(cache_file).platform()["distro"], "cached")
+
+            # A cache written for other release files is ignored
+            cached["key"] = {}
+            with open(cache_file, "w") as cache:
+                json.dump(cached, cache)
+            self.assertEqual(Globals.State(cache_file).platform()["distro"], platform["distro"])
+        finally:
+            rmtree(cache_path)
+
 if __name__ == '__main__':
     unittest.main()
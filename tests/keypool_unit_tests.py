@@ -0,0 +1,92 @@
+"""
+***************************************************************************
+Unit Test:              Runconfig Key Pool Module Unit Tests
+Authors/Maintainers:    Rich Nason (rnason@appcontainers.io)
+Copyright:              Copyright 2016 Richard Nason
+Description:            These Unit tests will tests the KeyPool Class to ensure proper code level functionality.
+***************************************************************************
+"""
+# *******************************************************************
+# Required Modules:
+# *******************************************************************
+import unittest
+import os
+import json
+import tempfile
+from shutil import rmtree
+from modules.keypool import KeyPool, INSTALL_LOG
+from modules.certs import CertGen
+
+
+class KeyPoolTests(unittest.TestCase):
+    """Tests for keypool.py"""
+
+    def setUp(self):
+        """Initialize the class, and instantiate a KeyPool instance in a temp directory"""
+        self.pool_path = tempfile.mkdtemp()
+        self.key_pool = KeyPool(self.pool_path)
+
+    def test_fill(self):
+        """Fill the pool and ensure that the keys were written and indexed"""
+        self.key_pool.fill(2, 1024)
+
+        self.assertEqual(self.key_pool.available(1024), 2)
+        self.assertEqual(self.key_pool.available(2048), 0)
+        self.assertEqual(len(os.listdir(self.key_pool.ready_path)), 2)
+        self.assertEqual(self.key_pool.stats()["produced"], 2)
+
+    def test_claim(self):
+        """Claim keys from the pool and ensure that hits and misses are recorded"""
+        self.key_pool.fill(1, 1024)
+
+        k = self.key_pool.claim(1024)
+        self.assertEqual(k.bits(), 1024)
+        self.assertEqual(self.key_pool.available(1024), 0)
+        self.assertEqual(os.listdir(self.key_pool.claimed_path), [])
+
+        # The pool is now empty, so the next claim should miss.
+        self.assertIsNone(self.key_pool.claim(1024))
+
+        stats = self.key_pool.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+
+    def test_certgen_key_pool(self):
+        """Ensure that CertGen claims its key from the pool, and falls back to inline generation"""
+        self.key_pool.fill(1, 1024)
+        cert_gen = CertGen(key_pool=self.key_pool)
+
+        self.assertEqual(cert_gen.generate_key(1024).bits(), 1024)
+        self.assertEqual(self.key_pool.available(1024), 0)
+
+        # Pool is empty, the key should still be generated.
+        self.assertEqual(cert_gen.generate_key(1024).bits(), 1024)
+        self.assertEqual(self.key_pool.stats()["misses"], 1)
+
+    def test_image_layer(self):
+        """Ensure that filling a pool that is not on a volume, and claiming a key another host generated from it, warn
+        that the keys are shared by every container started from the image"""
+        self.key_pool.in_image_layer = lambda: True
+        self.key_pool.fill(1, 1024)
+
+        # Mark the key as generated by the image build
+        with open(self.key_pool.index_file, "r") as index_file:
+            index = json.load(index_file)
+        for key in index["keys"].values():
+            key["host"] = "image-build"
+        with open(self.key_pool.index_file, "w") as index_file:
+            json.dump(index, index_file)
+
+        self.assertEqual(self.key_pool.claim(1024).bits(), 1024)
+        INSTALL_LOG.flush()
+        with open(INSTALL_LOG.writer.handle.name, "r") as logfile:
+            logs = logfile.read()
+        self.assertIn("WARNING: key pool " + self.pool_path + " is not on a volume", logs)
+        self.assertIn("WARNING: claimed a private key generated by image-build", logs)
+
+    def tearDown(self):
+        """Perform file cleanup from tests"""
+        rmtree(self.pool_path)
+
+if __name__ == '__main__':
+    unittest.main()
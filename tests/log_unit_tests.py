@@ -11,6 +11,9 @@ Description:            These Unit tests will tests the Log Class to ensure prop
 # *******************************************************************
 import unittest
 import os
+import json
+import time
+import datetime
 from modules.log import Log
 
 
@@ -20,10 +23,18 @@ class LogTests(unittest.TestCase):
     def setUp(self):
         """Initialize the class, and instantiate a Log instance"""
         self.logfile = "/var/log/docker/install.log"
+        self.timingfile = "/tmp/timings.json"
+        self.jsonfile = "/tmp/install.json"
         self.install_log = Log()
 
+        # The logger only creates its directory on the first write, the tests truncate the logfile before writing.
+        if not os.path.isdir(os.path.dirname(self.logfile)):
+            os.makedirs(os.path.dirname(self.logfile))
+
     def test_logfile(self):
         """Test the logfile file path and ensure that the file exists"""
+        self.install_log.write_log("Test0")
+        self.install_log.flush()
         assert os.path.exists(self.logfile) == 1
 
     def test_write_log(self):
@@ -71,6 +82,114 @@ class LogTests(unittest.TestCase):
         for line in logs:
             self.assertIn('Complete', line, msg="Log message was not properly written to the logfile.")
 
+    def test_buffered_write(self):
+        """Test that log messages are buffered until the log is flushed"""
+        # Clear the file in the event that any data is already in it
+        self.install_log.flush()
+        open(self.logfile, 'w').close()
+
+        # Hold the messages in the buffer until an explicit flush
+        self.install_log.writer.buffer_size = 65536
+        self.install_log.writer.flush_interval = 3600
+        self.install_log.write_log("Test4")
+        self.install_log.write_log("Test5")
+        self.assertEqual(os.path.getsize(self.logfile), 0)
+
+        # Every Log instance should share the same buffered writer
+        self.assertIs(Log().writer, self.install_log.writer)
+
+        self.install_log.flush()
+        with open(self.logfile, "r") as logfile:
+            logs = logfile.readlines()
+            logfile.close()
+
+        self.assertEqual(len(logs), 2)
+        self.assertIn('Test4', logs[0], msg="Log message was not properly written to the logfile.")
+        self.assertIn('Test5', logs[1], msg="Log message was not properly written to the logfile.")
+
+    def test_record_timestamps(self):
+        """Test that every record is stamped with its own time instead of the instantiation time"""
+        self.install_log.flush()
+        open(self.logfile, 'w').close()
+
+        self.install_log.write_log("Test6")
+        time.sleep(0.01)
+        self.install_log.write_log("Test7")
+        self.install_log.flush()
+
+        with open(self.logfile, "r") as logfile:
+            logs = logfile.readlines()
+            logfile.close()
+
+        first = datetime.datetime.strptime(logs[0].split(" : ")[0], "%Y-%m-%d %H:%M:%S.%f")
+        second = datetime.datetime.strptime(logs[1].split(" : ")[0], "%Y-%m-%d %H:%M:%S.%f")
+        self.assertGreaterEqual((second - first).total_seconds(), 0.01)
+
+    def test_step(self):
+        """Test that steps are timed as a context manager and as a decorator, and written to the timing file"""
+        with self.install_log.step("test_context"):
+            time.sleep(0.01)
+
+        @self.install_log.step("test_decorator")
+        def decorated():
+            """Decorated test step"""
+            raise ValueError("Test8")
+
+        with self.assertRaises(ValueError):
+            decorated()
+
+        timings = {timing["step"]: timing for timing in Log.timings}
+        self.assertGreaterEqual(timings["test_context"]["duration"], 0.01)
+        self.assertEqual(timings["test_context"]["status"], "ok")
+        self.assertEqual(timings["test_decorator"]["status"], "failed")
+        self.assertIn("test_context", self.install_log.timing_summary())
+
+        # Ensure that the timing file is valid JSON holding the steps
+        self.install_log.write_timings(self.timingfile)
+        with open(self.timingfile, "r") as timingfile:
+            steps = [timing["step"] for timing in json.load(timingfile)["steps"]]
+        self.assertIn("test_context", steps)
+        self.assertIn("test_decorator", steps)
+
+    def test_structured(self):
+        """Test that the structured mode writes JSON lines events from the background writer"""
+        structured_log = Log()
+        structured_log.structured = True
+        structured_log.writer = Log.AsyncWriter(self.jsonfile)
+
+        with structured_log.step("test_structured"):
+            structured_log.write_log("Test9")
+        structured_log.write_log_console("Test10", "Test11")
+        structured_log.write_console("Test12", 0.5)
+        structured_log.close()
+
+        with open(self.jsonfile, "r") as jsonfile:
+            events = [json.loads(line) for line in jsonfile]
+
+        messages = [event["message"] for event in events]
+        self.assertIn("Test9", messages)
+        self.assertIn("Test10 Test11", messages)
+        for event in events:
+            self.assertEqual(sorted(event), ["duration", "level", "message", "pid", "step", "timestamp"])
+            self.assertEqual(event["pid"], os.getpid())
+            self.assertIsNotNone(datetime.datetime.fromisoformat(event["timestamp"]).utcoffset())
+
+        # Events inside a step carry the step name, and the step finish carries its duration
+        self.assertEqual(events[messages.index("Test9")]["step"], "test_structured")
+        self.assertIsNone(events[messages.index("Test10 Test11")]["step"])
+        self.assertIsNotNone(events[2]["duration"])
+        self.assertEqual(events[messages.index("Test12")]["duration"], 0.5)
+
+    def tearDown(self):
+        """Flush any buffered messages, and restore the default flushing behaviour"""
+        self.install_log.flush()
+        self.install_log.writer.buffer_size = 8192
+        self.install_log.writer.flush_interval = 1.0
+        if os.path.isfile(self.timingfile):
+            os.remove(self.timingfile)
+        if os.path.isfile(self.jsonfile):
+            os.remove(self.jsonfile)
+
 
 if __name__ == '__main__':
     unittest.main()
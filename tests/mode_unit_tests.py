@@ -37,6 +37,33 @@ class ModeTests(unittest.TestCase):
         # Call the verification function passing it a bogus value, this should return false
         self.assertFalse(self.mode.config_verify("/etc/bogus.file"))
 
+    def test_installed_packages(self):
+        """Test that rpm and dpkg-query package listings are parsed, and the snapshot is cached"""
+        self.mode.list_pkgs = ["printf", "httpd\nphp\n"]
+        self.assertEqual(self.mode.installed_packages(), set(["httpd", "php"]))
+
+        # The cached snapshot is returned without running the listing again
+        self.mode.list_pkgs = ["false"]
+        self.assertEqual(self.mode.installed_packages(), set(["httpd", "php"]))
+
+        self.mode.installed = None
+        self.mode.list_pkgs = ["printf", "apache2 install ok installed\nphp5 deinstall ok config-files\n"]
+        self.assertEqual(self.mode.installed_packages(), set(["apache2"]))
+
+    def test_datavol(self):
+        """Test that datavol removes only the installed packages, in a single transaction"""
+        self.mode.list_pkgs = ["printf", "httpd\nphp\n" + self.mode.mysql_pkg + "\n"]
+        self.mode.remove_pkgs = "echo %s >> " + self.testfile
+        self.assertEqual(self.mode.datavol("httpd php php-cli"), sorted(["httpd", "php", self.mode.mysql_pkg]))
+
+        with open(self.testfile, "r") as testfile:
+            self.assertEqual(testfile.read().split("\n"), [" ".join(sorted(["httpd", "php", self.mode.mysql_pkg])), ""])
+
+        # Nothing to remove, so the package manager should not be ran
+        self.mode.list_pkgs = ["printf", "bash\n"]
+        self.mode.remove_pkgs = "false %s"
+        self.assertEqual(self.mode.datavol("httpd php"), [])
+
     def tearDown(self):
         """Cleanup test files that were created for the tests"""
         os.remove(self.testfile)
@@ -0,0 +1,109 @@
+"""
+***************************************************************************
+Unit Test:              Runconfig PHP Configuration Module Unit Tests
+Authors/Maintainers:    Rich Nason (rnason@appcontainers.io)
+Copyright:              Copyright 2016 Richard Nason
+Description:            These Unit tests will tests the Php Class to ensure proper code level functionality.
+***************************************************************************
+"""
+# *******************************************************************
+# Required Modules:
+# *******************************************************************
+import unittest
+import os
+import tempfile
+from shutil import rmtree
+from modules.php import Php
+
+
+class PhpTests(unittest.TestCase):
+    """Tests for php.py"""
+
+    def setUp(self):
+        """Stage a root holding an application, and a php stand in that reports the passed PHP facts"""
+        self.root = tempfile.mkdtemp()
+        self.saved_env = dict(os.environ)
+        os.environ['RUNCONFIG_ROOT'] = self.root
+        os.environ['APP_NAME'] = "Test.com"
+        self.php = Php()
+
+        os.makedirs(self.php.www_root + "Test.com/lib")
+        for name in ("index.php", "lib/a.php", "lib/b.inc", "lib/style.css"):
+            with open(self.php.www_root + "Test.com/" + name, "w") as app_file:
+                app_file.write("<?php ?>")
+
+    def fake_php(self, version, extensions, loaded, scan_dir="/etc/php/7.4/cli/conf.d"):
+        """Write a php stand in, and point the Php class at it"""
+        extension_dir = os.path.join(self.root, "usr/lib/php/modules")
+        os.makedirs(extension_dir)
+        for extension in extensions:
+            open(os.path.join(extension_dir, extension), "w").close()
+        os.makedirs(self.root + "/etc/php/7.4/apache2/conf.d")
+        php_binary = os.path.join(self.root, "php")
+        with open(php_binary, "w") as php:
+            php.write("#!/bin/sh\nprintf '%s\\n%s\\n%s\\n%s\\n'\n" % (version, extension_dir, scan_dir, ",".join(["Core"] + loaded)))
+        os.chmod(php_binary, 0o755)
+        self.php.php_binary = php_binary
+
+    def test_count_php_files(self):
+        """Ensure that only the PHP files are counted"""
+        self.assertEqual(self.php.count_php_files(), 3)
+
+    def test_cache_settings(self):
+        """Ensure the opcode cache is sized to the files and memory, and that the environment overrides win"""
+        small = Php.cache_settings("opcache", "7.4.33", 100, 256 * 1048576, 1)
+        self.assertEqual(small["SHM_MB"], 32)
+        self.assertEqual(small["MAX_FILES"], 3907)
+        self.assertEqual(small["REVALIDATE_FREQ"], 300)
+        self.assertEqual(small["VERSION_SETTINGS"], "")
+
+        large = Php.cache_settings("opcache", "7.1.0", 20000, 4096 * 1048576, 4)
+        self.assertEqual(large["SHM_MB"], 512)
+        self.assertEqual(large["INTERNED_MB"], 64)
+        self.assertEqual(large["MAX_FILES"], 65407)
+        self.assertEqual(large["VERSION_SETTINGS"], "opcache.fast_shutdown=1")
+
+        os.environ['PHP_OPCACHE_MEMORY'] = "96"
+        os.environ['PHP_OPCACHE_VALIDATE_TIMESTAMPS'] = "0"
+        tuned = Php.cache_settings("opcache", "8.2.0", 100, 256 * 1048576, 1)
+        self.assertEqual(tuned["SHM_MB"], 96)
+        self.assertEqual(tuned["VALIDATE_TIMESTAMPS"], 0)
+
+    def test_php_opcache(self):
+        """Write the OPcache ini file into the apache2 SAPI directory"""
+        self.fake_php("7.4.33", ["opcache.so"], ["Zend OPcache"])
+        ini_file = self.php.php_opcache()
+        self.assertEqual(ini_file, self.root + "/etc/php/7.4/apache2/conf.d/99-runconfig-opcache.ini")
+        with open(ini_file, "r") as ini:
+            settings = ini.read()
+        self.assertIn("opcache.memory_consumption=", settings)
+        self.assertIn("opcache.revalidate_freq=300\n", settings)
+        self.assertIn("; Zend OPcache is loaded by the distro ini files\n", settings)
+
+    def test_php_opcache_fallback(self):
+        """Fall back to XCache when OPcache is not installed, and load it"""
+        self.fake_php("5.4.16", ["xcache.so", "apcu.so"], [])
+        ini_file = self.php.php_opcache()
+        self.assertTrue(ini_file.endswith("99-runconfig-xcache.ini"))
+        with open(ini_file, "r") as ini:
+            self.assertIn("extension=xcache.so\n", ini.read())
+
+    def test_no_scan_dir(self):
+        """Ensure that the step is skipped, rather than writing to the root, when PHP has no ini scan directory"""
+        self.fake_php("7.4.33", ["opcache.so"], ["Zend OPcache"], scan_dir="")
+        self.assertIsNone(self.php.php_opcache())
+        self.assertFalse(os.path.exists(self.root + "/99-runconfig-opcache.ini"))
+
+    def test_no_php(self):
+        """Ensure that the step is skipped when PHP is not installed"""
+        self.php.php_binary = os.path.join(self.root, "missing-php")
+        self.assertIsNone(self.php.php_opcache())
+
+    def tearDown(self):
+        """Perform file cleanup from tests"""
+        os.environ.clear()
+        os.environ.update(self.saved_env)
+        rmtree(self.root)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+"""
+***************************************************************************
+Unit Test:              Runconfig Prebake Module Unit Tests
+Authors/Maintainers:    Rich Nason (rnason@appcontainers.io)
+Copyright:              Copyright 2016 Richard Nason
+Description:            These Unit tests will tests the Prebake Class to ensure proper code level functionality.
+***************************************************************************
+"""
+# *******************************************************************
+# Required Modules:
+# *******************************************************************
+import unittest
+import os
+import tempfile
+from shutil import rmtree
+from modules.prebake import Prebake
+
+
+class PrebakeTests(unittest.TestCase):
+    """Tests for prebake.py"""
+
+    def setUp(self):
+        """Write a prebaked tree holding placeholders under a temp root"""
+        self.root = tempfile.mkdtemp()
+        self.saved_env = dict(os.environ)
+        os.environ['RUNCONFIG_ROOT'] = self.root
+        self.prebake = Prebake()
+        app = Prebake.PLACEHOLDERS["APP_NAME"]
+
+        os.makedirs(self.root + "/etc/apache2/sites-available")
+        os.makedirs(self.root + "/etc/apache2/sites-enabled")
+        os.makedirs(self.root + "/var/www/html/" + app)
+        with open(self.root + "/etc/apache2/sites-available/" + app + ".conf", "w") as site_conf:
+            site_conf.write("ServerName " + app + "\nServerAlias " + Prebake.PLACEHOLDERS["APACHE_SVRALIAS"] + "\n")
+        os.symlink("../sites-available/" + app + ".conf", self.root + "/etc/apache2/sites-enabled/" + app + ".conf")
+        with open(self.root + "/etc/apache2/envvars", "w") as envvars:
+            envvars.write("HOSTNAME=" + Prebake.PLACEHOLDERS["HOSTNAME"] + "\n")
+        with open(self.root + "/etc/apache2/apache2.conf", "w") as apache_conf:
+            apache_conf.write("Listen 80\n")
+        with open(self.root + "/var/www/html/" + app + "/index.php", "w") as index:
+            index.write("<?php phpinfo() ?>")
+
+    def bake(self):
+        """Record the prebaked tree"""
+        return self.prebake.bake(["apache_config", "apache_init"], [self.root + "/etc/apache2/", self.root + "/var/www/html/" +
+                                                                    Prebake.PLACEHOLDERS["APP_NAME"]], key_count=0)
+
+    def test_bake(self):
+        """Test that the files and paths depending on the runtime environment are recorded"""
+        manifest = self.bake()
+        app = Prebake.PLACEHOLDERS["APP_NAME"]
+        self.assertTrue(self.prebake.pending())
+        self.assertEqual(manifest["files"], {
+            "/etc/apache2/envvars": ["HOSTNAME"],
+            "/etc/apache2/sites-available/" + app + ".conf": ["APACHE_SVRALIAS", "APP_NAME"],
+            "/etc/apache2/sites-enabled/" + app + ".conf": ["APP_NAME"],
+        })
+        self.assertEqual(manifest["renames"], ["/etc/apache2/sites-available/" + app + ".conf", "/etc/apache2/sites-enabled/" + app + ".conf",
+                                               "/var/www/html/" + app])
+
+    def test_bake_keys(self):
+        """Test that no private keys are baked into the image unless $PREBAKE_KEYS asks for them"""
+        os.environ.pop('PREBAKE_KEYS', None)
+        os.environ.pop('CERT_CA', None)
+        os.environ['CERT_KEY_TYPE'] = "rsa"
+        manifest = self.prebake.bake(["apache_config"], [self.root + "/etc/apache2/"])
+        self.assertIsNone(manifest["key_pool"])
+
+    def test_apply(self):
+        """Test that the runtime values are patched into the prebaked files and paths"""
+        self.bake()
+        os.environ['APP_NAME'] = "Test.com"
+        os.environ['HOSTNAME'] = "web01"
+        os.environ.pop('APACHE_SVRALIAS', None)
+
+        self.assertEqual(self.prebake.apply(), ["apache_config", "apache_init"])
+        self.assertFalse(self.prebake.pending())
+
+        with open(self.root + "/etc/apache2/sites-enabled/Test.com.conf", "r") as site_conf:
+            self.assertEqual(site_conf.read(), "ServerName Test.com\nServerAlias www.Test.com\n")
+        with open(self.root + "/etc/apache2/envvars", "r") as envvars:
+            self.assertEqual(envvars.read(), "HOSTNAME=web01\n")
+        assert os.path.exists(self.root + "/var/www/html/Test.com/index.php") == 1
+        assert os.path.exists(self.root + "/var/lib/runconfig/prebake.applied.json") == 1
+
+    def test_apply_failure(self):
+        """Test that no prebaked step is adopted, and the manifest stays pending, when a file can not be patched"""
+        self.bake()
+        os.environ['APP_NAME'] = "Test.com"
+        os.environ['HOSTNAME'] = "web01"
+
+        # A prebaked file that can no longer be read as text
+        with open(self.root + "/etc/apache2/envvars", "wb") as envvars:
+            envvars.write(b"\xff\xfe")
+
+        self.assertEqual(self.prebake.apply(), [])
+        self.assertTrue(self.prebake.pending())
+        self.assertEqual([name for name in os.listdir(self.root + "/etc/apache2") if name.endswith(".tmp")], [])
+
+    def tearDown(self):
+        """Perform file cleanup from tests"""
+        os.environ.clear()
+        os.environ.update(self.saved_env)
+        rmtree(self.root)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+"""
+***************************************************************************
+Unit Test:              Runconfig Precompress Module Unit Tests
+Authors/Maintainers:    Rich Nason (rnason@appcontainers.io)
+Copyright:              Copyright 2016 Richard Nason
+Description:            These Unit tests will tests the Precompress Class to ensure proper code level functionality.
+***************************************************************************
+"""
+# *******************************************************************
+# Required Modules:
+# *******************************************************************
+import unittest
+import os
+import gzip
+import tempfile
+from shutil import rmtree
+from modules.precompress import Precompress
+
+
+class PrecompressTests(unittest.TestCase):
+    """Tests for precompress.py"""
+
+    def setUp(self):
+        """Create an application tree with compressible, small, and already compressed assets"""
+        self.root = tempfile.mkdtemp()
+        self.app_path = os.path.join(self.root, "app")
+        self.assets = {"css/site.css": b"body { color: black; }\n" * 200, "js/app.js": b"console.log('warm');\n" * 200,
+                       "small.txt": b"tiny", "img/logo.png": os.urandom(4096), "index.php": b"<?php phpinfo() ?>" * 200}
+        for name, data in self.assets.items():
+            file_path = os.path.join(self.app_path, name)
+            if not os.path.isdir(os.path.dirname(file_path)):
+                os.makedirs(os.path.dirname(file_path))
+            with open(file_path, "wb") as asset:
+                asset.write(data)
+        self.precompress = Precompress(self.app_path, os.path.join(self.root, "precompress.json"))
+        self.precompress.brotli = False
+
+    def test_assets(self):
+        """Ensure only the compressible assets are found"""
+        self.assertEqual(self.precompress.assets(), ["css/site.css", "js/app.js", "small.txt"])
+
+    def test_run(self):
+        """Compress the assets, skip them when they are up to date, and remove the siblings of deleted assets"""
+        self.assertEqual(self.precompress.run(), {"compressed": 2, "skipped": 0, "removed": 0})
+        with gzip.open(os.path.join(self.app_path, "css/site.css.gz"), "rb") as compressed:
+            self.assertEqual(compressed.read(), self.assets["css/site.css"])
+        self.assertEqual(os.stat(os.path.join(self.app_path, "css/site.css.gz")).st_mtime_ns,
+                         os.stat(os.path.join(self.app_path, "css/site.css")).st_mtime_ns)
+        assert os.path.exists(os.path.join(self.app_path, "small.txt.gz")) == 0
+
+        print("Validating that up to date assets are skipped...")
+        os.utime(os.path.join(self.app_path, "js/app.js"), ns=(0, 1000000000))
+        self.assertEqual(self.precompress.run(), {"compressed": 0, "skipped": 2, "removed": 0})
+        self.assertEqual(os.stat(os.path.join(self.app_path, "js/app.js.gz")).st_mtime_ns, 1000000000)
+
+        print("Validating that changed and deleted assets are handled...")
+        with open(os.path.join(self.app_path, "css/site.css"), "ab") as asset:
+            asset.write(b"p { margin: 0; }\n")
+        os.remove(os.path.join(self.app_path, "js/app.js"))
+        self.assertEqual(self.precompress.run(), {"compressed": 1, "skipped": 0, "removed": 1})
+        assert os.path.exists(os.path.join(self.app_path, "js/app.js.gz")) == 0
+        with gzip.open(os.path.join(self.app_path, "css/site.css.gz"), "rb") as compressed:
+            self.assertTrue(compressed.read().endswith(b"p { margin: 0; }\n"))
+
+    def tearDown(self):
+        """Perform file cleanup from tests"""
+        rmtree(self.root)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+"""
+***************************************************************************
+Unit Test:              Runconfig Stage Module Unit Tests
+Authors/Maintainers:    Rich Nason (rnason@appcontainers.io)
+Copyright:              Copyright 2016 Richard Nason
+Description:            These Unit tests will tests the Stage Class to ensure proper code level functionality.
+***************************************************************************
+"""
+# *******************************************************************
+# Required Modules:
+# *******************************************************************
+import unittest
+import os
+import tempfile
+from shutil import rmtree
+from modules.globals import Globals
+from modules.stage import Stage
+
+
+class StageTests(unittest.TestCase):
+    """Tests for stage.py"""
+
+    def setUp(self):
+        """Stage a small configuration tree in a temp root"""
+        self.global_variables = Globals()
+        self.test_path = tempfile.mkdtemp()
+        self.root = os.path.join(self.test_path, "staged")
+        self.target = os.path.join(self.test_path, "target")
+        os.makedirs(os.path.join(self.root, "etc/apache2/sites-available"))
+        os.makedirs(os.path.join(self.root, "etc/apache2/sites-enabled"))
+        with open(os.path.join(self.root, "etc/apache2/sites-available/Test.com.conf"), "w") as site_conf:
+            site_conf.write("ServerName Test.com\n")
+        os.chmod(os.path.join(self.root, "etc/apache2/sites-available/Test.com.conf"), 0o640)
+        os.symlink("../sites-available/Test.com.conf", os.path.join(self.root, "etc/apache2/sites-enabled/Test.com.conf"))
+
+    def test_paths(self):
+        """Test that target paths are mapped under $RUNCONFIG_ROOT and back"""
+        os.environ['RUNCONFIG_ROOT'] = self.root + "/"
+        try:
+            self.assertEqual(self.global_variables.path("/etc/ssl/certs/"), self.root + "/etc/ssl/certs/")
+            self.assertEqual(self.global_variables.target(self.root + "/etc/ssl/certs/Test.com.crt"), "/etc/ssl/certs/Test.com.crt")
+            self.assertEqual(Stage().root, self.root)
+        finally:
+            del os.environ['RUNCONFIG_ROOT']
+        self.assertEqual(self.global_variables.path("/etc/ssl/certs/"), "/etc/ssl/certs/")
+
+    def test_commit_copy(self):
+        """Test that committing onto an existing root copies every file and keeps the symlinks relative"""
+        os.makedirs(os.path.join(self.target, "etc/apache2/sites-available"))
+        with open(os.path.join(self.target, "etc/apache2/sites-available/000-default.conf"), "w") as default_conf:
+            default_conf.write("ServerName localhost\n")
+
+        stage = Stage(self.root)
+        self.assertEqual(stage.files(), ["/etc/apache2/sites-available/Test.com.conf", "/etc/apache2/sites-enabled/Test.com.conf"])
+        self.assertEqual(stage.commit(self.target), 2)
+
+        enabled = os.path.join(self.target, "etc/apache2/sites-enabled/Test.com.conf")
+        self.assertEqual(os.readlink(enabled), "../sites-available/Test.com.conf")
+        with open(enabled, "r") as site_conf:
+            self.assertEqual(site_conf.read(), "ServerName Test.com\n")
+        self.assertEqual(os.stat(enabled).st_mode & 0o777, 0o640)
+        assert os.path.exists(os.path.join(self.target, "etc/apache2/sites-available/000-default.conf")) == 1
+
+    def test_commit_rename(self):
+        """Test that committing onto a root that does not exist yet renames the staged root"""
+        self.assertEqual(Stage(self.root).commit(self.target), 2)
+        assert os.path.exists(self.root) == 0
+        assert os.path.exists(os.path.join(self.target, "etc/apache2/sites-enabled/Test.com.conf")) == 1
+
+    def tearDown(self):
+        """Perform file cleanup from tests"""
+        rmtree(self.test_path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+"""
+***************************************************************************
+Unit Test:              Runconfig Startup Unit Tests
+Authors/Maintainers:    Rich Nason (rnason@appcontainers.io)
+Copyright:              Copyright 2016 Richard Nason
+Description:            These Unit tests will import the modules runconfig.py loads on an already configured restart, and
+                        ensure that they stay within the import time budget, and that the restart steps do not load the
+                        crypto libraries.
+***************************************************************************
+"""
+# *******************************************************************
+# Required Modules:
+# *******************************************************************
+import unittest
+import os
+import sys
+import ast
+import tempfile
+import subprocess
+from shutil import rmtree
+
+# The repository root, runconfig.py lives there.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def runconfig_imports():
+    """Return the modules runconfig.py imports at the top level, read from its source so the list can not go stale"""
+    with open(os.path.join(ROOT, "runconfig.py"), "r") as runconfig:
+        tree = ast.parse(runconfig.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.ImportFrom) and node.module and node.module.startswith("modules."):
+            modules.append(node.module)
+        elif isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names if alias.name.startswith("modules."))
+    return ", ".join(sorted(set(modules)))
+
+
+# The modules runconfig.py imports, and the import time budget in microseconds, overridden with $IMPORT_TIME_BUDGET.
+RUNCONFIG_IMPORTS = runconfig_imports()
+IMPORT_TIME_BUDGET = int(os.environ.get('IMPORT_TIME_BUDGET', 250000))
+
+
+class StartupTests(unittest.TestCase):
+    """Tests for the runconfig.py import path"""
+
+    def setUp(self):
+        """Import the runconfig modules in a fresh interpreter with import timing enabled"""
+        script = ("import sys, threading\n"
+                  "import " + RUNCONFIG_IMPORTS + "\n"
+                  "print(sorted(set(name.split('.')[0] for name in sys.modules) & set(['OpenSSL', 'cryptography'])))\n"
+                  "print(threading.active_count())\n"
+                  "import signal\n"
+                  "print(signal.getsignal(signal.SIGTERM) is signal.SIG_DFL)\n")
+        env = dict(os.environ, APP_NAME=os.environ.get('APP_NAME') or "Test.com")
+        self.process = subprocess.run([sys.executable, "-X", "importtime", "-c", script], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                      universal_newlines=True, env=env, cwd=ROOT)
+        self.assertEqual(self.process.returncode, 0, self.process.stderr)
+
+    def test_lazy_imports(self):
+        """Test that the crypto libraries are not imported, and no log writer thread or signal handler is installed, until a
+        step needs them"""
+        heavy_modules, threads, default_handler = self.process.stdout.splitlines()
+        self.assertEqual(heavy_modules, "[]")
+        self.assertEqual(threads, "1")
+        self.assertEqual(default_handler, "True")
+
+    def test_configured_restart(self):
+        """Test that the apache_certs step of an already configured restart reuses the certificate without loading the
+        crypto libraries, for both a self signed and a CA signed certificate"""
+        for ca_mode in ("0", "1"):
+            root = tempfile.mkdtemp()
+            try:
+                env = dict(os.environ, APP_NAME=os.environ.get('APP_NAME') or "Test.com", RUNCONFIG_ROOT=root, CERT_CA=ca_mode,
+                           CERT_CA_PATH=os.path.join(root, "ca"), CERT_KEY_TYPE="ec-p256")
+                env.pop('CERT_CACHE', None)
+                env.pop('CERT_KEY_POOL', None)
+
+                # The first start generates the certificate, and indexes it
+                script = ("import os\n"
+                          "from modules.certs import CertGen\n"
+                          "cert_gen = CertGen()\n"
+                          "os.makedirs(cert_gen.cert_path)\n"
+                          "os.makedirs(cert_gen.key_path)\n"
+                          "print(cert_gen.ensure_cert())\n")
+                first_start = subprocess.run([sys.executable, "-c", script], stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, env=env, cwd=ROOT)
+                self.assertEqual(first_start.returncode, 0, first_start.stderr)
+                self.assertEqual(first_start.stdout.splitlines()[-1], "missing")
+
+                # The restart runs the step, which only stats the certificate
+                script = ("import sys\n"
+                          "from modules.apache import Apache\n"
+                          "Apache().apache_certs()\n"
+                          "print(sorted(set(name.split('.')[0] for name in sys.modules) & set(['OpenSSL', 'cryptography'])))\n")
+                restart = subprocess.run([sys.executable, "-c", script], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                         universal_newlines=True, env=env, cwd=ROOT)
+                self.assertEqual(restart.returncode, 0, restart.stderr)
+                self.assertIn("is valid", restart.stdout)
+                self.assertEqual(restart.stdout.splitlines()[-1], "[]")
+            finally:
+                rmtree(root)
+
+    def test_runconfig_imports(self):
+        """Test that the measured modules are the ones runconfig.py imports"""
+        self.assertIn("modules.apache", RUNCONFIG_IMPORTS)
+        self.assertIn("modules.precompress", RUNCONFIG_IMPORTS)
+
+    def test_import_time_budget(self):
+        """Test that the runconfig modules import within the budget"""
+        total = 0
+        for line in self.process.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package, top level imports are not indented
+            fields = line.split("|")
+            if line.startswith("import time:") and len(fields) == 3 and fields[1].strip().isdigit() and not fields[2].startswith("  "):
+                total += int(fields[1])
+        print("runconfig modules imported in " + str(total) + "us")
+        self.assertLess(total, IMPORT_TIME_BUDGET)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+"""
+***************************************************************************
+Unit Test:              Runconfig State Manifest Module Unit Tests
+Authors/Maintainers:    Rich Nason (rnason@appcontainers.io)
+Copyright:              Copyright 2016 Richard Nason
+Description:            These Unit tests will tests the StateManifest Class to ensure proper code level functionality.
+***************************************************************************
+"""
+# *******************************************************************
+# Required Modules:
+# *******************************************************************
+import unittest
+import os
+import tempfile
+from shutil import rmtree
+from modules.state import StateManifest
+from modules.steps import StepGraph
+
+
+class StateManifestTests(unittest.TestCase):
+    """Tests for state.py"""
+
+    def setUp(self):
+        """Create a temp directory holding the manifest and the step files"""
+        self.state_path = tempfile.mkdtemp()
+        self.manifest_file = os.path.join(self.state_path, "manifest.json")
+        self.template = os.path.join(self.state_path, "template.conf")
+        self.config = os.path.join(self.state_path, "app.conf")
+        self.index = os.path.join(self.state_path, "index.php")
+        self.ran = []
+
+        with open(self.template, "w") as template:
+            template.write("ServerName www.example.com:80\n")
+
+        os.environ['RUNCONFIG_TEST_APP'] = "Test.com"
+
+    def write_step(self, name, file_path):
+        """Return a step function that records that it ran and writes its output file"""
+        def step():
+            """Test step"""
+            self.ran.append(name)
+            with open(file_path, "w") as output:
+                output.write(os.environ['RUNCONFIG_TEST_APP'])
+        return step
+
+    def run_steps(self):
+        """Build and run the test step graph against the manifest, returns the step status"""
+        self.ran = []
+        steps = StepGraph()
+        steps.add("config", self.write_step("config", self.config), env=["RUNCONFIG_TEST_APP"], inputs=[self.template], outputs=[self.config])
+        steps.add("certs", self.write_step("certs", os.path.join(self.state_path, "app.crt")), requires=["config"])
+        steps.add("init", self.write_step("init", self.index), outputs=[self.index])
+        steps.add("start", lambda: self.ran.append("start"), requires=["certs", "init"], always=True)
+        return steps.run(StateManifest(self.manifest_file))
+
+    def test_restart(self):
+        """Test that a restart only runs the steps that always run"""
+        self.assertEqual(self.run_steps(), {"config": "ok", "certs": "ok", "init": "ok", "start": "ok"})
+        assert os.path.exists(self.manifest_file) == 1
+
+        self.assertEqual(self.run_steps(), {"config": "current", "certs": "current", "init": "current", "start": "ok"})
+        self.assertEqual(self.ran, ["start"])
+
+    def test_changed_inputs(self):
+        """Test that changed environment variables and input files re-run the step and the steps depending on it"""
+        self.run_steps()
+
+        os.environ['RUNCONFIG_TEST_APP'] = "Other.com"
+        self.run_steps()
+        self.assertEqual(sorted(self.ran), ["certs", "config", "start"])
+
+        with open(self.template, "a") as template:
+            template.write("Listen 8080\n")
+        self.run_steps()
+        self.assertEqual(sorted(self.ran), ["certs", "config", "start"])
+
+    def test_missing_output(self):
+        """Test that a missing or modified output repairs only that step"""
+        self.run_steps()
+
+        os.remove(self.index)
+        self.run_steps()
+        self.assertEqual(sorted(self.ran), ["init", "start"])
+        assert os.path.exists(self.index) == 1
+
+        with open(self.config, "w") as config:
+            config.write("modified")
+        self.run_steps()
+        self.assertEqual(sorted(self.ran), ["certs", "config", "start"])
+
+    def test_adopt(self):
+        """Test that adopted steps are treated as up to date when there is no manifest"""
+        manifest = StateManifest(self.manifest_file)
+        self.assertFalse(manifest.exists())
+        manifest.adopt(["config"])
+
+        step = StepGraph().add("config", None)
+        self.assertIsNone(manifest.stale_reason(step))
+        self.assertIsNotNone(manifest.stale_reason(StepGraph().add("init", None)))
+
+    def test_staged_commit(self):
+        """Test that a manifest written under a staged root is still current once the tree moves to another root"""
+        def run_staged(root):
+            """Run a step that writes a file under the root, returns the step status"""
+            os.environ['RUNCONFIG_ROOT'] = root
+            steps = StepGraph()
+            steps.add("config", self.write_step("config", root + "/etc/app.conf"), inputs=[root + "/etc/template.conf"],
+                      outputs=[root + "/etc/app.conf"])
+            return steps.run(StateManifest(root + "/manifest.json"))
+
+        stage = os.path.join(self.state_path, "stage")
+        os.makedirs(stage + "/etc")
+        with open(stage + "/etc/template.conf", "w") as template:
+            template.write("ServerName www.example.com:80\n")
+        try:
+            self.assertEqual(run_staged(stage), {"config": "ok"})
+            with open(stage + "/manifest.json", "r") as manifest:
+                self.assertIn('"/etc/app.conf"', manifest.read())
+
+            committed = os.path.join(self.state_path, "committed")
+            os.rename(stage, committed)
+            self.assertEqual(run_staged(committed), {"config": "current"})
+        finally:
+            del os.environ['RUNCONFIG_ROOT']
+
+    def tearDown(self):
+        """Perform file cleanup from tests"""
+        rmtree(self.state_path)
+        del os.environ['RUNCONFIG_TEST_APP']
+
+if __name__ == '__main__':
+    unittest.main()
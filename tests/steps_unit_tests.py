@@ -0,0 +1,79 @@
+"""
+***************************************************************************
+Unit Test:              Runconfig Step Graph Module Unit Tests
+Authors/Maintainers:    Rich Nason (rnason@appcontainers.io)
+Copyright:              Copyright 2016 Richard Nason
+Description:            These Unit tests will tests the StepGraph Class to ensure proper code level functionality.
+***************************************************************************
+"""
+# *******************************************************************
+# Required Modules:
+# *******************************************************************
+import unittest
+import threading
+from modules.steps import StepGraph
+
+
+class StepGraphTests(unittest.TestCase):
+    """Tests for steps.py"""
+
+    def setUp(self):
+        """Initialize the class, and instantiate a StepGraph instance"""
+        self.step_graph = StepGraph(max_workers=4)
+        self.ran = []
+
+    def record(self, name):
+        """Return a step function that records that it ran"""
+        return lambda: self.ran.append(name)
+
+    def test_concurrent_steps(self):
+        """Test that independent steps run at the same time"""
+        # Both steps have to reach the barrier before either can finish, which only happens if they run concurrently.
+        barrier = threading.Barrier(2, timeout=5)
+        self.step_graph.add("certs", barrier.wait)
+        self.step_graph.add("index", barrier.wait)
+
+        self.assertEqual(self.step_graph.run(), {"certs": "ok", "index": "ok"})
+
+    def test_dependency_order(self):
+        """Test that steps run after the steps they require, and after the steps that write their inputs"""
+        self.step_graph.add("start", self.record("start"), requires=["config", "certs"])
+        self.step_graph.add("config", self.record("config"), outputs=["/etc/httpd/conf.d/app.conf"])
+        self.step_graph.add("certs", self.record("certs"), inputs=["/etc/httpd/conf.d/app.conf"])
+
+        self.assertEqual(self.step_graph.order(), ["config", "certs", "start"])
+        self.step_graph.run()
+        self.assertEqual(self.ran, ["config", "certs", "start"])
+
+    def test_failed_step(self):
+        """Test that the steps depending on a failed step are skipped"""
+        def fail():
+            """Failing test step"""
+            raise ValueError("Test failure")
+
+        self.step_graph.add("certs", fail)
+        self.step_graph.add("index", self.record("index"))
+        self.step_graph.add("start", self.record("start"), requires=["certs", "index"])
+        self.step_graph.add("cleanup", self.record("cleanup"), requires=["start"])
+
+        status = self.step_graph.run()
+        self.assertEqual(status, {"certs": "failed", "index": "ok", "start": "skipped", "cleanup": "skipped"})
+        self.assertEqual(self.ran, ["index"])
+
+    def test_invalid_graph(self):
+        """Test that unknown steps and dependency cycles are rejected"""
+        self.step_graph.add("start", self.record("start"), requires=["bogus"])
+        with self.assertRaises(ValueError):
+            self.step_graph.run()
+
+        cycle_graph = StepGraph()
+        cycle_graph.add("config", self.record("config"), requires=["start"])
+        cycle_graph.add("start", self.record("start"), requires=["config"])
+        with self.assertRaises(ValueError):
+            cycle_graph.order()
+
+        with self.assertRaises(ValueError):
+            cycle_graph.add("start", self.record("start"))
+
+if __name__ == '__main__':
+    unittest.main()
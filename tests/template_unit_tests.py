@@ -0,0 +1,75 @@
+"""
+***************************************************************************
+Unit Test:              Runconfig Template Module Unit Tests
+Authors/Maintainers:    Rich Nason (rnason@appcontainers.io)
+Copyright:              Copyright 2016 Richard Nason
+Description:            These Unit tests will tests the TemplateEngine Class to ensure proper code level functionality.
+***************************************************************************
+"""
+# *******************************************************************
+# Required Modules:
+# *******************************************************************
+import unittest
+import os
+import tempfile
+from shutil import rmtree
+from modules.template import TemplateEngine
+
+
+class TemplateEngineTests(unittest.TestCase):
+    """Tests for template.py"""
+
+    def setUp(self):
+        """Create a temp directory holding a test template and the rendered files"""
+        self.template_path = tempfile.mkdtemp()
+        with open(os.path.join(self.template_path, "test.tmpl"), "w") as template:
+            template.write("ServerName {{APP_NAME}}\nErrorLog ${APACHE_LOG_DIR}/{{ APP_NAME }}_error.log\n")
+        self.templates = TemplateEngine(self.template_path)
+
+    def test_render(self):
+        """Test that variables are substituted, and Apache variables are left alone"""
+        self.assertEqual(self.templates.render("test", {"APP_NAME": "Test.com"}),
+                         "ServerName Test.com\nErrorLog ${APACHE_LOG_DIR}/Test.com_error.log\n")
+
+        with self.assertRaises(ValueError):
+            self.templates.render("test", {})
+
+    def test_compile_cache(self):
+        """Test that a template is compiled once, and recompiled when it changes"""
+        segments = TemplateEngine.compile(self.templates.load("test"))
+        self.assertEqual(segments[1], "APP_NAME")
+        self.assertIs(TemplateEngine.compile(self.templates.load("test")), segments)
+
+        with open(os.path.join(self.template_path, "test.tmpl"), "w") as template:
+            template.write("ServerAlias {{SERVER_ALIAS}}\n")
+        os.utime(os.path.join(self.template_path, "test.tmpl"), ns=(0, 0))
+        self.assertEqual(self.templates.render("test", {"SERVER_ALIAS": "www.Test.com"}), "ServerAlias www.Test.com\n")
+
+    def test_write_all(self):
+        """Test that every output is written, and nothing is written if one of them fails to render"""
+        outputs = [(os.path.join(self.template_path, "sites", site + ".conf"), "test", {"APP_NAME": site}) for site in ("Test1.com", "Test2.com")]
+        self.assertEqual(self.templates.write_all(outputs), [output[0] for output in outputs])
+        with open(outputs[1][0], "r") as site_conf:
+            self.assertEqual(site_conf.readline(), "ServerName Test2.com\n")
+        self.assertEqual(sorted(os.listdir(os.path.join(self.template_path, "sites"))), ["Test1.com.conf", "Test2.com.conf"])
+
+        with self.assertRaises(ValueError):
+            self.templates.write_all([(os.path.join(self.template_path, "Test3.com.conf"), "test", {"APP_NAME": "Test3.com"}),
+                                      (os.path.join(self.template_path, "Test4.com.conf"), "test", {})])
+        self.assertFalse(os.path.exists(os.path.join(self.template_path, "Test3.com.conf")))
+
+    def test_shipped_templates(self):
+        """Test that the shipped templates render with the variables the Apache module provides"""
+        templates = TemplateEngine()
+        template_vars = {"APP_NAME": "Test.com", "SERVER_ALIAS": "www.Test.com", "HOSTNAME": "web01", "DOCUMENT_ROOT": "/var/www/html/Test.com",
+                         "CERT_FILE": "/etc/ssl/certs/Test.com.crt", "KEY_FILE": "/etc/ssl/private/Test.com.key", "LOG_DIR": "logs", "RUN_DIR": "/run/httpd"}
+        self.assertIn("SSLCertificateFile /etc/ssl/certs/Test.com.crt", templates.render("vhost.conf", template_vars))
+        self.assertIn("sslcache", templates.render("ssl.conf", template_vars))
+        self.assertIn('APP="Test.com"', templates.render("envvars", template_vars))
+
+    def tearDown(self):
+        """Perform file cleanup from tests"""
+        rmtree(self.template_path)
+
+if __name__ == '__main__':
+    unittest.main()
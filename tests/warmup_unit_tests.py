@@ -0,0 +1,79 @@
+"""
+***************************************************************************
+Unit Test:              Runconfig Warm Up Module Unit Tests
+Authors/Maintainers:    Rich Nason (rnason@appcontainers.io)
+Copyright:              Copyright 2016 Richard Nason
+Description:            These Unit tests will tests the Warmup Class to ensure proper code level functionality.
+***************************************************************************
+"""
+# *******************************************************************
+# Required Modules:
+# *******************************************************************
+import unittest
+import os
+import tempfile
+import threading
+import http.server
+from shutil import rmtree
+from modules.warmup import Warmup
+
+
+class WarmupTests(unittest.TestCase):
+    """Tests for warmup.py"""
+
+    def setUp(self):
+        """Create an application tree, and serve it on a local port"""
+        self.app_path = tempfile.mkdtemp()
+        for name in ("index.php", "login.php", "_partial.php", "admin/index.php", "admin/users.php", "vendor/autoload.php",
+                     "css/site.css", "js/app.js", "README.md"):
+            file_path = os.path.join(self.app_path, name)
+            if not os.path.isdir(os.path.dirname(file_path)):
+                os.makedirs(os.path.dirname(file_path))
+            with open(file_path, "w") as app_file:
+                app_file.write("body { }\n")
+
+        app_path = self.app_path
+
+        class Handler(http.server.SimpleHTTPRequestHandler):
+            """Serve the application tree quietly"""
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, directory=app_path, **kwargs)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.warmup = Warmup(self.app_path, self.server.server_address[1])
+
+    def test_discover(self):
+        """Ensure the entry points are discovered index first, skipping library directories and partials"""
+        self.assertEqual(self.warmup.discover(), ["/index.php", "/login.php", "/admin/index.php", "/admin/users.php"])
+        self.assertEqual(self.warmup.discover(2), ["/index.php", "/login.php"])
+
+        os.environ['WARMUP_URLS'] = "/ /status.php"
+        try:
+            self.assertEqual(self.warmup.discover(), ["/", "/status.php"])
+        finally:
+            del os.environ['WARMUP_URLS']
+
+    def test_warm(self):
+        """Warm the application, and ensure each URL reports its status and latency"""
+        report = self.warmup.warm()
+        self.assertEqual([result["url"] for result in report["urls"]], ["/index.php", "/login.php", "/admin/index.php", "/admin/users.php"])
+        for result in report["urls"]:
+            self.assertEqual(result["status"], 200)
+            self.assertGreater(result["seconds"], 0)
+        self.assertEqual(report["static_files"], 2)
+        self.assertEqual(report["static_bytes"], 18)
+
+    def tearDown(self):
+        """Stop the server, and perform file cleanup from tests"""
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        rmtree(self.app_path)
+
+if __name__ == '__main__':
+    unittest.main()